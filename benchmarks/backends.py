@@ -0,0 +1,55 @@
+"""
+Compares boolean matrix backends on the same CFPQ and RPQ queries.
+
+Run from the repository root: python -m benchmarks.backends
+"""
+import time
+
+from pyformlang.cfg import CFG
+from pyformlang.regular_expression import Regex
+
+from project.cfpq import matrix_based
+from project.fsm import graph_to_nfa, regex_to_dfa
+from project.graph_utils import build_two_cycle_graph
+from project.matrix_backend import BACKENDS
+from project.regular_path_queries import intersect
+
+GRAMMAR = """
+S -> A B | A S1
+S1 -> S B
+A -> a
+B -> b
+"""
+
+REGEX = "a* b (a | b)*"
+
+SIZES = [(10, 9), (20, 19), (40, 39)]
+
+
+def measure(query):
+    start = time.perf_counter()
+    query()
+    return time.perf_counter() - start
+
+
+def main():
+    cfg = CFG.from_text(GRAMMAR)
+    dfa = regex_to_dfa(Regex(REGEX))
+    print(f"{'graph':>10} {'query':>12} " + " ".join(f"{b:>10}" for b in BACKENDS))
+    for n, m in SIZES:
+        graph = build_two_cycle_graph(n, m, ("a", "b"))
+        nfa = graph_to_nfa(graph)
+        queries = {
+            "matrix": lambda b: matrix_based(graph, cfg, semi_naive=True, backend=b),
+            "intersect": lambda b: intersect(nfa, dfa, backend=b),
+        }
+        for name, query in queries.items():
+            times = [measure(lambda: query(backend)) for backend in BACKENDS]
+            print(
+                f"{f'{n}x{m}':>10} {name:>12} "
+                + " ".join(f"{elapsed:>10.3f}" for elapsed in times)
+            )
+
+
+if __name__ == "__main__":
+    main()
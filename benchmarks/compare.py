@@ -0,0 +1,69 @@
+"""
+Compares two result files of benchmarks.run and flags regressions.
+
+Run from the repository root:
+    python -m benchmarks.compare baseline.json results.json --threshold 0.1
+
+Exits with code 1 if any case became slower (or used more memory) than the
+baseline by more than the threshold.
+"""
+import argparse
+import sys
+
+from benchmarks.run import read_results
+
+METRICS = ["min_time", "mean_time", "peak_rss_kb"]
+
+
+def case_key(record):
+    return record["workload"], record["engine"], int(record["size"])
+
+
+def compare(baseline, current, metric: str = "min_time", threshold: float = 0.1):
+    """
+    :param baseline: records of baseline run
+    :param current: records of current run
+    :param metric: compared field of records
+    :param threshold: allowed relative growth of metric
+    :return: list of (case key, baseline value, current value, ratio, is regression)
+    for cases measured in both runs
+    """
+    baseline = {case_key(record): record for record in baseline}
+    rows = []
+    for record in current:
+        key = case_key(record)
+        old = baseline.get(key, {}).get(metric)
+        new = record.get(metric)
+        if not old or new is None:
+            continue
+        ratio = new / old
+        rows.append((key, old, new, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--metric", choices=METRICS, default="min_time")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    rows = compare(
+        read_results(args.baseline),
+        read_results(args.current),
+        args.metric,
+        args.threshold,
+    )
+    for (workload, engine, size), old, new, ratio, regression in rows:
+        print(
+            f"{workload:>26} {engine:>20} {size:>6} "
+            f"{old:>12.4f} {new:>12.4f} {ratio:>7.2f}x"
+            + ("  REGRESSION" if regression else "")
+        )
+    if any(regression for *_, regression in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Runs query engines on synthetic workloads and records wall time, peak RSS
+and iteration counts.
+
+Every (workload, size, engine) case runs in a fresh process, so peak RSS of a case
+is not affected by the previous ones.
+
+Run from the repository root:
+    python -m benchmarks.run --sizes 10 20 --repeat 3 --output results.json
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import platform
+import time
+
+from pyformlang.regular_expression import Regex
+
+from benchmarks.workloads import WORKLOADS, parse_query
+from project.cfpq import hellings, matrix_based, multi_source_matrix, tensor_based
+from project.fsm import graph_to_nfa, regex_to_dfa
+from project.parallel_rpq import batch_rpq
+from project.regular_path_queries import bfs_rpq, intersect
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def batch_per_source(graph, regex, workers: int):
+    """
+    bfs_rpq from every vertex split into 4 chunks per worker process, started by
+    the default start method of the platform
+    """
+    chunk_size = -(-graph.number_of_nodes() // (4 * workers))
+    queries = [(None, regex)]
+    results = batch_rpq(
+        graph, queries, per_source=True, workers=workers, chunk_size=chunk_size
+    )
+    return next(results)[1]
+
+
+ENGINES = {
+    "cfpq": {
+        "hellings": lambda graph, cfg, stats: hellings(graph, cfg, stats=stats),
+        "matrix": lambda graph, cfg, stats: matrix_based(graph, cfg, stats=stats),
+        "matrix_semi_naive": lambda graph, cfg, stats: matrix_based(
+            graph, cfg, semi_naive=True, stats=stats
+        ),
+        "matrix_threads_4": lambda graph, cfg, stats: matrix_based(
+            graph, cfg, semi_naive=True, stats=stats, workers=4
+        ),
+        "tensor": lambda graph, cfg, stats: tensor_based(graph, cfg, stats=stats),
+        "matrix_from_vertex_0": lambda graph, cfg, stats: multi_source_matrix(
+            graph, cfg, [0], stats=stats
+        ),
+    },
+    "rpq": {
+        "bfs_all_sources": lambda graph, regex, stats: bfs_rpq(graph, regex),
+        "bfs_per_source": lambda graph, regex, stats: bfs_rpq(
+            graph, regex, per_source=True
+        ),
+        "intersect_reachable": lambda graph, regex, stats: intersect(
+            graph_to_nfa(graph),
+            regex_to_dfa(Regex(regex)),
+            reachable_only=True,
+            as_matrices=True,
+        ).states,
+        # scaling of batch queries with the number of worker processes
+        "batch_per_source_1": lambda graph, regex, stats: batch_per_source(
+            graph, regex, 1
+        ),
+        "batch_per_source_2": lambda graph, regex, stats: batch_per_source(
+            graph, regex, 2
+        ),
+        "batch_per_source_4": lambda graph, regex, stats: batch_per_source(
+            graph, regex, 4
+        ),
+    },
+}
+
+FIELDS = [
+    "workload",
+    "kind",
+    "engine",
+    "size",
+    "vertices",
+    "edges",
+    "repeat",
+    "warmup",
+    "min_time",
+    "mean_time",
+    "times",
+    "peak_rss_kb",
+    "iterations",
+    "path",
+    "result_size",
+    "error",
+]
+
+
+def result_size(result) -> int:
+    if isinstance(result, dict):
+        return sum(len(values) for values in result.values())
+    return len(result)
+
+
+def run_case(workload_name: str, engine: str, size: int, repeat: int, warmup: int):
+    """
+    Measures one case, runs in a child process
+    :return: record of the case without workload description fields
+    """
+    workload = next(w for w in WORKLOADS if w.name == workload_name)
+    graph = workload.graph(size)
+    query = parse_query(workload)
+    run = ENGINES[workload.kind][engine]
+
+    for _ in range(warmup):
+        run(graph, query, {})
+
+    times = []
+    stats = {}
+    result = None
+    for _ in range(repeat):
+        stats = {}
+        start = time.perf_counter()
+        result = run(graph, query, stats)
+        times.append(time.perf_counter() - start)
+
+    return {
+        "vertices": graph.number_of_nodes(),
+        "edges": graph.number_of_edges(),
+        "min_time": min(times),
+        "mean_time": sum(times) / len(times),
+        "times": times,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if resource
+        else None,
+        "iterations": stats.get("iterations"),
+        "path": stats.get("path"),
+        "result_size": result_size(result),
+    }
+
+
+def _case_process(connection, *args):
+    try:
+        connection.send(run_case(*args))
+    except Exception as e:
+        connection.send({"error": repr(e)})
+    finally:
+        connection.close()
+
+
+def measure(workload, engine, size, repeat, warmup, timeout=None):
+    """
+    Runs case in a fresh process
+    :return: record of the case
+    """
+    record = {
+        "workload": workload.name,
+        "kind": workload.kind,
+        "engine": engine,
+        "size": size,
+        "repeat": repeat,
+        "warmup": warmup,
+    }
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_case_process, args=(child, workload.name, engine, size, repeat, warmup)
+    )
+    process.start()
+    child.close()
+    if parent.poll(timeout):
+        record.update(parent.recv())
+    else:
+        process.terminate()
+        record["error"] = f"timeout after {timeout}s"
+    process.join()
+    return record
+
+
+def write_results(records, path: str):
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            writer.writeheader()
+            for record in records:
+                row = {field: record.get(field) for field in FIELDS}
+                row["times"] = " ".join(map(str, record.get("times", [])))
+                writer.writerow(row)
+    else:
+        with open(path, "w") as file:
+            json.dump(
+                {"machine": platform.platform(), "records": records}, file, indent=2
+            )
+
+
+def read_results(path: str):
+    """
+    Reads records written by write_results
+    :param path: path to .json or .csv file
+    :return: list of records
+    """
+    if path.endswith(".csv"):
+        with open(path, newline="") as file:
+            records = list(csv.DictReader(file))
+        for record in records:
+            for field in ("min_time", "mean_time", "peak_rss_kb"):
+                record[field] = float(record[field]) if record[field] else None
+            record["size"] = int(record["size"])
+        return records
+    with open(path) as file:
+        return json.load(file)["records"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workloads", nargs="*", help="names of workloads to run")
+    parser.add_argument("--engines", nargs="*", help="names of engines to run")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 20, 40])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--timeout", type=float, help="seconds per case")
+    parser.add_argument("--output", default="results.json", help=".json or .csv")
+    args = parser.parse_args()
+
+    records = []
+    for workload in WORKLOADS:
+        if args.workloads and workload.name not in args.workloads:
+            continue
+        for engine in ENGINES[workload.kind]:
+            if args.engines and engine not in args.engines:
+                continue
+            for size in args.sizes:
+                record = measure(
+                    workload, engine, size, args.repeat, args.warmup, args.timeout
+                )
+                records.append(record)
+                print(
+                    f"{workload.name:>26} {engine:>20} {size:>6} "
+                    + (
+                        record["error"]
+                        if "error" in record
+                        else f"{record['min_time']:>9.4f}s "
+                        f"{record['peak_rss_kb']} KB "
+                        f"iterations={record['iterations']} path={record['path']}"
+                    ),
+                    flush=True,
+                )
+    write_results(records, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Synthetic workloads of the benchmark suite. Every workload is built offline
+and deterministically, so results of different runs are comparable
+"""
+from collections import namedtuple
+
+import cfpq_data as cd
+import networkx as nx
+import numpy as np
+from pyformlang.cfg import CFG
+
+Workload = namedtuple("Workload", ["name", "kind", "graph", "query"])
+Workload.__doc__ = """
+Benchmark case: kind is "cfpq" (query is CFG text) or "rpq" (query is regex text),
+graph is a function of size building the graph
+"""
+
+GRAMMARS = {
+    "dyck": """
+        S -> a S b S
+        S -> epsilon
+        """,
+    "anbn": """
+        S -> a S b
+        S -> a b
+        """,
+    "same_generation": """
+        S -> a S b
+        S -> c S d
+        S -> a b
+        S -> c d
+        """,
+}
+
+REGEXES = {
+    "star_concat": "a* b",
+    "alternation_star": "(a | b)* a",
+    "four_labels": "(a | c)* (b | d)",
+}
+
+
+def two_cycles_graph(size: int, labels=("a", "b")) -> nx.MultiDiGraph:
+    return cd.labeled_two_cycles_graph(size, size - 1, labels=labels)
+
+
+def cycle_graph(size: int, label="a") -> nx.MultiDiGraph:
+    return cd.labeled_cycle_graph(size, label=label)
+
+
+def random_graph(
+    size: int, edges_per_vertex: int = 2, labels=("a", "b", "c", "d"), seed=42
+) -> nx.MultiDiGraph:
+    """
+    Random graph with vertices 0..size-1 and uniformly chosen edges and labels
+    :param size: number of vertices
+    :param edges_per_vertex: average out degree
+    :param labels: labels of edges
+    :param seed: seed of random generator
+    :return: graph
+    """
+    rng = np.random.default_rng(seed)
+    n_edges = size * edges_per_vertex
+    sources = rng.integers(0, size, n_edges).tolist()
+    targets = rng.integers(0, size, n_edges).tolist()
+    edge_labels = rng.choice(list(labels), n_edges).tolist()
+
+    graph = nx.MultiDiGraph()
+    graph.add_nodes_from(range(size))
+    graph.add_edges_from(
+        (u, v, {"label": label}) for u, v, label in zip(sources, targets, edge_labels)
+    )
+    return graph
+
+
+WORKLOADS = [
+    Workload("two_cycles/anbn", "cfpq", two_cycles_graph, GRAMMARS["anbn"]),
+    Workload("two_cycles/dyck", "cfpq", two_cycles_graph, GRAMMARS["dyck"]),
+    Workload(
+        "random/same_generation", "cfpq", random_graph, GRAMMARS["same_generation"]
+    ),
+    Workload(
+        "cycle/a_star",
+        "cfpq",
+        lambda size: cycle_graph(size, label="a"),
+        """
+        S -> a S
+        S -> epsilon
+        """,
+    ),
+    Workload("two_cycles/star_concat", "rpq", two_cycles_graph, REGEXES["star_concat"]),
+    Workload(
+        "random/alternation_star", "rpq", random_graph, REGEXES["alternation_star"]
+    ),
+    Workload("random/four_labels", "rpq", random_graph, REGEXES["four_labels"]),
+]
+
+
+def parse_query(workload: Workload):
+    if workload.kind == "cfpq":
+        return CFG.from_text(workload.query)
+    return workload.query
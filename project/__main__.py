@@ -1 +1,5 @@
-print("exec sources directory")
+import sys
+
+from project.interpreter import main
+
+sys.exit(main())
@@ -1,8 +1,11 @@
 from abc import ABC, abstractmethod
+from typing import Tuple, Union
+
+import numpy as np
 from pyformlang.finite_automaton import State, NondeterministicFiniteAutomaton
 from pyformlang.cfg import Variable
-from scipy import sparse
 
+from project.matrix_backend import BoolMatrixBackend, get_backend
 from project.task7.RecursiveFA import RecursiveFA
 
 
@@ -14,6 +17,8 @@ class BoolMatrix(ABC):
         self.bool_matrices = {}
         self.state_indices = {}
         self.states_to_box_variable = {}
+        self.box_states = []
+        self.backend = get_backend()
 
     def get_states(self):
         return self.state_indices.keys()
@@ -25,83 +30,79 @@ class BoolMatrix(ABC):
         return self.final_states.copy()
 
     @classmethod
-    def from_rfa(cls, rfa: RecursiveFA):
+    def from_rfa(cls, rfa: RecursiveFA, backend: Union[str, BoolMatrixBackend] = None):
+        """
+        Build matrices of recursive fa: states of all the boxes are numbered
+        consecutively, box by box, and every label matrix is built by one call
+        of the backend from the collected cells
+        :param rfa: recursive fa
+        :param backend: boolean matrix backend or its name, default backend if None
+        :return: matrices of rfa, state_indices are keyed by (box variable, state)
+        and box_states maps indices back to these pairs
+        """
         bm = cls()
-        bm.num_states = sum(len(box.dfa.states) for box in rfa.boxes)
-        box_idx = 0
+        bm.backend = get_backend(backend)
+        label_ids = {}
+        labels, rows, cols = [], [], []
 
         for box in rfa.boxes:
-            for idx, state in enumerate(box.dfa.states):
-                new_name = bm._rename_rsm_box_state(state, box.variable)
-                bm.state_indices[new_name] = idx + box_idx
-                if state in box.dfa.start_states:
-                    bm.start_states.add(bm.state_indices[new_name])
-                if state in box.dfa.final_states:
-                    bm.final_states.add(bm.state_indices[new_name])
+            box_idx = len(bm.box_states)
+            ids = {state: box_idx + idx for idx, state in enumerate(box.dfa.states)}
+            bm.box_states.extend((box.variable, state) for state in ids)
+            bm.state_indices.update(
+                ((box.variable, state), idx) for state, idx in ids.items()
+            )
+            bm.start_states.update(ids[state] for state in box.dfa.start_states)
+            bm.final_states.update(ids[state] for state in box.dfa.final_states)
             bm.states_to_box_variable.update(
-                {
-                    (
-                        bm.state_indices[
-                            bm._rename_rsm_box_state(box.dfa.start_state, box.variable)
-                        ],
-                        bm.state_indices[bm._rename_rsm_box_state(state, box.variable)],
-                    ): box.variable.value
-                    for state in box.dfa.final_states
-                }
+                ((ids[box.dfa.start_state], ids[state]), box.variable.value)
+                for state in box.dfa.final_states
+            )
+
+            # iterating over automaton yields its edges, to_dict deep copies them
+            for s_from, label, s_to in box.dfa:
+                labels.append(label_ids.setdefault(str(label), len(label_ids)))
+                rows.append(ids[s_from])
+                cols.append(ids[s_to])
+
+        bm.num_states = len(bm.box_states)
+        labels = np.asarray(labels, dtype=np.int64)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(len(label_ids) + 1))
+        rows = np.asarray(rows, dtype=np.int64)[order]
+        cols = np.asarray(cols, dtype=np.int64)[order]
+        bm.bool_matrices = {
+            label: bm._create_bool_matrix(
+                rows[bounds[i] : bounds[i + 1]], cols[bounds[i] : bounds[i + 1]]
             )
-            bm.bool_matrices.update(bm._create_box_bool_matrices(box))
-            box_idx += len(box.dfa.states)
+            for label, i in label_ids.items()
+        }
         return bm
 
     def get_nonterminals(self, s_from, s_to):
         return self.states_to_box_variable.get((s_from, s_to))
 
-    def _rename_rsm_box_state(self, state: State, box_var: Variable):
-        return State(f"{state.value}#{box_var.value}")
-
-    def _create_box_bool_matrices(self, box: RecursiveFA.Box):
-        bool_matrices = {}
-
-        for s_from, trans in box.dfa.to_dict().items():
-            for label, states_to in trans.items():
-                if not isinstance(states_to, set):
-                    states_to = {states_to}
-                for s_to in states_to:
-                    idx_from = self.state_indices[
-                        self._rename_rsm_box_state(s_from, box.variable)
-                    ]
-                    idx_to = self.state_indices[
-                        self._rename_rsm_box_state(s_to, box.variable)
-                    ]
-                    label = str(label)
-                    if label in self.bool_matrices:
-                        self.bool_matrices[label][idx_from, idx_to] = True
-                        continue
-                    if label not in bool_matrices:
-                        bool_matrices[label] = self._create_bool_matrix(
-                            (self.num_states, self.num_states)
-                        )
-                    bool_matrices[label][idx_from, idx_to] = True
-
-        return bool_matrices
+    def get_box_state(self, idx: int) -> Tuple[Variable, State]:
+        """
+        :param idx: index of state of matrices built by from_rfa
+        :return: box variable and state of its dfa
+        """
+        return self.box_states[idx]
 
     def _create_bool_matrices(self, automaton):
-        bool_matrices = {}
+        cells = {}
         for s_from, trans in automaton.to_dict().items():
             for label, states_to in trans.items():
                 if not isinstance(states_to, set):
                     states_to = {states_to}
                 for s_to in states_to:
-                    idx_from = self.state_indices[s_from]
-                    idx_to = self.state_indices[s_to]
-                    label = str(label)
-                    if label not in bool_matrices:
-                        bool_matrices[label] = self._create_bool_matrix(
-                            (self.num_states, self.num_states)
-                        )
-                    bool_matrices[label][idx_from, idx_to] = True
-        return bool_matrices
+                    rows, cols = cells.setdefault(str(label), ([], []))
+                    rows.append(self.state_indices[s_from])
+                    cols.append(self.state_indices[s_to])
+        return {
+            label: self._create_bool_matrix(rows, cols)
+            for label, (rows, cols) in cells.items()
+        }
 
-    @staticmethod
-    def _create_bool_matrix(shape):
-        return sparse.dok_matrix(shape, dtype=bool)
+    def _create_bool_matrix(self, rows, cols):
+        return self.backend.from_coo(rows, cols, (self.num_states, self.num_states))
@@ -1,32 +1,120 @@
-from typing import Set, Tuple, Iterable, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Set, Tuple, Iterable, Iterator, Dict, List, Union
 
-import networkx as nx
+import numpy as np
 from pyformlang.cfg import CFG, Variable
 from scipy import sparse
 
-from project.wcnf import cfg_to_wcnf
-
-
-def hellings(graph: nx.MultiDiGraph, cfg: CFG) -> Set[Tuple]:
+from project.boolMatrix import BoolMatrix
+from project.cfpq_result import (
+    CHUNK_SIZE,
+    CFPQResult,
+    iter_matrix_chunks,
+    iter_triples,
+    vertex_array,
+)
+from project.graph_utils import edges_by_label, graph_vertices
+from project.labeled_graph import Graph
+from project.matrix_backend import BoolMatrixBackend, get_backend, transitive_closure
+from project.regular_cfpq import linear_direction, regular_cfpq, regular_matrices
+from project.task7.RecursiveFA import RecursiveFA
+from project.task7.ecfg import ExtendedContextFreeGrammatic as ECFG
+from project.wcnf import CompiledGrammar, normalize
+
+
+def hellings(
+    graph: Graph,
+    cfg: CFG,
+    indexed: bool = True,
+    detect_regular: bool = True,
+    stats: Dict = None,
+) -> Set[Tuple]:
     """
     Apply hellings algorithm to graph
     :param graph: given graph
     :param cfg: context free grammar
+    :param indexed: use per-vertex indexes of derived triples instead of rescanning
+    the whole result on every step
+    :param detect_regular: answer right- or left-linear grammars with regular_cfpq
+    :param stats: if given, "path" key is set to "regular" or "hellings"
     :return: set of tuples of vertex, nonterminal, vertex
     """
-    wcnf = cfg_to_wcnf(cfg)
+    grammar = normalize(cfg).compiled
+    if detect_regular:
+        direction = linear_direction(grammar)
+        if direction is not None:
+            _set_path(stats, "regular")
+            return regular_cfpq(graph, grammar, direction)
+    _set_path(stats, "hellings")
+    return _named_triples(
+        grammar, _hellings_ids(graph, grammar, indexed), _vertex_array(graph)
+    )
+
+
+def hellings_result(
+    graph: Graph,
+    cfg: CFG,
+    indexed: bool = True,
+    detect_regular: bool = True,
+    stats: Dict = None,
+) -> CFPQResult:
+    """
+    Apply hellings algorithm to graph, the same as hellings without building
+    the set of named triples
+    :param graph: given graph
+    :param cfg: context free grammar
+    :param indexed: see hellings
+    :param detect_regular: answer right- or left-linear grammars with regular_matrices
+    :param stats: if given, "path" key is set to "regular" or "hellings"
+    :return: columnar result
+    """
+    grammar = normalize(cfg).compiled
+    if detect_regular:
+        direction = linear_direction(grammar)
+        if direction is not None:
+            _set_path(stats, "regular")
+            backend = get_backend()
+            return CFPQResult.from_matrices(
+                grammar.nonterminals,
+                regular_matrices(graph, grammar, direction, backend),
+                backend,
+                _vertex_array(graph),
+            )
+    _set_path(stats, "hellings")
+    return CFPQResult.from_triples(
+        grammar.nonterminals,
+        _hellings_ids(graph, grammar, indexed),
+        _vertex_array(graph),
+    )
 
-    eps_prod_heads = [p.head.value for p in wcnf.productions if not p.body]
-    term_productions = {p for p in wcnf.productions if len(p.body) == 1}
-    var_productions = {p for p in wcnf.productions if len(p.body) == 2}
 
-    r = {(v, h, v) for v in range(graph.number_of_nodes()) for h in eps_prod_heads} | {
-        (u, p.head.value, v)
-        for u, v, edge_data in graph.edges(data=True)
-        for p in term_productions
-        if p.body[0].value == edge_data["label"]
+def _hellings_ids(graph: Graph, grammar: CompiledGrammar, indexed: bool) -> Set[Tuple]:
+    """
+    :return: set of tuples of vertex index, nonterminal id, vertex index
+    """
+
+    edges = grammar.intern_edges(edges_by_label(graph))
+    r = {
+        (v, h, v) for v in range(graph.number_of_nodes()) for h in grammar.eps_heads
+    } | {
+        (u, head, v)
+        for head, label in grammar.term_productions
+        if label in edges
+        for u, v in zip(*(vertices.tolist() for vertices in edges[label]))
     }
 
+    if indexed:
+        return _hellings_indexed(r, grammar)
+    return _hellings_scan(r, grammar.var_productions)
+
+
+def _hellings_scan(r: Set[Tuple], var_productions: Iterable) -> Set[Tuple]:
+    """
+    Worklist loop of hellings algorithm which rescans all derived triples on every step
+    :param r: initial triples over nonterminal ids
+    :param var_productions: (A, B, C) of productions A -> B C
+    :return: set of tuples of vertex, nonterminal id, vertex
+    """
     copied = r.copy()
     while copied:
         n, N, m = copied.pop()
@@ -35,11 +123,9 @@ def hellings(graph: nx.MultiDiGraph, cfg: CFG) -> Set[Tuple]:
         for u, M, v in r:
             if v == n:
                 triple = {
-                    (u, p.head.value, m)
-                    for p in var_productions
-                    if p.body[0].value == M
-                    and p.body[1].value == N
-                    and (u, p.head.value, m) not in r
+                    (u, head, m)
+                    for head, b, c in var_productions
+                    if b == M and c == N and (u, head, m) not in r
                 }
                 r_step |= triple
         r |= r_step
@@ -49,11 +135,9 @@ def hellings(graph: nx.MultiDiGraph, cfg: CFG) -> Set[Tuple]:
         for u, M, v in r:
             if u == m:
                 triple = {
-                    (n, p.head.value, v)
-                    for p in var_productions
-                    if p.body[0].value == N
-                    and p.body[1].value == M
-                    and (n, p.head.value, v) not in r
+                    (n, head, v)
+                    for head, b, c in var_productions
+                    if b == N and c == M and (n, head, v) not in r
                 }
                 r_step |= triple
         r |= r_step
@@ -62,97 +146,862 @@ def hellings(graph: nx.MultiDiGraph, cfg: CFG) -> Set[Tuple]:
     return r
 
 
+def _hellings_indexed(r: Set[Tuple], grammar: CompiledGrammar) -> Set[Tuple]:
+    """
+    Worklist loop of hellings algorithm over indexes of derived triples:
+    incoming[v][N] holds every u with (u, N, v) derived, outgoing[u][N] every such v.
+    Productions are looked up by their bodies, so each popped triple only touches
+    its neighbours in the index
+    :param r: initial triples over nonterminal ids
+    :param grammar: compiled grammar
+    :return: set of tuples of vertex, nonterminal id, vertex
+    """
+    incoming = {}
+    outgoing = {}
+
+    def add_to_index(u, N, v):
+        incoming.setdefault(v, {}).setdefault(N, set()).add(u)
+        outgoing.setdefault(u, {}).setdefault(N, set()).add(v)
+
+    for u, N, v in r:
+        add_to_index(u, N, v)
+
+    worklist = list(r)
+    while worklist:
+        n, N, m = worklist.pop()
+        r_step = set()
+
+        ending_in_n = incoming.get(n, {})
+        for head, M in grammar.by_right[N]:
+            r_step.update((u, head, m) for u in ending_in_n.get(M, ()))
+
+        starting_in_m = outgoing.get(m, {})
+        for head, M in grammar.by_left[N]:
+            r_step.update((n, head, v) for v in starting_in_m.get(M, ()))
+
+        for triple in r_step - r:
+            r.add(triple)
+            add_to_index(*triple)
+            worklist.append(triple)
+
+    return r
+
+
 def query_hellings(
-    graph: nx.MultiDiGraph,
+    graph: Graph,
     cfg: CFG,
     start_vertices: Iterable,
     final_vertices: Iterable,
-    nonterminals: Variable,
-) -> Dict[int, int]:
-    result = {u: set() for u in start_vertices}
-    hell = hellings(graph, cfg)
-    for u, nt, v in hell:
-        if nt == nonterminals and u in start_vertices and v in final_vertices:
-            result[u].add(v)
-    return result
-
+    nonterminals: Union[Variable, str],
+    multi_source: bool = True,
+) -> Dict[int, Set[int]]:
+    """
+    :param graph: given graph
+    :param cfg: context free grammar
+    :param start_vertices: vertices where paths start
+    :param final_vertices: vertices where paths end
+    :param nonterminals: nonterminal deriving the paths
+    :param multi_source: derive triples only from start vertices instead of filtering
+    all pairs result
+    :return: reachable final vertices by start vertices
+    """
+    start_vertices = set(start_vertices)
+    final_vertices = set(final_vertices)
+    nonterminal = _nonterminal_value(nonterminals)
+    if multi_source:
+        triples = hellings_from_sources(graph, cfg, start_vertices, nonterminal)
+    else:
+        triples = hellings(graph, cfg)
+    return _triples_to_query(triples, start_vertices, final_vertices, nonterminal)
+
+
+def hellings_from_sources(
+    graph: Graph, cfg: CFG, start_vertices: Iterable, nonterminal=None
+) -> Set[Tuple]:
+    """
+    Demand-driven hellings algorithm: triple (u, A, v) is derived only if paths
+    from u derived from A are demanded. Start vertices demand the nonterminal,
+    demanded A at u with production A -> B C demands B at u and C at the end of
+    every path from u derived from B
+    :param graph: given graph
+    :param cfg: context free grammar
+    :param start_vertices: vertices where paths start
+    :param nonterminal: nonterminal demanded at start vertices, start symbol if None
+    :return: set of tuples of vertex, nonterminal, vertex
+    """
+    nonterminal = _nonterminal_value(nonterminal or cfg.start_symbol)
+    grammar = normalize(_with_start_symbol(cfg, nonterminal)).compiled
+    if nonterminal not in grammar.nonterminal_ids:
+        return set()
+
+    n = graph.number_of_nodes()
+    vertices = graph_vertices(graph)
+    indices = {vertex: idx for idx, vertex in enumerate(vertices)}
+    adjacency = {
+        label: sparse.csr_matrix(
+            (np.ones(len(sources), dtype=bool), (sources, targets)), shape=(n, n)
+        )
+        for label, (sources, targets) in grammar.intern_edges(
+            edges_by_label(graph)
+        ).items()
+    }
 
-def from_text_hellings(graph: nx.MultiDiGraph, cfg: str):
+    r = set()
+    demanded = set()
+    incoming = {}
+    outgoing = {}
+    worklist = []
+    start_id = grammar.nonterminal_ids[nonterminal]
+    demands = [(start_id, indices[u]) for u in start_vertices if u in indices]
+
+    def derive(u, N, v):
+        if (u, N, v) not in r:
+            r.add((u, N, v))
+            incoming.setdefault(v, {}).setdefault(N, set()).add(u)
+            outgoing.setdefault(u, {}).setdefault(N, set()).add(v)
+            worklist.append((u, N, v))
+
+    while demands or worklist:
+        while demands:
+            A, u = demands.pop()
+            if (A, u) in demanded:
+                continue
+            demanded.add((A, u))
+            if grammar.is_eps[A]:
+                derive(u, A, u)
+            for label in grammar.term_labels[A]:
+                if label in adjacency:
+                    matrix = adjacency[label]
+                    for v in matrix.indices[matrix.indptr[u] : matrix.indptr[u + 1]]:
+                        derive(u, A, int(v))
+            for b, c in grammar.by_head[A]:
+                demands.append((b, u))
+                for w in list(outgoing.get(u, {}).get(b, ())):
+                    demands.append((c, w))
+                    for v in list(outgoing.get(w, {}).get(c, ())):
+                        derive(u, A, v)
+
+        if worklist:
+            n_, N, m = worklist.pop()
+            for head, c in grammar.by_left[N]:
+                if (head, n_) in demanded:
+                    demands.append((c, m))
+                    for v in list(outgoing.get(m, {}).get(c, ())):
+                        derive(n_, head, v)
+            for head, b in grammar.by_right[N]:
+                for u in list(incoming.get(n_, {}).get(b, ())):
+                    if (head, u) in demanded:
+                        derive(u, head, m)
+
+    return _named_triples(grammar, r, vertex_array(vertices))
+
+
+def from_text_hellings(graph: Graph, cfg: str):
     return hellings(graph, CFG.from_text(cfg))
 
 
-def from_file_hellings(graph: nx.MultiDiGraph, filename: str) -> Set[Tuple]:
+def from_file_hellings(graph: Graph, filename: str) -> Set[Tuple]:
     with open(filename) as file:
         return from_text_hellings(graph, file.read())
 
 
-def matrix_based(graph: nx.MultiDiGraph, cfg: CFG) -> Set[Tuple[int, str, int]]:
+def matrix_based(
+    graph: Graph,
+    cfg: CFG,
+    semi_naive: bool = False,
+    stats: Dict = None,
+    backend: Union[str, BoolMatrixBackend] = None,
+    workers: int = None,
+    detect_regular: bool = True,
+) -> Set[Tuple[int, str, int]]:
     """
     Returns reachability of vertices
     :param graph:
     :param cfg:
+    :param semi_naive: multiply only the cells derived since the production was
+    last multiplied instead of the whole matrices, see _semi_naive_fixpoint
+    :param stats: if given, number of fixpoint iterations is stored by "iterations" key
+    :param backend: boolean matrix backend or its name, default backend if None
+    :param workers: if given, products of productions which do not read each other's
+    heads are computed by this number of threads, see _parallel_fixpoint
+    :param detect_regular: answer right- or left-linear grammars with regular_cfpq,
+    "path" key of stats is set to "regular" or "matrix"
     :return: set of tuples of vertex, nonterminal, vertex
     """
-    wcnf = cfg_to_wcnf(cfg)
-
-    epsilon_prod = [p.head.value for p in wcnf.productions if not p.body]
+    backend = get_backend(backend)
+    nonterminals, matrices = _matrix_fixpoint(
+        graph, cfg, semi_naive, stats, backend, workers, detect_regular
+    )
+    return _matrix_triples(nonterminals, matrices, backend, _vertex_array(graph))
 
-    term_productions = {p for p in wcnf.productions if len(p.body) == 1}
-    var_productions = {p for p in wcnf.productions if len(p.body) == 2}
-
-    nodes_num = graph.number_of_nodes()
-
-    matrices = {
-        v.value: sparse.dok_matrix((nodes_num, nodes_num), dtype=bool)
-        for v in wcnf.variables
-    }
 
-    for i, j, data in graph.edges(data=True):
-        l = data["label"]
-        for v in {p.head.value for p in term_productions if p.body[0].value == l}:
-            matrices[v][i, j] = True
+def matrix_based_result(
+    graph: Graph,
+    cfg: CFG,
+    semi_naive: bool = False,
+    stats: Dict = None,
+    backend: Union[str, BoolMatrixBackend] = None,
+    workers: int = None,
+    detect_regular: bool = True,
+) -> CFPQResult:
+    """
+    The same as matrix_based, but cells of matrices are returned as arrays
+    instead of the set of triples
+    :return: columnar result
+    """
+    backend = get_backend(backend)
+    nonterminals, matrices = _matrix_fixpoint(
+        graph, cfg, semi_naive, stats, backend, workers, detect_regular
+    )
+    return CFPQResult.from_matrices(
+        nonterminals, matrices, backend, _vertex_array(graph)
+    )
 
-    for i in range(nodes_num):
-        for v in epsilon_prod:
-            matrices[v][i, i] = True
 
+def iter_matrix_based(
+    graph: Graph,
+    cfg: CFG,
+    chunk_size: int = CHUNK_SIZE,
+    semi_naive: bool = False,
+    stats: Dict = None,
+    backend: Union[str, BoolMatrixBackend] = None,
+    workers: int = None,
+    detect_regular: bool = True,
+) -> Iterator[Tuple[int, str, int]]:
+    """
+    The same as matrix_based, but triples are yielded from matrices chunk by chunk,
+    so only arrays of one chunk exist besides the matrices
+    :param chunk_size: number of cells converted to triples at once
+    :return: iterator over tuples of vertex, nonterminal, vertex
+    """
+    backend = get_backend(backend)
+    nonterminals, matrices = _matrix_fixpoint(
+        graph, cfg, semi_naive, stats, backend, workers, detect_regular
+    )
+    return iter_triples(
+        iter_matrix_chunks(
+            nonterminals, matrices, backend, chunk_size, _vertex_array(graph)
+        )
+    )
+
+
+def _matrix_fixpoint(
+    graph: Graph,
+    cfg: CFG,
+    semi_naive: bool,
+    stats: Dict,
+    backend: BoolMatrixBackend,
+    workers: int,
+    detect_regular: bool,
+) -> Tuple[List[str], List]:
+    """
+    :return: nonterminal names and matrices by nonterminal ids over vertex indices
+    of edges_by_label
+    """
+    grammar = normalize(cfg).compiled
+    if detect_regular:
+        direction = linear_direction(grammar)
+        if direction is not None:
+            _set_path(stats, "regular")
+            return grammar.nonterminals, regular_matrices(
+                graph, grammar, direction, backend
+            )
+    _set_path(stats, "matrix")
+    var_productions = grammar.var_productions
+    matrices = _initial_matrices(
+        grammar,
+        grammar.intern_edges(edges_by_label(graph)),
+        graph.number_of_nodes(),
+        backend,
+    )
+
+    if workers:
+        iterations = _parallel_fixpoint(
+            matrices, var_productions, backend, workers, semi_naive
+        )
+    elif semi_naive:
+        iterations = _semi_naive_fixpoint(matrices, var_productions, backend)
+    else:
+        iterations = _naive_fixpoint(matrices, var_productions, backend)
+    if stats is not None:
+        stats["iterations"] = iterations
+    return grammar.nonterminals, matrices
+
+
+def _initial_matrices(
+    grammar: CompiledGrammar,
+    edges: Dict[int, Tuple[np.ndarray, np.ndarray]],
+    nodes_num: int,
+    backend: BoolMatrixBackend,
+) -> List:
+    """
+    Matrices of nonterminals derived by epsilon and terminal productions only
+    :param grammar: compiled grammar in weak chomsky normal form
+    :param edges: sources and targets of edges by terminal ids
+    :param nodes_num: size of the matrices
+    :param backend: boolean matrix backend
+    :return: matrices by nonterminal ids
+    """
+    cells = [([], []) for _ in grammar.nonterminals]
+
+    for head, label in grammar.term_productions:
+        if label in edges:
+            sources, targets = edges[label]
+            cells[head][0].append(sources)
+            cells[head][1].append(targets)
+
+    for v in grammar.eps_heads:
+        cells[v][0].append(np.arange(nodes_num))
+        cells[v][1].append(np.arange(nodes_num))
+
+    return [
+        backend.from_coo(
+            np.concatenate(rows) if rows else [],
+            np.concatenate(cols) if cols else [],
+            (nodes_num, nodes_num),
+        )
+        for rows, cols in cells
+    ]
+
+
+def _naive_fixpoint(
+    matrices: List, var_productions: Iterable, backend: BoolMatrixBackend
+) -> int:
+    """
+    Multiplies full matrices of production bodies until nothing changes
+    :param matrices: matrices by nonterminal ids, updated in place
+    :param var_productions: ids (A, B, C) of productions A -> B C
+    :param backend: backend of the matrices
+    :return: number of iterations
+    """
+    iterations = 0
     changed = True
     while changed:
+        iterations += 1
         changed = False
-        for p in var_productions:
-            old_nnz = matrices[p.head.value].nnz
-            matrices[p.head.value] += (
-                matrices[p.body[0].value] @ matrices[p.body[1].value]
+        for head, b, c in var_productions:
+            old_nnz = backend.nnz(matrices[head])
+            matrices[head] = backend.add(
+                matrices[head], backend.matmul(matrices[b], matrices[c])
             )
-            new_nnz = matrices[p.head.value].nnz
+            new_nnz = backend.nnz(matrices[head])
             changed = changed or old_nnz != new_nnz
+    return iterations
 
-    return {
-        (u, variable, v)
-        for variable, matrix in matrices.items()
-        for u, v in zip(*matrix.nonzero())
-    }
+
+def _semi_naive_fixpoint(
+    matrices: List,
+    var_productions: Iterable,
+    backend: BoolMatrixBackend,
+    deltas: List = None,
+) -> int:
+    """
+    Computes the same fixpoint as _naive_fixpoint, but A -> B C multiplies only
+    delta_B @ C + B @ delta_C, where deltas hold cells of B and C which were derived
+    after the last multiplication of this production. Cells are added to the matrices
+    right away, so later productions of the same iteration see them as the naive loop
+    does, and no production multiplies the same delta twice
+    :param matrices: matrices by nonterminal ids, updated in place
+    :param var_productions: ids (A, B, C) of productions A -> B C
+    :param backend: backend of the matrices
+    :param deltas: cells of every nonterminal to start from, whole matrices if None
+    :return: number of iterations
+    """
+    var_productions = list(var_productions)
+    pending, users = _pending_deltas(matrices, var_productions, backend, deltas)
+
+    iterations = 0
+    while any(left or right for left, right in pending):
+        iterations += 1
+        for i, (head, _, _) in enumerate(var_productions):
+            step = _delta_product(matrices, var_productions, pending, i, backend)
+            if step is not None:
+                _add_new_cells(matrices, head, step, pending, users, backend)
+    return iterations
+
+
+def _pending_deltas(
+    matrices: List, var_productions: List, backend: BoolMatrixBackend, deltas: List
+) -> Tuple[List, List]:
+    """
+    :return: cells derived since every production was multiplied, as lists of
+    matrices for the left and the right nonterminal of its body, and positions
+    (production, side) of every nonterminal in bodies
+    """
+    deltas = matrices if deltas is None else deltas
+    pending = [
+        (
+            [deltas[b]] if backend.nnz(deltas[b]) else [],
+            [deltas[c]] if backend.nnz(deltas[c]) else [],
+        )
+        for _, b, c in var_productions
+    ]
+    users = [[] for _ in matrices]
+    for i, (_, b, c) in enumerate(var_productions):
+        users[b].append((i, 0))
+        users[c].append((i, 1))
+    return pending, users
+
+
+def _delta_product(
+    matrices: List, var_productions: List, pending: List, i: int, backend
+):
+    """
+    Takes pending deltas of production i
+    :return: delta_B @ C + B @ delta_C, None if there are no deltas
+    """
+    _, b, c = var_productions[i]
+    left, right = pending[i]
+    if not left and not right:
+        return None
+    pending[i] = ([], [])
+    step = None
+    if left:
+        step = backend.matmul(_union_all(left, backend), matrices[c])
+    if right:
+        product = backend.matmul(matrices[b], _union_all(right, backend))
+        step = product if step is None else backend.add(step, product)
+    return step
+
+
+def _add_new_cells(
+    matrices: List, head: int, step, pending: List, users: List, backend
+) -> bool:
+    """
+    Adds cells of step to the matrix of head and pending deltas of its users
+    :return: whether there were new cells
+    """
+    new_cells = backend.difference(step, matrices[head])
+    if not backend.nnz(new_cells):
+        return False
+    matrices[head] = backend.add(matrices[head], new_cells)
+    for user, side in users[head]:
+        pending[user][side].append(new_cells)
+    return True
+
+
+def _union_all(parts: List, backend: BoolMatrixBackend):
+    result = parts[0]
+    for part in parts[1:]:
+        result = backend.add(result, part)
+    return result
+
+
+def _parallel_fixpoint(
+    matrices: List,
+    var_productions: Iterable,
+    backend: BoolMatrixBackend,
+    workers: int,
+    semi_naive: bool = False,
+) -> int:
+    """
+    Computes the same fixpoint as _naive_fixpoint or _semi_naive_fixpoint in the same
+    iterations. Productions are split into stages by _stages, products of a stage are
+    computed on a thread pool (scipy releases the GIL in sparse matmul) and merged
+    into the matrices before the next stage, which is what the sequential loops do.
+    Threads pay off only with several cpus and products large enough to outweigh
+    the round trip to the pool
+    :param matrices: matrices by nonterminal ids, updated in place
+    :param var_productions: ids (A, B, C) of productions A -> B C
+    :param backend: backend of the matrices
+    :param workers: number of threads
+    :param semi_naive: multiply deltas as _semi_naive_fixpoint does
+    :return: number of iterations
+    """
+    var_productions = list(var_productions)
+    stages = _stages(var_productions)
+    if semi_naive:
+        pending, users = _pending_deltas(matrices, var_productions, backend, None)
+
+    def product(i):
+        if semi_naive:
+            return _delta_product(matrices, var_productions, pending, i, backend)
+        _, b, c = var_productions[i]
+        return backend.matmul(matrices[b], matrices[c])
+
+    iterations = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        changed = True
+        while changed:
+            iterations += 1
+            changed = False
+            for stage in stages:
+                if len(stage) > 1:
+                    steps = list(executor.map(product, stage))
+                else:  # a single product is not worth a round trip to the pool
+                    steps = [product(stage[0])]
+                for i, step in zip(stage, steps):
+                    head = var_productions[i][0]
+                    if step is None:
+                        continue
+                    if semi_naive:
+                        _add_new_cells(matrices, head, step, pending, users, backend)
+                        continue
+                    old_nnz = backend.nnz(matrices[head])
+                    matrices[head] = backend.add(matrices[head], step)
+                    changed = changed or old_nnz != backend.nnz(matrices[head])
+            if semi_naive:
+                changed = any(left or right for left, right in pending)
+    return iterations
+
+
+def _stages(var_productions: List) -> List[List[int]]:
+    """
+    Splits productions into stages of consecutive productions whose bodies have no
+    head of their stage, so that matrices before the stage are the ones which every
+    production of the stage reads in the sequential loop
+    :param var_productions: ids (A, B, C) of productions A -> B C
+    :return: indices of productions of every stage
+    """
+    stages = []
+    heads = set()
+    for i, (head, b, c) in enumerate(var_productions):
+        if not stages or b in heads or c in heads:
+            stages.append([])
+            heads = set()
+        stages[-1].append(i)
+        heads.add(head)
+    return stages
 
 
 def query_matrix(
-    graph: nx.MultiDiGraph,
+    graph: Graph,
     cfg: CFG,
     start_vertices: Iterable,
     final_vertices: Iterable,
-    nonterminals: Variable,
-) -> Dict[int, int]:
+    nonterminals: Union[Variable, str],
+    semi_naive: bool = False,
+    backend: Union[str, BoolMatrixBackend] = None,
+    multi_source: bool = True,
+) -> Dict[int, Set[int]]:
+    """
+    :param graph: given graph
+    :param cfg: context free grammar
+    :param start_vertices: vertices where paths start
+    :param final_vertices: vertices where paths end
+    :param nonterminals: nonterminal deriving the paths
+    :param semi_naive: use semi-naive fixpoint of matrix_based, only without
+    multi_source
+    :param backend: boolean matrix backend or its name, default backend if None
+    :param multi_source: use multi_source_matrix instead of filtering all pairs result
+    :return: reachable final vertices by start vertices
+    """
+    if multi_source:
+        return multi_source_matrix(
+            graph, cfg, start_vertices, final_vertices, nonterminals, backend=backend
+        )
+    start_vertices = set(start_vertices)
+    nonterminal = _nonterminal_value(nonterminals)
+    triples = matrix_based(graph, cfg, semi_naive=semi_naive, backend=backend)
+    return _triples_to_query(triples, start_vertices, set(final_vertices), nonterminal)
+
+
+def multi_source_matrix(
+    graph: Graph,
+    cfg: CFG,
+    start_vertices: Iterable,
+    final_vertices: Iterable = None,
+    nonterminal=None,
+    stats: Dict = None,
+    backend: Union[str, BoolMatrixBackend] = None,
+) -> Dict[int, Set[int]]:
+    """
+    Multi-source matrix CFPQ after single-source algorithm of Azimov:
+    sources[A] is a diagonal matrix of vertices where paths derived from A are
+    looked for, and matrices[A] gets rows of these vertices only. Production
+    A -> B C passes sources of A to B and ends of found B paths to C, so the work
+    depends on the part of the graph reachable from start vertices, not on |V|^2
+    :param graph: given graph
+    :param cfg: context free grammar
+    :param start_vertices: vertices where paths start
+    :param final_vertices: vertices where paths end, all vertices if None
+    :param nonterminal: nonterminal deriving the paths, start symbol if None
+    :param stats: if given, number of fixpoint iterations is stored by "iterations" key
+    :param backend: boolean matrix backend or its name, default backend if None
+    :return: reachable final vertices by start vertices
+    """
+    backend = get_backend(backend)
+    nonterminal = _nonterminal_value(nonterminal or cfg.start_symbol)
+    grammar = normalize(_with_start_symbol(cfg, nonterminal)).compiled
+
+    nodes_num = graph.number_of_nodes()
+    shape = (nodes_num, nodes_num)
+    vertices = graph_vertices(graph)
+    indices = {vertex: idx for idx, vertex in enumerate(vertices)}
+    start_vertices = list(start_vertices)
     result = {u: set() for u in start_vertices}
-    hell = matrix_based(graph, cfg)
-    for u, nt, v in hell:
-        if nt == nonterminals and u in start_vertices and v in final_vertices:
+    start_indices = [indices[u] for u in start_vertices if u in indices]
+    if nonterminal not in grammar.nonterminal_ids:
+        if stats is not None:
+            stats["iterations"] = 0
+        return result
+    start_id = grammar.nonterminal_ids[nonterminal]
+
+    label_matrices = {
+        label: backend.from_coo(sources, targets, shape)
+        for label, (sources, targets) in grammar.intern_edges(
+            edges_by_label(graph)
+        ).items()
+    }
+    matrices = [backend.zeros(shape) for _ in grammar.nonterminals]
+    sources = [backend.zeros(shape) for _ in grammar.nonterminals]
+    sources[start_id] = backend.from_coo(start_indices, start_indices, shape)
+
+    iterations = _multi_source_fixpoint(
+        matrices,
+        sources,
+        grammar,
+        label_matrices,
+        backend,
+    )
+    if stats is not None:
+        stats["iterations"] = iterations
+
+    final_vertices = None if final_vertices is None else set(final_vertices)
+    for u, v in zip(*(idx.tolist() for idx in backend.nonzero(matrices[start_id]))):
+        u, v = vertices[u], vertices[v]
+        if u in result and (final_vertices is None or v in final_vertices):
             result[u].add(v)
     return result
 
 
-def from_text_matrix(graph: nx.MultiDiGraph, cfg: str):
+def _multi_source_fixpoint(
+    matrices: List,
+    sources: List,
+    grammar: CompiledGrammar,
+    label_matrices: Dict,
+    backend: BoolMatrixBackend,
+) -> int:
+    """
+    Semi-naive fixpoint of multi_source_matrix: every iteration multiplies only
+    cells and sources which were first derived on the previous iteration, as
+    _semi_naive_fixpoint does. For A -> B C new paths come from
+    (delta_src_A @ B + src_A @ delta_B) @ C + (src_A @ B) @ delta_C
+    :param matrices: matrices by nonterminal ids, updated in place
+    :param sources: diagonal matrices of sources by nonterminal ids, updated in place
+    :param grammar: compiled grammar
+    :param label_matrices: adjacency matrices of graph by terminal ids
+    :param backend: backend of the matrices
+    :return: number of iterations
+    """
+    shape = matrices[0].shape
+    # deltas hold nonempty matrices only
+    delta_matrices = {}
+    delta_sources = {nt: m for nt, m in enumerate(sources) if backend.nnz(m)}
+
+    def add_delta(deltas, nt, cells):
+        deltas[nt] = backend.add(deltas[nt], cells) if nt in deltas else cells
+
+    def update(target, deltas, next_deltas, nt, cells):
+        new_cells = backend.difference(cells, target[nt])
+        if backend.nnz(new_cells):
+            target[nt] = backend.add(target[nt], new_cells)
+            add_delta(deltas, nt, new_cells)
+            add_delta(next_deltas, nt, new_cells)
+
+    def changed(deltas, nt):
+        return nt in deltas
+
+    iterations = 0
+    while delta_sources or delta_matrices:
+        iterations += 1
+        next_matrices = {}
+        next_sources = {}
+
+        for head in grammar.eps_heads:
+            if changed(delta_sources, head):
+                update(
+                    matrices, delta_matrices, next_matrices, head, delta_sources[head]
+                )
+        for head, label in grammar.term_productions:
+            if label in label_matrices and changed(delta_sources, head):
+                cells = backend.matmul(delta_sources[head], label_matrices[label])
+                update(matrices, delta_matrices, next_matrices, head, cells)
+        for head, b, c in grammar.var_productions:
+            if changed(delta_sources, head):
+                update(sources, delta_sources, next_sources, b, delta_sources[head])
+
+            left_delta = None
+            if changed(delta_sources, head):
+                left_delta = backend.matmul(delta_sources[head], matrices[b])
+            if changed(delta_matrices, b):
+                left = backend.matmul(sources[head], delta_matrices[b])
+                left_delta = (
+                    left if left_delta is None else backend.add(left_delta, left)
+                )
+            cells = None
+            if left_delta is not None and backend.nnz(left_delta):
+                ends = np.unique(backend.nonzero(left_delta)[1])
+                update(
+                    sources,
+                    delta_sources,
+                    next_sources,
+                    c,
+                    backend.from_coo(ends, ends, shape),
+                )
+                cells = backend.matmul(left_delta, matrices[c])
+            if changed(delta_matrices, c):
+                left = backend.matmul(sources[head], matrices[b])
+                right = backend.matmul(left, delta_matrices[c])
+                cells = right if cells is None else backend.add(cells, right)
+            if cells is not None:
+                update(matrices, delta_matrices, next_matrices, head, cells)
+
+        delta_matrices, delta_sources = next_matrices, next_sources
+    return iterations
+
+
+def from_text_matrix(graph: Graph, cfg: str):
     return matrix_based(graph, CFG.from_text(cfg))
 
 
-def from_file_matrix(graph: nx.MultiDiGraph, filename: str) -> Set[Tuple]:
+def from_file_matrix(graph: Graph, filename: str) -> Set[Tuple]:
     with open(filename) as file:
         return from_text_matrix(graph, file.read())
+
+
+def tensor_based(
+    graph: Graph,
+    cfg_or_rfa: Union[CFG, RecursiveFA],
+    backend: Union[str, BoolMatrixBackend] = None,
+    stats: Dict = None,
+) -> Set[Tuple[int, str, int]]:
+    """
+    Returns reachability of vertices computed with tensor product of recursive fa
+    and graph: every iteration builds kronecker product of their matrices, takes its
+    transitive closure and adds the nonterminal edges found for the first time
+    :param graph:
+    :param cfg_or_rfa: context free grammar or recursive fa
+    :param backend: boolean matrix backend or its name, default backend if None
+    :param stats: if given, number of iterations is stored by "iterations" key
+    :return: set of tuples of vertex, nonterminal, vertex
+    """
+    backend = get_backend(backend)
+    if isinstance(cfg_or_rfa, RecursiveFA):
+        rfa = cfg_or_rfa
+    else:
+        rfa = RecursiveFA.from_ecfg(ECFG.from_cfg(cfg_or_rfa))
+    rsm = BoolMatrix.from_rfa(rfa, backend)
+
+    nodes_num = graph.number_of_nodes()
+    shape = (nodes_num, nodes_num)
+
+    graph_matrices = {
+        label: backend.from_coo(sources, targets, shape)
+        for label, (sources, targets) in edges_by_label(graph).items()
+    }
+
+    nonterminals = {box.variable.value for box in rfa.boxes}
+    for nt in nonterminals:
+        graph_matrices[nt] = backend.zeros(shape)
+    for (s_from, s_to), nt in rsm.states_to_box_variable.items():
+        if s_from == s_to:
+            graph_matrices[nt] = backend.identity(nodes_num)
+
+    product = backend.zeros((rsm.num_states * nodes_num, rsm.num_states * nodes_num))
+    deltas = graph_matrices
+    iterations = 0
+    while deltas:
+        iterations += 1
+        for label, delta in deltas.items():
+            if label in rsm.bool_matrices:
+                product = backend.add(
+                    product, backend.kron(rsm.bool_matrices[label], delta)
+                )
+        product = transitive_closure(product, backend)
+
+        rows, cols = backend.nonzero(product)
+        rsm_from, vertex_from = np.divmod(rows, nodes_num)
+        rsm_to, vertex_to = np.divmod(cols, nodes_num)
+
+        deltas = {}
+        for (s_from, s_to), nt in rsm.states_to_box_variable.items():
+            found = (rsm_from == s_from) & (rsm_to == s_to)
+            edges = backend.from_coo(vertex_from[found], vertex_to[found], shape)
+            new_edges = backend.difference(edges, graph_matrices[nt])
+            if backend.nnz(new_edges):
+                graph_matrices[nt] = backend.add(graph_matrices[nt], new_edges)
+                deltas[nt] = (
+                    backend.add(deltas[nt], new_edges) if nt in deltas else new_edges
+                )
+
+    if stats is not None:
+        stats["iterations"] = iterations
+
+    nonterminals = list(nonterminals)
+    return _matrix_triples(
+        nonterminals,
+        [graph_matrices[nt] for nt in nonterminals],
+        backend,
+        _vertex_array(graph),
+    )
+
+
+def query_tensor(
+    graph: Graph,
+    cfg_or_rfa: Union[CFG, RecursiveFA],
+    start_vertices: Iterable,
+    final_vertices: Iterable,
+    nonterminals: Variable,
+    backend: Union[str, BoolMatrixBackend] = None,
+) -> Dict[int, Set[int]]:
+    start_vertices = set(start_vertices)
+    nonterminal = _nonterminal_value(nonterminals)
+    triples = tensor_based(graph, cfg_or_rfa, backend=backend)
+    return _triples_to_query(triples, start_vertices, set(final_vertices), nonterminal)
+
+
+def _vertex_array(graph: Graph):
+    return vertex_array(graph_vertices(graph))
+
+
+def _named_triples(grammar: CompiledGrammar, triples: Iterable[Tuple], vertices):
+    """
+    :param triples: tuples of vertex index, nonterminal id, vertex index
+    :param vertices: vertex_array of the graph
+    :return: tuples of vertex, nonterminal name, vertex
+    """
+    if vertices is None:
+        return grammar.named_triples(triples)
+    vertices = vertices.tolist()
+    names = grammar.nonterminals
+    return {(vertices[u], names[nt], vertices[v]) for u, nt, v in triples}
+
+
+def _matrix_triples(
+    nonterminals: List[str], matrices: List, backend: BoolMatrixBackend, vertices
+) -> Set[Tuple]:
+    """
+    :param vertices: vertex_array of the graph
+    :return: tuples of vertex, nonterminal name, vertex of cells of the matrices
+    """
+    return set(
+        iter_triples(
+            iter_matrix_chunks(nonterminals, matrices, backend, vertices=vertices)
+        )
+    )
+
+
+def _set_path(stats: Dict, path: str):
+    if stats is not None:
+        stats["path"] = path
+
+
+def _nonterminal_value(nonterminal: Union[Variable, str]) -> str:
+    return nonterminal.value if isinstance(nonterminal, Variable) else nonterminal
+
+
+def _with_start_symbol(cfg: CFG, nonterminal: str) -> CFG:
+    if cfg.start_symbol is not None and cfg.start_symbol.value == nonterminal:
+        return cfg
+    return CFG(start_symbol=Variable(nonterminal), productions=cfg.productions)
+
+
+def _triples_to_query(
+    triples: Iterable[Tuple], start_vertices: Set, final_vertices: Set, nonterminal
+) -> Dict[int, Set[int]]:
+    result = {u: set() for u in start_vertices}
+    for u, nt, v in triples:
+        if nt == nonterminal and u in start_vertices and v in final_vertices:
+            result[u].add(v)
+    return result
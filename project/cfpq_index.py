@@ -0,0 +1,286 @@
+from typing import Dict, Iterable, List, Set, Tuple, Union
+
+import numpy as np
+from pyformlang.cfg import CFG, Variable
+
+from project.cfpq import (
+    _initial_matrices,
+    _nonterminal_value,
+    _semi_naive_fixpoint,
+    _triples_to_query,
+)
+from project.graph_utils import edges_by_label, graph_vertices
+from project.labeled_graph import Graph
+from project.matrix_backend import BoolMatrixBackend, get_backend
+from project.wcnf import cfg_to_wcnf, normalize
+
+
+class CFPQIndex:
+    """
+    Matrices of nonterminals computed by matrix_based, maintained under edge updates.
+    Inserted edges are propagated by semi-naive fixpoint from the new cells only.
+    Deleted edges are handled by delete and rederive: every cell which has a
+    derivation through a deleted edge is removed, then the removed cells still
+    derivable from the remaining ones are restored and propagated again.
+    Edges are counted, so deleting one of parallel edges changes nothing.
+    Matrices are indexed by positions of vertices in self.vertices, vertices of
+    added edges are appended to it
+    """
+
+    def __init__(
+        self,
+        graph: Graph,
+        cfg: CFG,
+        backend: Union[str, BoolMatrixBackend] = None,
+    ):
+        """
+        :param graph: graph with labeled edges
+        :param cfg: context free grammar
+        :param backend: boolean matrix backend or its name, default backend if None
+        """
+        self.backend = get_backend(backend)
+        normalized = normalize(cfg)
+        self.wcnf = cfg_to_wcnf(cfg)
+        self._grammar = normalized.compiled
+        self.start_symbol = cfg.start_symbol
+
+        self.vertices = graph_vertices(graph)
+        self._indices = {vertex: idx for idx, vertex in enumerate(self.vertices)}
+        self.nodes_num = len(self.vertices)
+        edges = self._grammar.intern_edges(edges_by_label(graph))
+        # (u, terminal id, v) -> number of parallel edges, edges with labels out of
+        # grammar do not affect matrices and are not counted
+        self._edge_counts = {}
+        for label, (sources, targets) in edges.items():
+            for u, v in zip(sources.tolist(), targets.tolist()):
+                key = (u, label, v)
+                self._edge_counts[key] = self._edge_counts.get(key, 0) + 1
+
+        self.matrices = _initial_matrices(
+            self._grammar, edges, self.nodes_num, self.backend
+        )
+        _semi_naive_fixpoint(self.matrices, self._grammar.var_productions, self.backend)
+
+    def add_edges(self, edges: Iterable[Tuple[int, int, object]]):
+        """
+        :param edges: tuples of source, target and label, vertices out of the
+        graph are added to it
+        """
+        nodes_num = self.nodes_num
+        new_edges = []
+        for u, v, label in edges:
+            u, v = self._add_vertex(u), self._add_vertex(v)
+            if label not in self._grammar.terminal_ids:
+                continue
+            key = (u, self._grammar.terminal_ids[label], v)
+            self._edge_counts[key] = self._edge_counts.get(key, 0) + 1
+            if self._edge_counts[key] == 1:
+                new_edges.append(key)
+
+        self._grow(len(self.vertices))
+        new_vertices = np.arange(nodes_num, self.nodes_num)
+
+        cells = self._term_cells(new_edges)
+        for head in self._grammar.eps_heads if len(new_vertices) else []:
+            rows, cols = cells.setdefault(head, ([], []))
+            rows.extend(new_vertices.tolist())
+            cols.extend(new_vertices.tolist())
+        if not cells:
+            return
+
+        deltas = []
+        for nt, matrix in enumerate(self.matrices):
+            rows, cols = cells.get(nt, ([], []))
+            deltas.append(
+                self.backend.difference(
+                    self.backend.from_coo(rows, cols, self.shape), matrix
+                )
+            )
+            self.matrices[nt] = self.backend.add(matrix, deltas[nt])
+        _semi_naive_fixpoint(
+            self.matrices, self._grammar.var_productions, self.backend, deltas
+        )
+
+    def remove_edges(self, edges: Iterable[Tuple[int, int, object]]):
+        """
+        :param edges: tuples of source, target and label, edges which are not
+        in the graph are ignored
+        """
+        removed_edges = []
+        for u, v, label in edges:
+            key = (
+                self._indices.get(u),
+                self._grammar.terminal_ids.get(label),
+                self._indices.get(v),
+            )
+            if key not in self._edge_counts:
+                continue
+            self._edge_counts[key] -= 1
+            if not self._edge_counts[key]:
+                del self._edge_counts[key]
+                removed_edges.append(key)
+        if not removed_edges:
+            return
+
+        backend = self.backend
+        overdeleted = self._overdelete(removed_edges)
+        for nt, deleted in enumerate(overdeleted):
+            self.matrices[nt] = backend.difference(self.matrices[nt], deleted)
+
+        rederived = self._rederive(overdeleted)
+        for nt, cells in enumerate(rederived):
+            self.matrices[nt] = backend.add(self.matrices[nt], cells)
+        _semi_naive_fixpoint(
+            self.matrices, self._grammar.var_productions, backend, rederived
+        )
+
+    def query(
+        self,
+        start_vertices: Iterable,
+        final_vertices: Iterable,
+        nonterminal: Union[Variable, str] = None,
+    ) -> Dict[int, Set[int]]:
+        """
+        :param start_vertices: vertices where paths start
+        :param final_vertices: vertices where paths end
+        :param nonterminal: nonterminal deriving the paths, start symbol if None
+        :return: reachable final vertices by start vertices
+        """
+        nonterminal = _nonterminal_value(nonterminal or self.start_symbol)
+        start_vertices = set(start_vertices)
+        final_vertices = set(final_vertices)
+        if nonterminal not in self._grammar.nonterminal_ids:
+            return {u: set() for u in start_vertices}
+        matrix = self.matrices[self._grammar.nonterminal_ids[nonterminal]]
+        rows, cols = self.backend.nonzero(matrix)
+        vertices = self.vertices
+        return _triples_to_query(
+            (
+                (vertices[u], nonterminal, vertices[v])
+                for u, v in zip(rows.tolist(), cols.tolist())
+            ),
+            start_vertices,
+            final_vertices,
+            nonterminal,
+        )
+
+    def triples(self) -> Set[Tuple[int, str, int]]:
+        """
+        :return: set of tuples of vertex, nonterminal, vertex, the same as
+        matrix_based on the current graph
+        """
+        vertices = self.vertices
+        return {
+            (vertices[u], self._grammar.nonterminals[nt], vertices[v])
+            for nt, matrix in enumerate(self.matrices)
+            for u, v in zip(*(idx.tolist() for idx in self.backend.nonzero(matrix)))
+        }
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.nodes_num, self.nodes_num
+
+    def _add_vertex(self, vertex) -> int:
+        """
+        :return: index of vertex, new vertices get the next index
+        """
+        if vertex not in self._indices:
+            self._indices[vertex] = len(self.vertices)
+            self.vertices.append(vertex)
+        return self._indices[vertex]
+
+    def _grow(self, nodes_num: int):
+        if nodes_num <= self.nodes_num:
+            return
+        self.nodes_num = nodes_num
+        for nt, matrix in enumerate(self.matrices):
+            resized = self.backend.to_sparse(matrix).tocsr(copy=True)
+            resized.resize(self.shape)
+            self.matrices[nt] = self.backend.from_sparse(resized)
+
+    def _term_cells(self, edges) -> Dict[int, Tuple[list, list]]:
+        """
+        :param edges: tuples of source, terminal id and target
+        :return: rows and columns of cells derived from edges by terminal productions,
+        by nonterminal ids
+        """
+        cells = {}
+        for u, label, v in edges:
+            for head in self._grammar.term_heads[label]:
+                rows, cols = cells.setdefault(head, ([], []))
+                rows.append(u)
+                cols.append(v)
+        return cells
+
+    def _intersection(self, a, b):
+        return self.backend.difference(a, self.backend.difference(a, b))
+
+    def _overdelete(self, removed_edges) -> List:
+        """
+        Cells with at least one derivation through removed edges, found by
+        semi-naive propagation over the matrices before deletion
+        :param removed_edges: tuples of source, terminal id and target
+        :return: deleted cells by nonterminal ids
+        """
+        backend = self.backend
+        cells = self._term_cells(removed_edges)
+        deleted = []
+        for nt, matrix in enumerate(self.matrices):
+            rows, cols = cells.get(nt, ([], []))
+            deleted.append(
+                self._intersection(backend.from_coo(rows, cols, self.shape), matrix)
+            )
+
+        deltas = list(deleted)
+        while any(backend.nnz(delta) for delta in deltas):
+            next_deltas = [backend.zeros(self.shape) for _ in self.matrices]
+            for head, b, c in self._grammar.var_productions:
+                if not backend.nnz(deltas[b]) and not backend.nnz(deltas[c]):
+                    continue
+                step = backend.add(
+                    backend.matmul(deltas[b], self.matrices[c]),
+                    backend.matmul(self.matrices[b], deltas[c]),
+                )
+                new_cells = backend.difference(
+                    self._intersection(step, self.matrices[head]), deleted[head]
+                )
+                if backend.nnz(new_cells):
+                    deleted[head] = backend.add(deleted[head], new_cells)
+                    next_deltas[head] = backend.add(next_deltas[head], new_cells)
+            deltas = next_deltas
+        return deleted
+
+    def _rederive(self, deleted: List) -> List:
+        """
+        Deleted cells which have a one step derivation from the remaining cells
+        :param deleted: deleted cells by nonterminal ids
+        :return: cells to restore by nonterminal ids
+        """
+        backend = self.backend
+        rederived = []
+        for nt, cells in enumerate(deleted):
+            labels = self._grammar.term_labels[nt]
+            restored = [
+                (u, v)
+                for u, v in zip(*(idx.tolist() for idx in backend.nonzero(cells)))
+                if (u == v and self._grammar.is_eps[nt])
+                or any((u, label, v) in self._edge_counts for label in labels)
+            ]
+            rederived.append(
+                backend.from_coo(
+                    [u for u, _ in restored], [v for _, v in restored], self.shape
+                )
+            )
+
+        for head, b, c in self._grammar.var_productions:
+            if not backend.nnz(deleted[head]):
+                continue
+            rows = np.unique(backend.nonzero(deleted[head])[0])
+            left = backend.matmul(
+                backend.from_coo(rows, rows, self.shape), self.matrices[b]
+            )
+            step = backend.matmul(left, self.matrices[c])
+            rederived[head] = backend.add(
+                rederived[head], self._intersection(step, deleted[head])
+            )
+        return rederived
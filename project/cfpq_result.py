@@ -0,0 +1,302 @@
+import pathlib
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from project.matrix_backend import BoolMatrixBackend
+
+#  Results of CFPQ without a set of tuples: cells of every nonterminal are kept as
+#  two int64 arrays of rows and columns sorted row-major, which takes 16 bytes per
+#  triple instead of a tuple object and its set entry. Engines number vertices as
+#  edges_by_label does, cells are mapped back to vertices by vertex_array.
+
+CHUNK_SIZE = 1 << 16
+
+
+def iter_matrix_chunks(
+    nonterminals: List[str],
+    matrices: List,
+    backend: BoolMatrixBackend,
+    chunk_size: int = CHUNK_SIZE,
+    vertices: Optional[np.ndarray] = None,
+) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+    """
+    Cells of nonterminal matrices, only one matrix is converted to arrays at a time
+    :param nonterminals: nonterminal names by ids
+    :param matrices: matrices by nonterminal ids
+    :param backend: boolean matrix backend of matrices
+    :param chunk_size: maximal number of cells in a chunk
+    :param vertices: vertices by matrix indices, indices are vertices if None
+    :return: iterator over nonterminal, rows and columns of its cells
+    """
+    for nonterminal, matrix in zip(nonterminals, matrices):
+        rows, cols = _sorted_cells(*_to_vertices(backend.nonzero(matrix), vertices))
+        for start in range(0, len(rows), chunk_size):
+            yield (
+                nonterminal,
+                rows[start : start + chunk_size],
+                cols[start : start + chunk_size],
+            )
+
+
+def iter_triples(
+    chunks: Iterable[Tuple[str, np.ndarray, np.ndarray]]
+) -> Iterator[Tuple[int, str, int]]:
+    """
+    :param chunks: nonterminals with rows and columns of their cells
+    :return: iterator over tuples of vertex, nonterminal, vertex
+    """
+    for nonterminal, rows, cols in chunks:
+        for u, v in zip(rows.tolist(), cols.tolist()):
+            yield u, nonterminal, v
+
+
+class CFPQResult:
+    """
+    Columnar result of CFPQ: pairs of vertices derived from every nonterminal.
+    Supports the operations of the set returned by matrix_based which do not
+    need the whole set: `in`, `len`, iteration over triples
+    """
+
+    def __init__(self, cells: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        """
+        :param cells: rows and columns of cells by nonterminal names,
+        duplicate cells are removed
+        """
+        self.cells = {
+            nonterminal: _sorted_cells(rows, cols)
+            for nonterminal, (rows, cols) in cells.items()
+        }
+
+    @staticmethod
+    def from_matrices(
+        nonterminals: List[str],
+        matrices: List,
+        backend: BoolMatrixBackend,
+        vertices: Optional[np.ndarray] = None,
+    ) -> "CFPQResult":
+        """
+        :param nonterminals: nonterminal names by ids
+        :param matrices: matrices by nonterminal ids
+        :param backend: boolean matrix backend of matrices
+        :param vertices: vertices by matrix indices, indices are vertices if None
+        :return: result with cells of the matrices
+        """
+        return CFPQResult(
+            {
+                nonterminal: _to_vertices(backend.nonzero(matrix), vertices)
+                for nonterminal, matrix in zip(nonterminals, matrices)
+            }
+        )
+
+    @staticmethod
+    def from_triples(
+        nonterminals: List[str],
+        triples: Iterable[Tuple[int, int, int]],
+        vertices: Optional[np.ndarray] = None,
+    ) -> "CFPQResult":
+        """
+        :param nonterminals: nonterminal names by ids
+        :param triples: tuples of vertex index, nonterminal id, vertex index
+        :param vertices: vertices by indices, indices are vertices if None
+        :return: result with given triples
+        """
+        cells = [([], []) for _ in nonterminals]
+        for u, nt, v in triples:
+            cells[nt][0].append(u)
+            cells[nt][1].append(v)
+        return CFPQResult(
+            {
+                nonterminal: _to_vertices(
+                    (
+                        np.asarray(rows, dtype=np.int64),
+                        np.asarray(cols, dtype=np.int64),
+                    ),
+                    vertices,
+                )
+                for nonterminal, (rows, cols) in zip(nonterminals, cells)
+            }
+        )
+
+    @property
+    def nonterminals(self) -> List[str]:
+        return list(self.cells)
+
+    def pairs(self, nonterminal: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param nonterminal: nonterminal name
+        :return: rows and columns of its cells, empty arrays for unknown nonterminal
+        """
+        return self.cells.get(nonterminal, (_empty(), _empty()))
+
+    def __len__(self) -> int:
+        return sum(len(rows) for rows, _ in self.cells.values())
+
+    def __contains__(self, triple) -> bool:
+        u, nonterminal, v = triple
+        if nonterminal not in self.cells:
+            return False
+        rows, cols = self.cells[nonterminal]
+        start = np.searchsorted(rows, u, side="left")
+        end = np.searchsorted(rows, u, side="right")
+        idx = start + np.searchsorted(cols[start:end], v)
+        return idx < end and cols[idx] == v
+
+    def __iter__(self) -> Iterator[Tuple[int, str, int]]:
+        return iter_triples(self.chunks())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, CFPQResult):
+            return all(
+                np.array_equal(a, b)
+                for nonterminal in set(self.cells) | set(other.cells)
+                for a, b in zip(self.pairs(nonterminal), other.pairs(nonterminal))
+            )
+        if isinstance(other, (set, frozenset)):
+            return len(self) == len(other) and all(triple in self for triple in other)
+        return NotImplemented
+
+    def chunks(
+        self, chunk_size: int = CHUNK_SIZE
+    ) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+        """
+        :param chunk_size: maximal number of cells in a chunk
+        :return: iterator over nonterminal, rows and columns of its cells
+        """
+        for nonterminal, (rows, cols) in self.cells.items():
+            for start in range(0, len(rows), chunk_size):
+                yield (
+                    nonterminal,
+                    rows[start : start + chunk_size],
+                    cols[start : start + chunk_size],
+                )
+
+    def filter(
+        self,
+        nonterminals: Iterable[str] = None,
+        start_vertices: Iterable = None,
+        final_vertices: Iterable = None,
+    ) -> "CFPQResult":
+        """
+        :param nonterminals: nonterminals to keep, every one if None
+        :param start_vertices: vertices paths start in, every vertex if None
+        :param final_vertices: vertices paths end in, every vertex if None
+        :return: result with matching triples only
+        """
+        if nonterminals is not None:
+            nonterminals = set(nonterminals)
+        starts = None if start_vertices is None else list(start_vertices)
+        finals = None if final_vertices is None else list(final_vertices)
+
+        cells = {}
+        for nonterminal, (rows, cols) in self.cells.items():
+            if nonterminals is not None and nonterminal not in nonterminals:
+                continue
+            mask = np.ones(len(rows), dtype=bool)
+            if starts is not None:
+                mask &= np.isin(rows, _lookup_array(starts, rows))
+            if finals is not None:
+                mask &= np.isin(cols, _lookup_array(finals, cols))
+            cells[nonterminal] = (rows[mask], cols[mask])
+        return CFPQResult(cells)
+
+    def to_set(self) -> Set[Tuple[int, str, int]]:
+        """
+        :return: set of tuples of vertex, nonterminal, vertex as matrix_based returns
+        """
+        return set(self)
+
+    def save(self, path: Union[str, pathlib.Path]):
+        """
+        Save result as .npz file
+        :param path: path to the file
+        """
+        arrays = {}
+        for i, (rows, cols) in enumerate(self.cells.values()):
+            arrays[f"rows_{i}"] = rows
+            arrays[f"cols_{i}"] = cols
+        np.savez(path, nonterminals=np.asarray(self.nonterminals, dtype=str), **arrays)
+
+    @staticmethod
+    def load(path: Union[str, pathlib.Path]) -> "CFPQResult":
+        """
+        :param path: path to file written by save
+        :return: saved result
+        """
+        with np.load(path) as saved:
+            return CFPQResult(
+                {
+                    nonterminal: (saved[f"rows_{i}"], saved[f"cols_{i}"])
+                    for i, nonterminal in enumerate(saved["nonterminals"].tolist())
+                }
+            )
+
+
+def vertex_array(vertices: List) -> Optional[np.ndarray]:
+    """
+    :param vertices: vertices by indices
+    :return: array of vertices for mapping indices, int64 for int vertices,
+    None if every vertex equals its index
+    """
+    if all(type(vertex) is int for vertex in vertices):
+        array = np.asarray(vertices, dtype=np.int64)
+        return None if np.array_equal(array, np.arange(len(array))) else array
+    if all(isinstance(vertex, str) for vertex in vertices):
+        return np.asarray(vertices, dtype=str)
+    array = np.empty(len(vertices), dtype=object)
+    array[:] = vertices
+    return array
+
+
+def _to_vertices(
+    cells: Tuple[np.ndarray, np.ndarray], vertices: Optional[np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray]:
+    rows, cols = cells
+    if vertices is None:
+        return rows, cols
+    return vertices[rows], vertices[cols]
+
+
+def _empty() -> np.ndarray:
+    return np.zeros(0, dtype=np.int64)
+
+
+def _lookup_array(vertices: List, column: np.ndarray) -> np.ndarray:
+    """
+    :param vertices: vertices to look up
+    :param column: rows or columns of cells
+    :return: vertices as array of the kind of column, vertices which can not be
+    in column are dropped
+    """
+    if column.dtype.kind == "i":
+        return np.asarray(
+            [v for v in vertices if isinstance(v, (int, np.integer))], dtype=np.int64
+        )
+    if column.dtype.kind == "U":
+        return np.asarray([v for v in vertices if isinstance(v, str)], dtype=str)
+    array = np.empty(len(vertices), dtype=object)
+    array[:] = vertices
+    return array
+
+
+def _sorted_cells(rows, cols) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :return: rows and columns of unique cells sorted row-major
+    """
+    rows, cols = _vertex_column(rows), _vertex_column(cols)
+    if len(rows) > 1:
+        same_row = rows[1:] == rows[:-1]
+        if not np.all((rows[1:] > rows[:-1]) | (same_row & (cols[1:] > cols[:-1]))):
+            order = np.lexsort((cols, rows))
+            rows, cols = rows[order], cols[order]
+            unique = np.ones(len(rows), dtype=bool)
+            unique[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+            rows, cols = rows[unique], cols[unique]
+    return rows, cols
+
+
+def _vertex_column(values) -> np.ndarray:
+    values = np.asarray(values)
+    if values.dtype.kind in "iub" or not len(values):
+        return values.astype(np.int64)
+    return values
@@ -1,4 +1,8 @@
-from typing import Set
+import hashlib
+import pathlib
+import pickle
+from collections import OrderedDict
+from typing import Set, Union
 
 import pyformlang.regular_expression as re
 import pyformlang.finite_automaton as fa
@@ -16,6 +20,94 @@ def regex_to_dfa(regex: re.Regex) -> fa.DeterministicFiniteAutomaton:
     return regex.to_epsilon_nfa().minimize()
 
 
+#  Minimal DFA of a regex is cached by hash of the regex text: in memory (LRU) and on
+#  disk if a cache directory is set. Callers get copies, so cached automata are never
+#  changed.
+
+DFA_CACHE_SIZE = 256
+
+_dfa_cache = OrderedDict()
+_dfa_cache_dir = None
+
+
+def set_dfa_cache_dir(cache_dir: Union[str, pathlib.Path, None]):
+    """
+    Set directory where minimal DFAs are stored between runs
+    :param cache_dir: directory of the cache, None disables the disk cache
+    """
+    global _dfa_cache_dir
+    _dfa_cache_dir = pathlib.Path(cache_dir) if cache_dir else None
+
+
+def clear_dfa_cache():
+    """Drop minimal DFAs cached in memory"""
+    _dfa_cache.clear()
+
+
+def regex_key(regex: re.Regex) -> str:
+    """
+    :param regex: regular expression
+    :return: hex digest of its fully parenthesized text
+    """
+    return hashlib.sha256(repr(regex).encode()).hexdigest()
+
+
+def cached_dfa(key: str) -> Union[fa.DeterministicFiniteAutomaton, None]:
+    """
+    :param key: regex_key of regex
+    :return: copy of cached minimal DFA of regex, None if it is not cached
+    """
+    if key in _dfa_cache:
+        _dfa_cache.move_to_end(key)
+        return _dfa_cache[key].copy()
+    if _dfa_cache_dir is None:
+        return None
+    path = _dfa_cache_dir / f"{key}.pickle"
+    if not path.exists():
+        return None
+    with open(path, "rb") as file:
+        dfa = pickle.load(file)
+    _remember_dfa(key, dfa)
+    return dfa.copy()
+
+
+def store_dfa(key: str, dfa: fa.DeterministicFiniteAutomaton):
+    """
+    :param key: regex_key of regex
+    :param dfa: minimal DFA of regex, it is copied
+    """
+    dfa = dfa.copy()
+    _remember_dfa(key, dfa)
+    if _dfa_cache_dir is None:
+        return
+    _dfa_cache_dir.mkdir(parents=True, exist_ok=True)
+    path = _dfa_cache_dir / f"{key}.pickle"
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as file:
+        pickle.dump(dfa, file)
+    tmp_path.replace(path)
+
+
+def cached_regex_to_dfa(regex: re.Regex) -> fa.DeterministicFiniteAutomaton:
+    """
+    The same as regex_to_dfa, cached by regex_key
+    :param regex:
+    :return: minimal DFA
+    """
+    key = regex_key(regex)
+    dfa = cached_dfa(key)
+    if dfa is None:
+        dfa = regex_to_dfa(regex)
+        store_dfa(key, dfa)
+    return dfa
+
+
+def _remember_dfa(key: str, dfa: fa.DeterministicFiniteAutomaton):
+    _dfa_cache[key] = dfa
+    if len(_dfa_cache) > DFA_CACHE_SIZE:
+        _dfa_cache.popitem(last=False)
+
+
 def graph_to_nfa(
     graph: nx.Graph, start_states: Set = None, final_states: Set = None
 ) -> fa.NondeterministicFiniteAutomaton:
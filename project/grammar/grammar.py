@@ -1,52 +1,170 @@
-from project.grammar.GrammarVisitor import GrammarVisitor
 from project.grammar.GrammarLexer import GrammarLexer
 from project.grammar.GrammarParser import GrammarParser
 from project.grammar.GrammarListener import GrammarListener
 
+import hashlib
+import sys
+from collections import OrderedDict, namedtuple
+from typing import TextIO
+
 from antlr4 import *
+from antlr4.atn.PredictionMode import PredictionMode
+from antlr4.error.ErrorListener import ErrorListener
+from antlr4.error.ErrorStrategy import BailErrorStrategy, DefaultErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
 from antlr4.tree.Tree import TerminalNodeImpl
 from pydot import Dot, Node, Edge
 
+#  Scripts are parsed in two stages: SLL prediction with bail out error strategy
+#  is fast and is enough for almost every input, full LL with error recovery runs
+#  only if SLL fails, to tell a real syntax error from SLL weakness and to report
+#  errors. Results are cached by hash of the text, cached trees are shared and must
+#  not be modified.
 
-def parse_stream(stream: InputStream = None):
+ParseError = namedtuple("ParseError", ["line", "column", "message"])
+ParseResult = namedtuple("ParseResult", ["tree", "errors"])
+
+PARSE_CACHE_SIZE = 128
+
+_parse_cache = OrderedDict()
+
+
+def clear_parse_cache():
+    """Drop cached parse results"""
+    _parse_cache.clear()
+
+
+def parse_text(text: str, use_cache: bool = True) -> ParseResult:
+    """
+    Parse script once, collecting syntax errors
+    :param text: text of the script
+    :param use_cache: reuse result of the same text parsed before
+    :return: parse tree of prog rule and list of syntax errors, empty if the text
+    matches grammar
+    """
+    key = hashlib.sha256(text.encode()).hexdigest()
+    if use_cache and key in _parse_cache:
+        _parse_cache.move_to_end(key)
+        return _parse_cache[key]
+
+    result = _parse_two_stage(InputStream(text))
+    if use_cache:
+        _parse_cache[key] = result
+        if len(_parse_cache) > PARSE_CACHE_SIZE:
+            _parse_cache.popitem(last=False)
+    return result
+
+
+def _parse_two_stage(stream: InputStream) -> ParseResult:
     lexer = GrammarLexer(stream)
     lexer.removeErrorListeners()
-    stream = CommonTokenStream(lexer)
-    parser = GrammarParser(stream)
+    tokens = CommonTokenStream(lexer)
+    parser = GrammarParser(tokens)
     parser.removeErrorListeners()
-    return parser.prog()
+
+    parser._interp.predictionMode = PredictionMode.SLL
+    parser._errHandler = BailErrorStrategy()
+    try:
+        return ParseResult(parser.prog(), [])
+    except ParseCancellationException:
+        pass
+
+    errors = CollectingErrorListener()
+    parser.reset()
+    parser.addErrorListener(errors)
+    parser._interp.predictionMode = PredictionMode.LL
+    parser._errHandler = DefaultErrorStrategy()
+    return ParseResult(parser.prog(), errors.errors)
+
+
+def parse_stream(stream: InputStream = None):
+    return _parse_two_stage(stream).tree
 
 
 def parse(inputFile: str = None, text: str = None):
+    return _parse_input(inputFile, text).tree
+
+
+def _parse_input(inputFile: str = None, text: str = None) -> ParseResult:
     if inputFile and text:
         raise ValueError("Can not decide which stream to use")
 
     if inputFile:
-        stream = FileStream(inputFile)
-    elif text:
-        stream = InputStream(text)
-    else:
-        stream = StdinStream()
+        with open(inputFile, encoding="utf-8") as file:
+            text = file.read()
+    elif not text:
+        text = sys.stdin.read()
 
-    return parse_stream(stream)
+    return parse_text(text)
 
 
 def check(inputFile: str = None, text: str = None):
-    tree = parse(inputFile=inputFile, text=text)
-    visitor = ErrorVisitor()
-    visitor.visit(tree)
-    return not visitor.has_error
+    return not _parse_input(inputFile=inputFile, text=text).errors
+
+
+def generate_dot_description(
+    text: str = None, filename: str = None, streaming: bool = False
+):
+    """
+    Write parse tree of the script in DOT format
+    :param text: text of the script, read from stdin if None
+    :param filename: output file, stdout if None or "-"
+    :param streaming: write lines of nodes and edges while walking the tree instead
+    of building pydot graph first, memory used besides the tree is bounded by its depth
+    """
+    if text is None:
+        text = sys.stdin.read()
+    ast, errors = parse_text(text)
+    if errors:
+        raise ValueError("Text is not match grammar")
 
+    to_stdout = filename is None or filename == "-"
+    if streaming:
+        if to_stdout:
+            write_dot_description(ast, sys.stdout)
+        else:
+            with open(filename, "w") as out:
+                write_dot_description(ast, out)
+        return
 
-def generate_dot_description(text: str, filename: str):
-    if not check(text=text):
-        raise ValueError("Text is not match grammar")
-    ast = parse(text=text)
     tree = Dot("tree", graph_type="digraph")
     ParseTreeWalker().walk(
         DotTreeListener(tree, GrammarParser.ruleNames, GrammarLexer.symbolicNames), ast
     )
-    tree.write(filename)
+    if to_stdout:
+        sys.stdout.write(tree.to_string())
+    else:
+        tree.write(filename)
+
+
+def write_dot_description(ast: ParserRuleContext, out: TextIO):
+    """
+    Stream parse tree in DOT format, nodes and edges are the same as
+    generate_dot_description writes through pydot
+    :param ast: parse tree
+    :param out: text stream to write to
+    """
+    out.write("digraph tree {\n")
+    ParseTreeWalker().walk(
+        DotStreamListener(out, GrammarParser.ruleNames, GrammarLexer.symbolicNames),
+        ast,
+    )
+    out.write("}\n")
+
+
+def _terminal_label(symbols: list, node: TerminalNodeImpl) -> str:
+    symbol = symbols[node.symbol.type - 1]
+    if symbol.lower() != node.getText().lower():
+        return f"{symbol}: {node.getText()}"
+    return symbol
+
+
+def _quote(label: str) -> str:
+    """
+    :return: label as DOT string, backslashes are escaped before quotes, so that
+    a label ending in a backslash does not escape the closing quote
+    """
+    return '"' + label.replace("\\", "\\\\").replace('"', '\\"') + '"'
 
 
 class DotTreeListener(GrammarListener):
@@ -65,27 +183,51 @@ class DotTreeListener(GrammarListener):
         if ctx.parentCtx:
             self.tree.add_edge(Edge(self.nodes[ctx.parentCtx], self.nodes[ctx]))
         label = self.rules[ctx.getRuleIndex()]
-        self.tree.add_node(Node(self.nodes[ctx], label=label))
+        self.tree.add_node(Node(self.nodes[ctx], label=_quote(label)))
 
     def visitTerminal(self, node: TerminalNodeImpl):
         self.num_nodes += 1
         self.tree.add_edge(Edge(self.nodes[node.parentCtx], self.num_nodes))
-        if self.symbols[node.symbol.type - 1].lower() != node.getText().lower():
-            self.tree.add_node(
-                Node(
-                    self.num_nodes,
-                    label=f"{self.symbols[node.symbol.type - 1]}: {node.getText()}",
-                )
-            )
-        else:
-            self.tree.add_node(
-                Node(self.num_nodes, label=f"{self.symbols[node.symbol.type - 1]}")
-            )
+        self.tree.add_node(
+            Node(self.num_nodes, label=_quote(_terminal_label(self.symbols, node)))
+        )
+
+
+class DotStreamListener(GrammarListener):
+    """
+    Writes DOT lines of parse tree nodes during the walk, only ids of the rules
+    on the current path are kept
+    """
+
+    def __init__(self, out: TextIO, rules: list, symbols: list):
+        self.out = out
+        self.num_nodes = 0
+        self.path = []
+        self.rules = rules
+        self.symbols = symbols
+        super(DotStreamListener, self).__init__()
+
+    def _add_node(self, label: str) -> int:
+        self.num_nodes += 1
+        if self.path:
+            self.out.write(f"{self.path[-1]} -> {self.num_nodes};\n")
+        self.out.write(f"{self.num_nodes} [label={_quote(label)}];\n")
+        return self.num_nodes
+
+    def enterEveryRule(self, ctx: ParserRuleContext):
+        self.path.append(self._add_node(self.rules[ctx.getRuleIndex()]))
+
+    def exitEveryRule(self, ctx: ParserRuleContext):
+        self.path.pop()
+
+    def visitTerminal(self, node: TerminalNodeImpl):
+        self._add_node(_terminal_label(self.symbols, node))
 
 
-class ErrorVisitor(GrammarVisitor):
+class CollectingErrorListener(ErrorListener):
     def __init__(self):
-        self.has_error = False
+        self.errors = []
+        super(CollectingErrorListener, self).__init__()
 
-    def visitErrorNode(self, node):
-        self.has_error = True
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.errors.append(ParseError(line, column, msg))
@@ -1,11 +1,195 @@
+import hashlib
+import pathlib
+import re
 from collections import namedtuple
+from typing import Dict, List, Tuple, Union
 
 import networkx as nx
+import numpy as np
 import cfpq_data as cd
+from pyformlang.finite_automaton import Symbol
+
+from project.labeled_graph import LabeledGraph
+from project.matrix_backend import BoolMatrixBackend, get_backend
+
+GRAPH_CACHE_DIR = pathlib.Path.home() / ".cache" / "formal-lang-course" / "graphs"
+
+
+def load_graph(
+    name,
+    use_cache: bool = True,
+    cache_dir: Union[str, pathlib.Path] = None,
+    refresh: bool = False,
+) -> nx.MultiDiGraph:
+    """
+    Load graph from cfpq_data dataset
+    :param name: name of the graph in dataset
+    :param use_cache: read graph from binary cache instead of parsing csv again
+    :param cache_dir: directory of the cache, GRAPH_CACHE_DIR if None
+    :param refresh: download csv and compare its hash with the cached one
+    :return: loaded graph
+    """
+    if not use_cache:
+        return cd.graph_from_csv(cd.download(name))
+
+    edges = _load_cached_edges(name, cache_dir, refresh)
+    vertices = edges["vertices"].tolist()
+    labels = edges["labels"].tolist()
+    sources = edges["sources"].tolist()
+    targets = edges["targets"].tolist()
+
+    graph = nx.MultiDiGraph()
+    graph.add_nodes_from(vertices)
+    for i, label in enumerate(labels):
+        start, end = edges["offsets"][i], edges["offsets"][i + 1]
+        graph.add_edges_from(
+            (vertices[u], vertices[v], {"label": label})
+            for u, v in zip(sources[start:end], targets[start:end])
+        )
+    return graph
 
 
-def load_graph(name):
-    return cd.graph_from_csv(cd.download(name))
+def load_graph_matrices(
+    name,
+    backend: Union[str, BoolMatrixBackend] = None,
+    cache_dir: Union[str, pathlib.Path] = None,
+    refresh: bool = False,
+):
+    """
+    Load graph from cfpq_data dataset as boolean matrices of its labels without
+    building networkx graph, the same as decompose_graph(load_graph(name))
+    :param name: name of the graph in dataset
+    :param backend: boolean matrix backend or its name, default backend if None
+    :param cache_dir: directory of the cache, GRAPH_CACHE_DIR if None
+    :param refresh: download csv and compare its hash with the cached one
+    :return: matrices by symbols, indices of vertices and vertices by indices
+    """
+    backend = get_backend(backend)
+    edges = _load_cached_edges(name, cache_dir, refresh)
+    inds = edges["vertices"].tolist()
+    shape = (len(inds), len(inds))
+    offsets = edges["offsets"]
+
+    matrices = {
+        Symbol(label): backend.from_coo(
+            edges["sources"][offsets[i] : offsets[i + 1]],
+            edges["targets"][offsets[i] : offsets[i + 1]],
+            shape,
+        )
+        for i, label in enumerate(edges["labels"].tolist())
+    }
+    return matrices, {vertex: idx for idx, vertex in enumerate(inds)}, inds
+
+
+def _load_cached_edges(name, cache_dir=None, refresh: bool = False):
+    """
+    Edges of the dataset graph partitioned by labels: edges labeled labels[i]
+    are sources[offsets[i]:offsets[i + 1]] -> targets[offsets[i]:offsets[i + 1]],
+    sources and targets are indices in vertices.
+    Cache files are keyed by name and hash of the csv. A cached graph is used
+    without downloading the dataset unless refresh is set, then the csv is downloaded
+    and hashed, and is parsed only if its hash differs
+    :param name: name of the graph in dataset
+    :param cache_dir: directory of the cache, GRAPH_CACHE_DIR if None
+    :param refresh: download csv and compare its hash with the cached one
+    :return: dictionary of arrays
+    """
+    cache_dir = pathlib.Path(cache_dir) if cache_dir else GRAPH_CACHE_DIR
+    cached = _cached_files(name, cache_dir)
+    if cached and not refresh:
+        with np.load(cached[0]) as edges:
+            return dict(edges)
+
+    csv_path = pathlib.Path(cd.download(name))
+    digest = hashlib.sha256()
+    with open(csv_path, "rb") as csv:
+        for chunk in iter(lambda: csv.read(1 << 20), b""):
+            digest.update(chunk)
+
+    cache_path = cache_dir / f"{name}-{digest.hexdigest()[:16]}.npz"
+    if cache_path.exists():
+        with np.load(cache_path) as cached:
+            return dict(cached)
+
+    graph = cd.graph_from_csv(csv_path)
+    vertices = list(graph.nodes)
+    indices = {vertex: idx for idx, vertex in enumerate(vertices)}
+    labels = {}
+    sources, targets, label_ids = [], [], []
+    for u, v, label in graph.edges(data="label"):
+        sources.append(indices[u])
+        targets.append(indices[v])
+        label_ids.append(labels.setdefault(label, len(labels)))
+
+    label_ids = np.asarray(label_ids, dtype=np.int64)
+    order = np.argsort(label_ids, kind="stable")
+    edges = {
+        "vertices": _to_array(vertices),
+        "labels": _to_array(list(labels)),
+        "offsets": np.searchsorted(label_ids[order], np.arange(len(labels) + 1)),
+        "sources": np.asarray(sources, dtype=np.int64)[order],
+        "targets": np.asarray(targets, dtype=np.int64)[order],
+    }
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".tmp.npz")
+    np.savez(tmp_path, **edges)
+    tmp_path.replace(cache_path)
+    for stale in cached:
+        stale.unlink(missing_ok=True)
+    return edges
+
+
+def _cached_files(name, cache_dir: pathlib.Path):
+    """
+    :return: cache files of the dataset graph, the most recent first
+    """
+    if not cache_dir.is_dir():
+        return []
+    pattern = re.compile(re.escape(str(name)) + r"-[0-9a-f]{16}\.npz")
+    files = [path for path in cache_dir.iterdir() if pattern.fullmatch(path.name)]
+    return sorted(files, key=lambda path: path.stat().st_mtime_ns, reverse=True)
+
+
+def _to_array(values):
+    array = np.asarray(values)
+    return array.astype(str) if array.dtype == object else array
+
+
+def graph_vertices(graph: Union[nx.MultiDiGraph, LabeledGraph]) -> List:
+    """
+    :param graph: networkx graph or LabeledGraph
+    :return: vertices by indices used in edges_by_label and decompose_graph
+    """
+    if isinstance(graph, LabeledGraph):
+        return graph.vertices.tolist()
+    return list(graph.nodes)
+
+
+def edges_by_label(
+    graph: Union[nx.MultiDiGraph, LabeledGraph]
+) -> Dict[object, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Edges of networkx graph or LabeledGraph grouped by labels
+    :param graph: graph with labeled edges
+    :return: arrays of indices of sources and targets of edges by labels,
+    vertices by indices are given by graph_vertices
+    """
+    if isinstance(graph, LabeledGraph):
+        return graph.edges_by_label()
+    indices = {vertex: idx for idx, vertex in enumerate(graph.nodes)}
+    grouped = {}
+    for u, v, label in graph.edges(data="label"):
+        sources, targets = grouped.setdefault(label, ([], []))
+        sources.append(indices[u])
+        targets.append(indices[v])
+    return {
+        label: (
+            np.asarray(sources, dtype=np.int64),
+            np.asarray(targets, dtype=np.int64),
+        )
+        for label, (sources, targets) in grouped.items()
+    }
 
 
 def save_graph(graph: nx.MultiDiGraph, filename):
@@ -0,0 +1,217 @@
+import sys
+from typing import List, TextIO, Union
+
+from antlr4 import ParserRuleContext
+from antlr4.tree.Tree import TerminalNode
+
+from project.grammar.GrammarParser import GrammarParser
+from project.grammar.grammar import parse_text
+from project.matrix_backend import BoolMatrixBackend
+from project.query_plan import (
+    AddFinal,
+    AddStart,
+    Concat,
+    Const,
+    Evaluator,
+    Filter,
+    GetEdges,
+    GetFinal,
+    GetLabels,
+    GetReachable,
+    GetStart,
+    GetVertices,
+    InterpretError,
+    Intersect,
+    Lambda,
+    Load,
+    Map,
+    SetFinal,
+    SetStart,
+    Star,
+    Union as UnionPlan,
+    Var,
+    format_value,
+    pattern_names,
+)
+
+#  Script is compiled statement by statement: bound variables are replaced with
+#  plans of their expressions, so plans of print statements are whole expressions
+#  which the evaluator can analyze, and nothing is computed before print.
+
+_PREFIX_BINARY = {
+    GrammarParser.SET_START: SetStart,
+    GrammarParser.SET_FINAL: SetFinal,
+    GrammarParser.ADD_START: AddStart,
+    GrammarParser.ADD_FINALS: AddFinal,
+}
+_PREFIX_UNARY = {
+    GrammarParser.GET_START: GetStart,
+    GrammarParser.GET_FINAL: GetFinal,
+    GrammarParser.GET_REACHABLE: GetReachable,
+    GrammarParser.GET_VERTICES: GetVertices,
+    GrammarParser.GET_EDGES: GetEdges,
+    GrammarParser.GET_LABELS: GetLabels,
+}
+_INFIX = {
+    GrammarParser.AND: Intersect,
+    GrammarParser.OR: UnionPlan,
+    GrammarParser.CONCAT: Concat,
+}
+
+
+class ScriptCompiler:
+    """
+    Translates parse tree of a script into plans of its print statements
+    """
+
+    def __init__(self):
+        self.variables = {}  # name -> plan
+        self.lambda_scopes = []  # names bound by enclosing lambdas
+
+    def compile(self, tree: GrammarParser.ProgContext) -> List:
+        """
+        :param tree: parse tree of prog rule
+        :return: plans of printed expressions in order of print statements
+        """
+        prints = []
+        for stmt in tree.stmt():
+            if stmt.bind():
+                bind = stmt.bind()
+                self.variables[bind.var().getText()] = self.expr(bind.expr())
+            elif stmt.print_expr():
+                prints.append(self.expr(stmt.print_expr().expr()))
+            elif stmt.expr():
+                # expression statements have no effect, but must be valid
+                self.expr(stmt.expr())
+        return prints
+
+    def expr(self, ctx: GrammarParser.ExprContext):
+        first = ctx.getChild(0)
+        if ctx.getChildCount() == 1:
+            if ctx.var():
+                return self.var(ctx.var().getText())
+            return self.val(ctx.val())
+
+        if isinstance(first, TerminalNode):
+            token = first.symbol.type
+            if token == GrammarParser.LP:
+                return self.expr(ctx.expr(0))
+            if token == GrammarParser.LOAD:
+                return Load(_unquote(ctx.STRING().getText()))
+            if token in (GrammarParser.MAP, GrammarParser.FILTER):
+                function = self.lambda_expr(ctx.lambda_expr())
+                node = Map if token == GrammarParser.MAP else Filter
+                return node(function, self.expr(ctx.expr(0)))
+            if token in _PREFIX_BINARY:
+                return _PREFIX_BINARY[token](
+                    self.expr(ctx.expr(0)), self.expr(ctx.expr(1))
+                )
+            if token in _PREFIX_UNARY:
+                return _PREFIX_UNARY[token](self.expr(ctx.expr(0)))
+
+        operator = ctx.getChild(1).symbol.type
+        if operator == GrammarParser.KLEENE:
+            return Star(self.expr(ctx.expr(0)))
+        if operator in _INFIX:
+            return _INFIX[operator](self.expr(ctx.expr(0)), self.expr(ctx.expr(1)))
+        raise InterpretError(f"unsupported expression: {ctx.getText()}")
+
+    def var(self, name: str):
+        if any(name in scope for scope in self.lambda_scopes):
+            return Var(name)
+        if name not in self.variables:
+            raise InterpretError(f"undefined variable {name}")
+        return self.variables[name]
+
+    def val(self, ctx: ParserRuleContext):
+        if ctx.INT():
+            return Const(int(ctx.INT().getText()))
+        if ctx.STRING():
+            return Const(_unquote(ctx.STRING().getText()))
+        return Const(parse_set(ctx.SET().getText()))
+
+    def lambda_expr(self, ctx: GrammarParser.Lambda_exprContext) -> Lambda:
+        if ctx.lambda_expr():
+            return self.lambda_expr(ctx.lambda_expr())
+        pattern = self.pattern(ctx.pattern())
+        self.lambda_scopes.append(set(pattern_names(pattern)))
+        try:
+            return Lambda(pattern, self.expr(ctx.expr()))
+        finally:
+            self.lambda_scopes.pop()
+
+    def pattern(self, ctx: GrammarParser.PatternContext):
+        if ctx.var():
+            return ctx.var().getText()
+        return tuple(self.pattern(sub) for sub in ctx.pattern())
+
+
+def parse_set(text: str) -> frozenset:
+    """
+    :param text: set literal, for example {1, 3..5}
+    :return: set of ints
+    """
+    values = set()
+    for elem in text.strip("{}").split(","):
+        elem = elem.strip()
+        if not elem:
+            continue
+        if ".." in elem:
+            low, high = elem.split("..")
+            values.update(range(int(low), int(high) + 1))
+        else:
+            values.add(int(elem))
+    return frozenset(values)
+
+
+def compile_script(text: str) -> List:
+    """
+    :param text: text of the script
+    :return: plans of printed expressions
+    """
+    tree, errors = parse_text(text)
+    if errors:
+        raise InterpretError(
+            "\n".join(f"line {e.line}:{e.column} {e.message}" for e in errors)
+        )
+    return ScriptCompiler().compile(tree)
+
+
+def run_script(
+    text: str,
+    out: TextIO = None,
+    backend: Union[str, BoolMatrixBackend] = None,
+):
+    """
+    Execute script, values of print statements are written line by line
+    :param text: text of the script
+    :param out: stream to write to, stdout if None
+    :param backend: boolean matrix backend or its name, default backend if None
+    """
+    out = out or sys.stdout
+    evaluator = Evaluator(backend)
+    for plan in compile_script(text):
+        out.write(format_value(evaluator.evaluate(plan)) + "\n")
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Entry point of python -m project: runs the script from the file given
+    as the only argument or from stdin
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        with open(argv[0]) as file:
+            text = file.read()
+    else:
+        text = sys.stdin.read()
+    try:
+        run_script(text)
+    except InterpretError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+def _unquote(text: str) -> str:
+    return text[1:-1] if len(text) >= 2 and text[0] == text[-1] == '"' else text
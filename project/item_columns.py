@@ -0,0 +1,167 @@
+from collections import namedtuple
+from typing import Iterable, List, Optional, Union
+
+import numpy as np
+
+#  Sets of vertices, labels, edges and vertex pairs as numpy columns, so that map
+#  and filter with simple lambdas run as array operations. Per element value of a
+#  compiled lambda body is an array with one value per item, a Constant equal for
+#  every item or Singletons: set of one value where mask is set and empty otherwise,
+#  which is what intersection of ints and sets gives.
+
+Constant = namedtuple("Constant", ["value"])
+Singletons = namedtuple("Singletons", ["values", "mask"])
+
+
+class ItemColumns:
+    """
+    Set of items as columns: items are values of columns if arity is None,
+    otherwise tuples of arity values taken from columns at the same index
+    """
+
+    def __init__(self, columns: List[np.ndarray], arity: Optional[int] = None):
+        """
+        :param columns: arrays of equal length, exactly one if arity is None
+        :param arity: length of item tuples, None for items which are not tuples
+        """
+        self.columns = columns
+        self.arity = arity
+
+    @staticmethod
+    def from_values(values: Iterable) -> "ItemColumns":
+        """
+        :param values: values which are not tuples
+        :return: columns with one item per value
+        """
+        return ItemColumns([column_of(values)])
+
+    @staticmethod
+    def from_tuples(items: Iterable[tuple], arity: int) -> "ItemColumns":
+        """
+        :param items: tuples of length arity
+        :param arity: length of tuples
+        :return: columns with one item per tuple
+        """
+        items = list(items)
+        if not items:
+            return ItemColumns([column_of([]) for _ in range(arity)], arity)
+        return ItemColumns([column_of(values) for values in zip(*items)], arity)
+
+    @staticmethod
+    def from_items(items: frozenset) -> Optional["ItemColumns"]:
+        """
+        :param items: set of values, all of them tuples of one length or none
+        :return: columns of the set, None for empty set or items of mixed shapes
+        """
+        lengths = {len(item) if isinstance(item, tuple) else None for item in items}
+        if len(lengths) != 1:
+            return None
+        arity = lengths.pop()
+        if arity is None:
+            return ItemColumns.from_values(items)
+        return ItemColumns.from_tuples(items, arity)
+
+    def __len__(self) -> int:
+        return len(self.columns[0])
+
+    def select(self, mask: np.ndarray) -> "ItemColumns":
+        """
+        :param mask: bool array, True for items to keep
+        :return: columns of the kept items
+        """
+        return ItemColumns([column[mask] for column in self.columns], self.arity)
+
+    def to_set(self) -> frozenset:
+        if self.arity is None:
+            return frozenset(self.columns[0].tolist())
+        return frozenset(zip(*(column.tolist() for column in self.columns)))
+
+
+def column_of(values: Iterable) -> np.ndarray:
+    """
+    :param values: values of a column
+    :return: int64 array if all values are ints, object array otherwise
+    """
+    values = list(values)
+    if all(type(value) is int for value in values):
+        return np.array(values, dtype=np.int64)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def is_int_column(value) -> bool:
+    return isinstance(value, np.ndarray) and value.dtype == np.int64
+
+
+def intersect_values(
+    left: Union[np.ndarray, Constant, Singletons],
+    right: Union[np.ndarray, Constant, Singletons],
+) -> Optional[Union[Constant, Singletons]]:
+    """
+    Per element & of ints and sets of ints
+    :return: per element value of intersection, None if an operand is not an int
+    column, Singletons or Constant int or frozenset
+    """
+    if isinstance(left, Constant) and isinstance(right, Constant):
+        return None
+    if isinstance(left, Constant):
+        left, right = right, left
+    if isinstance(left, Singletons):
+        values, mask = left
+    elif is_int_column(left):
+        values, mask = left, np.ones(len(left), dtype=bool)
+    else:
+        return None
+
+    if isinstance(right, Constant):
+        members = _int_members(right.value)
+        if members is None:
+            return None
+        return Singletons(values, mask & np.isin(values, members))
+    if isinstance(right, Singletons):
+        return Singletons(values, mask & right.mask & (values == right.values))
+    if is_int_column(right):
+        return Singletons(values, mask & (values == right))
+    return None
+
+
+def truth(value: Union[np.ndarray, Constant, Singletons], size: int) -> np.ndarray:
+    """
+    :return: bool array, truth value of value of every element as filter takes it
+    """
+    if isinstance(value, Constant):
+        return np.full(size, bool(value.value))
+    if isinstance(value, Singletons):
+        return value.mask
+    if is_int_column(value):
+        return value != 0
+    return np.fromiter(map(bool, value), dtype=bool, count=size)
+
+
+def collect(value: Union[np.ndarray, Constant, Singletons], size: int) -> frozenset:
+    """
+    :return: set of values of elements as map builds it
+    """
+    if not size:
+        return frozenset()
+    if isinstance(value, Constant):
+        return frozenset([value.value])
+    if isinstance(value, Singletons):
+        result = {frozenset([v]) for v in np.unique(value.values[value.mask]).tolist()}
+        if not value.mask.all():
+            result.add(frozenset())
+        return frozenset(result)
+    return frozenset(value.tolist())
+
+
+def _int_members(value) -> Optional[np.ndarray]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return np.array([value], dtype=np.int64)
+    if isinstance(value, frozenset):
+        return np.fromiter(
+            (v for v in value if type(v) is int), dtype=np.int64, count=-1
+        )
+    return None
@@ -0,0 +1,236 @@
+import json
+import pathlib
+from typing import Dict, Iterator, List, Tuple, Union
+
+import networkx as nx
+import numpy as np
+from pyformlang.finite_automaton import Symbol
+from scipy import sparse
+
+from project.matrix_backend import BoolMatrixBackend, get_backend
+
+
+class LabeledGraph:
+    """
+    Directed graph with labeled edges stored without networkx: vertices are numbered
+    by their position in `vertices`, edges of every label form a csr adjacency
+    structure (indptr, indices) over these numbers.
+    Graph saved with `save` is opened by `load` as numpy memmaps, so edges are read
+    from disk on demand instead of being held in memory
+    """
+
+    VERTICES_FILE = "vertices.npy"
+    LABELS_FILE = "labels.json"
+
+    def __init__(
+        self,
+        vertices: np.ndarray,
+        labels: List,
+        indptrs: List[np.ndarray],
+        indices: List[np.ndarray],
+    ):
+        self.vertices = vertices
+        self.labels = list(labels)
+        self.label_ids = {label: idx for idx, label in enumerate(self.labels)}
+        self.indptrs = indptrs
+        self.indices = indices
+
+    def number_of_nodes(self) -> int:
+        return len(self.vertices)
+
+    def number_of_edges(self) -> int:
+        return sum(len(indices) for indices in self.indices)
+
+    def edges_by_label(self) -> Dict[object, Tuple[np.ndarray, np.ndarray]]:
+        """
+        :return: sources and targets of edges by labels, as arrays of vertex numbers
+        """
+        return {label: self.label_edges(label) for label in self.labels}
+
+    def label_edges(self, label) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param label: label of edges
+        :return: sources and targets of edges with given label, as arrays of vertex
+        numbers, vertices[number] is the vertex
+        """
+        idx = self.label_ids[label]
+        degrees = np.diff(self.indptrs[idx])
+        sources = np.repeat(np.arange(len(self.vertices)), degrees)
+        return sources, np.asarray(self.indices[idx], dtype=np.int64)
+
+    def edges(self) -> Iterator[Tuple]:
+        """
+        :return: iterator over edges as tuples of source, target and label
+        """
+        for label in self.labels:
+            sources, targets = self.label_edges(label)
+            sources = self.vertices[sources].tolist()
+            targets = self.vertices[targets].tolist()
+            for u, v in zip(sources, targets):
+                yield u, v, label
+
+    def matrix(self, label, backend: Union[str, BoolMatrixBackend] = None):
+        """
+        :param label: label of edges
+        :param backend: boolean matrix backend or its name, default backend if None
+        :return: adjacency matrix of edges with given label over vertex numbers
+        """
+        backend = get_backend(backend)
+        idx = self.label_ids[label]
+        n = len(self.vertices)
+        indices = self.indices[idx]
+        matrix = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=bool), indices, self.indptrs[idx]),
+            shape=(n, n),
+        )
+        return backend.from_sparse(matrix)
+
+    def decompose(self, backend: Union[str, BoolMatrixBackend] = None):
+        """
+        Decomposition of graph edges by labels, the same as decompose_graph
+        :param backend: boolean matrix backend or its name, default backend if None
+        :return: matrices by symbols, indices of vertices and vertices by indices
+        """
+        inds = self.vertices.tolist()
+        matrices = {Symbol(label): self.matrix(label, backend) for label in self.labels}
+        return matrices, {vertex: idx for idx, vertex in enumerate(inds)}, inds
+
+    @staticmethod
+    def from_edges(
+        vertices: np.ndarray,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        label_ids: np.ndarray,
+        labels: List,
+    ) -> "LabeledGraph":
+        """
+        Build graph from arrays of edges
+        :param vertices: vertices by numbers
+        :param sources: numbers of edge sources
+        :param targets: numbers of edge targets
+        :param label_ids: indices of edge labels in labels
+        :param labels: labels of edges
+        :return: graph
+        """
+        n = len(vertices)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        label_ids = np.asarray(label_ids, dtype=np.int64)
+
+        order = np.lexsort((targets, sources, label_ids))
+        bounds = np.searchsorted(label_ids[order], np.arange(len(labels) + 1))
+        indptrs, indices = [], []
+        for i in range(len(labels)):
+            edges = order[bounds[i] : bounds[i + 1]]
+            counts = np.bincount(sources[edges], minlength=n)
+            indptrs.append(np.concatenate(([0], np.cumsum(counts))).astype(np.int64))
+            indices.append(targets[edges])
+        return LabeledGraph(np.asarray(vertices), labels, indptrs, indices)
+
+    @staticmethod
+    def from_networkx(graph: nx.MultiDiGraph) -> "LabeledGraph":
+        """
+        :param graph: networkx graph with "label" attribute of edges
+        :return: graph with the same vertices and edges, vertices of mixed types
+        are converted to strings
+        """
+        vertices = list(graph.nodes)
+        numbers = {vertex: idx for idx, vertex in enumerate(vertices)}
+        labels = {}
+        sources, targets, label_ids = [], [], []
+        for u, v, label in graph.edges(data="label"):
+            sources.append(numbers[u])
+            targets.append(numbers[v])
+            label_ids.append(labels.setdefault(label, len(labels)))
+        vertices = np.asarray(vertices)
+        if vertices.dtype == object:
+            vertices = vertices.astype(str)
+        return LabeledGraph.from_edges(
+            vertices, sources, targets, label_ids, list(labels)
+        )
+
+    def to_networkx(self) -> nx.MultiDiGraph:
+        graph = nx.MultiDiGraph()
+        graph.add_nodes_from(self.vertices.tolist())
+        graph.add_edges_from((u, v, {"label": label}) for u, v, label in self.edges())
+        return graph
+
+    @staticmethod
+    def from_csv(path: Union[str, pathlib.Path]) -> "LabeledGraph":
+        """
+        Read graph in cfpq_data csv format: every line is "source target label",
+        vertices are integers
+        :param path: path to csv file
+        :return: graph
+        """
+        labels = {}
+        sources, targets, label_ids = [], [], []
+        with open(path) as csv:
+            for line in csv:
+                if not line.strip():
+                    continue
+                u, v, label = line.split()
+                sources.append(int(u))
+                targets.append(int(v))
+                label_ids.append(labels.setdefault(label, len(labels)))
+        vertices, numbers = np.unique(
+            np.asarray(sources + targets, dtype=np.int64), return_inverse=True
+        )
+        return LabeledGraph.from_edges(
+            vertices,
+            numbers[: len(sources)],
+            numbers[len(sources) :],
+            label_ids,
+            list(labels),
+        )
+
+    def to_csv(self, path: Union[str, pathlib.Path]):
+        """
+        Write graph in cfpq_data csv format
+        :param path: path to csv file
+        """
+        with open(path, "w") as csv:
+            for u, v, label in self.edges():
+                csv.write(f"{u} {v} {label}\n")
+
+    def save(self, directory: Union[str, pathlib.Path]):
+        """
+        Save graph as .npy files which can be opened as memmaps by `load`
+        :param directory: directory for graph files
+        """
+        directory = pathlib.Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / self.VERTICES_FILE, self.vertices)
+        with open(directory / self.LABELS_FILE, "w") as labels:
+            json.dump(self.labels, labels)
+        for i in range(len(self.labels)):
+            np.save(directory / f"indptr_{i}.npy", self.indptrs[i])
+            np.save(directory / f"indices_{i}.npy", self.indices[i])
+
+    @staticmethod
+    def load(directory: Union[str, pathlib.Path], mmap: bool = True) -> "LabeledGraph":
+        """
+        Open graph saved by `save`
+        :param directory: directory with graph files
+        :param mmap: open arrays as read-only numpy memmaps
+        :return: graph
+        """
+        directory = pathlib.Path(directory)
+        mmap_mode = "r" if mmap else None
+        with open(directory / LabeledGraph.LABELS_FILE) as labels_file:
+            labels = json.load(labels_file)
+        return LabeledGraph(
+            np.load(directory / LabeledGraph.VERTICES_FILE, mmap_mode=mmap_mode),
+            labels,
+            [
+                np.load(directory / f"indptr_{i}.npy", mmap_mode=mmap_mode)
+                for i in range(len(labels))
+            ],
+            [
+                np.load(directory / f"indices_{i}.npy", mmap_mode=mmap_mode)
+                for i in range(len(labels))
+            ],
+        )
+
+
+Graph = Union[nx.MultiDiGraph, LabeledGraph]
@@ -0,0 +1,232 @@
+from abc import ABC, abstractmethod
+from typing import Tuple, Union
+
+import numpy as np
+from scipy import sparse
+
+#  Boolean matrices used by CFPQ and RPQ algorithms. Every algorithm works with
+#  matrices only through a backend, so the storage format can be chosen per call
+#  (`backend=` argument) or globally (`set_default_backend`).
+
+
+class BoolMatrixBackend(ABC):
+    """Operations over boolean matrices of one storage format"""
+
+    name = None
+
+    @abstractmethod
+    def zeros(self, shape: Tuple[int, int]):
+        """Empty matrix of given shape"""
+
+    @abstractmethod
+    def from_coo(self, rows, cols, shape: Tuple[int, int]):
+        """
+        Build matrix from coordinates of true cells, duplicates are allowed
+        :param rows: row indices of true cells
+        :param cols: column indices of true cells
+        :param shape: shape of the matrix
+        :return: matrix of the backend
+        """
+
+    @abstractmethod
+    def from_sparse(self, matrix: sparse.spmatrix):
+        """Convert scipy sparse matrix to matrix of the backend"""
+
+    @abstractmethod
+    def to_sparse(self, matrix) -> sparse.csr_matrix:
+        """Convert matrix of the backend to scipy csr matrix"""
+
+    @abstractmethod
+    def matmul(self, a, b):
+        """Boolean matrix product"""
+
+    @abstractmethod
+    def add(self, a, b):
+        """Elementwise disjunction"""
+
+    @abstractmethod
+    def difference(self, a, b):
+        """Cells which are true in a and false in b"""
+
+    @abstractmethod
+    def kron(self, a, b):
+        """Kronecker product"""
+
+    @abstractmethod
+    def transpose(self, matrix):
+        """Transposed matrix"""
+
+    @abstractmethod
+    def nnz(self, matrix) -> int:
+        """Number of true cells"""
+
+    @abstractmethod
+    def nonzero(self, matrix) -> Tuple[np.ndarray, np.ndarray]:
+        """Row and column indices of true cells"""
+
+    def identity(self, n: int):
+        """Identity matrix of size n"""
+        idx = np.arange(n)
+        return self.from_coo(idx, idx, (n, n))
+
+
+class CsrBackend(BoolMatrixBackend):
+    """Sparse matrices in scipy csr format"""
+
+    name = "csr"
+
+    def zeros(self, shape):
+        return sparse.csr_matrix(shape, dtype=bool)
+
+    def from_coo(self, rows, cols, shape):
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        data = np.ones(len(rows), dtype=bool)
+        return sparse.coo_matrix((data, (rows, cols)), shape=shape).tocsr()
+
+    def from_sparse(self, matrix):
+        return sparse.csr_matrix(matrix, dtype=bool)
+
+    def to_sparse(self, matrix):
+        return matrix
+
+    def matmul(self, a, b):
+        return a @ b
+
+    def add(self, a, b):
+        return a + b
+
+    def difference(self, a, b):
+        return a > b
+
+    def kron(self, a, b):
+        return sparse.kron(a, b, format="csr")
+
+    def transpose(self, matrix):
+        return matrix.transpose().tocsr()
+
+    def nnz(self, matrix):
+        return matrix.nnz
+
+    def nonzero(self, matrix):
+        return matrix.nonzero()
+
+
+class BitMatrix:
+    """
+    Dense boolean matrix, every row is packed into uint64 words:
+    bit j % 64 of words[i, j // 64] is the cell (i, j)
+    """
+
+    def __init__(self, words: np.ndarray, shape: Tuple[int, int]):
+        self.words = words
+        self.shape = shape
+
+    @staticmethod
+    def pack(dense: np.ndarray) -> "BitMatrix":
+        n, m = dense.shape
+        n_words = (m + 63) // 64
+        padded = np.zeros((n, n_words * 64), dtype=bool)
+        padded[:, :m] = dense
+        packed = np.packbits(padded, axis=1, bitorder="little")
+        return BitMatrix(
+            np.ascontiguousarray(packed).view(np.uint64).reshape(n, n_words), (n, m)
+        )
+
+    def unpack(self) -> np.ndarray:
+        n, m = self.shape
+        as_bytes = self.words.view(np.uint8).reshape(n, -1)
+        return np.unpackbits(as_bytes, axis=1, bitorder="little")[:, :m].astype(bool)
+
+
+class BitPackedBackend(BoolMatrixBackend):
+    """Dense bit-packed matrices, suitable for small or dense matrices"""
+
+    name = "bitpacked"
+
+    def zeros(self, shape):
+        n, m = shape
+        return BitMatrix(np.zeros((n, (m + 63) // 64), dtype=np.uint64), shape)
+
+    def from_coo(self, rows, cols, shape):
+        dense = np.zeros(shape, dtype=bool)
+        dense[np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)] = True
+        return BitMatrix.pack(dense)
+
+    def from_sparse(self, matrix):
+        return BitMatrix.pack(matrix.toarray().astype(bool))
+
+    def to_sparse(self, matrix):
+        return sparse.csr_matrix(matrix.unpack())
+
+    def matmul(self, a, b):
+        a_dense = a.unpack()
+        result = self.zeros((a.shape[0], b.shape[1]))
+        for k in np.flatnonzero(a_dense.any(axis=0)):
+            result.words[a_dense[:, k]] |= b.words[k]
+        return result
+
+    def add(self, a, b):
+        return BitMatrix(a.words | b.words, a.shape)
+
+    def difference(self, a, b):
+        return BitMatrix(a.words & ~b.words, a.shape)
+
+    def kron(self, a, b):
+        return BitMatrix.pack(np.kron(a.unpack(), b.unpack()))
+
+    def transpose(self, matrix):
+        return BitMatrix.pack(matrix.unpack().T)
+
+    def nnz(self, matrix):
+        return int(np.unpackbits(matrix.words.view(np.uint8)).sum())
+
+    def nonzero(self, matrix):
+        return np.nonzero(matrix.unpack())
+
+
+BACKENDS = {backend.name: backend for backend in (CsrBackend(), BitPackedBackend())}
+
+_default_backend = BACKENDS["csr"]
+
+
+def set_default_backend(backend: Union[str, BoolMatrixBackend]):
+    """
+    Set backend used by algorithms when no backend is passed explicitly
+    :param backend: backend or its name
+    """
+    global _default_backend
+    _default_backend = get_backend(backend)
+
+
+def get_backend(backend: Union[str, BoolMatrixBackend] = None) -> BoolMatrixBackend:
+    """
+    Resolve backend argument of algorithms
+    :param backend: backend, its name or None for the default one
+    :return: backend
+    """
+    if backend is None:
+        return _default_backend
+    if isinstance(backend, BoolMatrixBackend):
+        return backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown matrix backend: {backend}")
+    return BACKENDS[backend]
+
+
+def transitive_closure(matrix, backend: Union[str, BoolMatrixBackend] = None):
+    """
+    Transitive closure of square boolean matrix by repeated squaring
+    :param matrix: adjacency matrix of the backend
+    :param backend: backend of the matrix, default backend if None
+    :return: matrix with cell (i, j) set iff j is reachable from i by nonempty path
+    """
+    backend = get_backend(backend)
+    closure = matrix
+    nnz = backend.nnz(closure)
+    while True:
+        closure = backend.add(closure, backend.matmul(closure, closure))
+        new_nnz = backend.nnz(closure)
+        if new_nnz == nnz:
+            return closure
+        nnz = new_nnz
@@ -0,0 +1,193 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Union
+
+import numpy as np
+from pyformlang.finite_automaton import Symbol
+from pyformlang.regular_expression import Regex
+from scipy import sparse
+
+from project.labeled_graph import Graph
+from project.matrix_backend import BoolMatrixBackend, get_backend
+from project.regular_path_queries import bfs_rpq_matrices, decompose_graph
+
+#  Batches of regular path queries against one graph run in a process pool.
+#  The graph is decomposed once in the parent, csr arrays of its label matrices are
+#  copied into shared memory, and workers build their matrices over these buffers
+#  when they start, so tasks carry only the regex and start vertices.
+
+_worker_decomposition = None
+_worker_backend = None
+_worker_buffers = []
+
+
+class SharedDecomposition:
+    """
+    Label matrices of decompose_graph in shared memory: csr structure of the label
+    with index i is indptr[indptr_offsets[i]:indptr_offsets[i + 1]] and
+    indices[indices_offsets[i]:indices_offsets[i + 1]]. Labels are kept as values:
+    pickled symbols keep hashes of the parent, which differ in spawned workers
+    """
+
+    def __init__(self, decomposition: Tuple[Dict, Dict, List], backend):
+        matrices, _, self.vertices = decomposition
+        symbols = list(matrices)
+        self.labels = [symbol.value for symbol in symbols]
+        csr = [backend.to_sparse(matrices[symbol]).tocsr() for symbol in symbols]
+        self.shape = (len(self.vertices), len(self.vertices))
+        self.indptr_offsets = np.cumsum([0] + [len(m.indptr) for m in csr])
+        self.indices_offsets = np.cumsum([0] + [len(m.indices) for m in csr])
+
+        self._memory = []
+        self.indptr_name = self._share(
+            np.concatenate([m.indptr for m in csr] or [[]]).astype(np.int64)
+        )
+        self.indices_name = self._share(
+            np.concatenate([m.indices for m in csr] or [[]]).astype(np.int64)
+        )
+
+    def _share(self, array: np.ndarray) -> str:
+        memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=memory.buf)[:] = array
+        self._memory.append(memory)
+        return memory.name
+
+    def attach(self, backend: BoolMatrixBackend):
+        """
+        Build decomposition over shared buffers, called in worker processes
+        :param backend: backend of the result matrices
+        :return: decomposition as returned by decompose_graph and opened buffers,
+        which must be kept alive while matrices are used
+        """
+        indptr_memory = shared_memory.SharedMemory(name=self.indptr_name)
+        indices_memory = shared_memory.SharedMemory(name=self.indices_name)
+        indptr = np.ndarray(
+            (self.indptr_offsets[-1],), np.int64, buffer=indptr_memory.buf
+        )
+        indices = np.ndarray(
+            (self.indices_offsets[-1],), np.int64, buffer=indices_memory.buf
+        )
+
+        matrices = {}
+        for i, label in enumerate(self.labels):
+            label_indices = indices[
+                self.indices_offsets[i] : self.indices_offsets[i + 1]
+            ]
+            matrix = sparse.csr_matrix(
+                (
+                    np.ones(len(label_indices), dtype=bool),
+                    label_indices,
+                    indptr[self.indptr_offsets[i] : self.indptr_offsets[i + 1]],
+                ),
+                shape=self.shape,
+                copy=False,
+            )
+            matrices[Symbol(label)] = (
+                matrix if backend.name == "csr" else backend.from_sparse(matrix)
+            )
+        states = {vertex: idx for idx, vertex in enumerate(self.vertices)}
+        return (matrices, states, self.vertices), [indptr_memory, indices_memory]
+
+    def release(self):
+        for memory in self._memory:
+            memory.close()
+            memory.unlink()
+        self._memory = []
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_memory"] = []
+        return state
+
+
+def _init_worker(shared: SharedDecomposition, backend: str):
+    global _worker_decomposition, _worker_backend, _worker_buffers
+    _worker_backend = get_backend(backend)
+    _worker_decomposition, _worker_buffers = shared.attach(_worker_backend)
+
+
+def _run_query(regex, start_vertices, final_vertices, per_source):
+    return bfs_rpq_matrices(
+        _worker_decomposition,
+        regex,
+        start_vertices,
+        final_vertices,
+        per_source,
+        _worker_backend,
+    )
+
+
+def batch_rpq(
+    graph: Graph,
+    queries: Iterable[Tuple[Iterable, Union[str, Regex]]],
+    final_vertices: Iterable = None,
+    per_source: bool = False,
+    workers: int = None,
+    chunk_size: int = None,
+    backend: Union[str, BoolMatrixBackend] = None,
+    mp_context=None,
+) -> Iterator[Tuple[int, Union[Set, Dict[object, Set]]]]:
+    """
+    Run independent bfs_rpq queries against one graph in a process pool
+    :param graph: graph to query
+    :param queries: pairs of start vertices (every vertex if None) and regex
+    :param final_vertices: vertices paths end in, every vertex if None
+    :param per_source: compute reachable final vertices for every start vertex
+    separately, as bfs_rpq does
+    :param workers: number of worker processes, number of cpus if None
+    :param chunk_size: split start vertices of every query into tasks of this size,
+    whole queries are tasks if None
+    :param backend: boolean matrix backend or its name, default backend if None
+    :param mp_context: multiprocessing context of the pool, default one if None
+    :return: iterator over pairs of query index and its result in order of completion
+    """
+    backend = get_backend(backend)
+    decomposition = decompose_graph(graph, backend)
+    queries = [
+        (decomposition[2] if starts is None else list(starts), regex)
+        for starts, regex in queries
+    ]
+    final_vertices = None if final_vertices is None else set(final_vertices)
+
+    shared = SharedDecomposition(decomposition, backend)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(shared, backend.name),
+        ) as executor:
+            tasks = {}
+            results = {}
+            pending = {}
+            for idx, (starts, regex) in enumerate(queries):
+                chunks = _chunks(starts, chunk_size)
+                results[idx] = {} if per_source else set()
+                pending[idx] = len(chunks)
+                for chunk in chunks:
+                    future = executor.submit(
+                        _run_query, regex, chunk, final_vertices, per_source
+                    )
+                    tasks[future] = idx
+                if not chunks:
+                    yield idx, results.pop(idx)
+
+            while tasks:
+                done, _ = wait(tasks, return_when=FIRST_COMPLETED)
+                for future in done:
+                    idx = tasks.pop(future)
+                    results[idx].update(future.result())
+                    pending[idx] -= 1
+                    if not pending[idx]:
+                        yield idx, results.pop(idx)
+    finally:
+        shared.release()
+
+
+def _chunks(vertices: List, chunk_size: int = None) -> List[List]:
+    if not vertices:
+        return []
+    if chunk_size is None:
+        return [vertices]
+    return [vertices[i : i + chunk_size] for i in range(0, len(vertices), chunk_size)]
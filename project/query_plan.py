@@ -0,0 +1,784 @@
+import hashlib
+import os
+import pathlib
+import sys
+import typing
+from collections import OrderedDict, namedtuple
+from typing import Dict, FrozenSet, Optional, Tuple
+
+import networkx as nx
+from pyformlang.finite_automaton import EpsilonNFA, State
+from pyformlang.regular_expression import Regex
+
+from project.fsm import cached_regex_to_dfa, graph_to_nfa
+from project.graph_utils import load_graph
+from project.item_columns import (
+    Constant,
+    ItemColumns,
+    collect,
+    intersect_values,
+    truth,
+)
+from project.labeled_graph import LabeledGraph
+from project.matrix_backend import BoolMatrixBackend, get_backend, transitive_closure
+from project.regular_path_queries import decompose_fa, intersect, regular_path_query
+
+#  Query scripts are compiled into plans: trees of the namedtuples below, evaluated
+#  only when a print statement needs the value. Evaluation looks at the shape of
+#  the plan first, so get_reachable of a graph intersected with a regular expression,
+#  with start and final vertices set on either of them, runs as one regular path
+#  query over matrices of the graph instead of building automata of the operands.
+#  Plans are hash-consed, so equal subexpressions of a script are one object and are
+#  evaluated once per run. Loaded graphs, intersections and reachable pairs are also
+#  kept between runs in an LRU cache limited by estimated size of the values.
+#  Map and filter with lambdas built from pattern variables, constants and & run
+#  over numpy columns of the set, other lambdas are called per element.
+
+Const = namedtuple("Const", ["value"])  # int, str or frozenset
+Var = namedtuple("Var", ["name"])  # variable bound by lambda pattern
+Load = namedtuple("Load", ["path"])
+SetStart = namedtuple("SetStart", ["vertices", "expr"])
+SetFinal = namedtuple("SetFinal", ["vertices", "expr"])
+AddStart = namedtuple("AddStart", ["vertices", "expr"])
+AddFinal = namedtuple("AddFinal", ["vertices", "expr"])
+Intersect = namedtuple("Intersect", ["left", "right"])
+Union = namedtuple("Union", ["left", "right"])
+Concat = namedtuple("Concat", ["left", "right"])
+Star = namedtuple("Star", ["expr"])
+GetStart = namedtuple("GetStart", ["expr"])
+GetFinal = namedtuple("GetFinal", ["expr"])
+GetReachable = namedtuple("GetReachable", ["expr"])
+GetVertices = namedtuple("GetVertices", ["expr"])
+GetEdges = namedtuple("GetEdges", ["expr"])
+GetLabels = namedtuple("GetLabels", ["expr"])
+Lambda = namedtuple("Lambda", ["pattern", "body"])  # pattern is name or tuple
+Map = namedtuple("Map", ["function", "expr"])
+Filter = namedtuple("Filter", ["function", "expr"])
+
+GraphLanguage = namedtuple("GraphLanguage", ["graph", "starts", "finals"])
+GraphLanguage.__doc__ = """
+Graph as automaton: every vertex is a state, start and final vertices are
+frozensets, None means every vertex
+"""
+
+
+PLAN_TYPES = (
+    Const,
+    Var,
+    Load,
+    SetStart,
+    SetFinal,
+    AddStart,
+    AddFinal,
+    Intersect,
+    Union,
+    Concat,
+    Star,
+    GetStart,
+    GetFinal,
+    GetReachable,
+    GetVertices,
+    GetEdges,
+    GetLabels,
+    Lambda,
+    Map,
+    Filter,
+)
+#  results of these plans are kept between script runs
+SHARED_TYPES = (Load, Intersect, GetReachable)
+
+PlanInfo = namedtuple("PlanInfo", ["digest", "free_vars", "loads"])
+PlanInfo.__doc__ = """
+Facts about canonical plan: structural hash, names of lambda variables it
+depends on and paths of graphs it loads
+"""
+
+RESULT_CACHE_BUDGET = 256 << 20
+#  rough sizes of networkx graph and pyformlang automaton parts, in bytes
+GRAPH_ELEMENT_SIZE = 1024
+AUTOMATON_ELEMENT_SIZE = 1024
+
+
+class InterpretError(Exception):
+    pass
+
+
+class PlanTable:
+    """
+    Hash-consing of plans: structurally equal plans are replaced with one canonical
+    object. Children of canonical plans are canonical, so a plan is looked up by
+    ids of its children and is hashed in time independent of its size
+    """
+
+    def __init__(self):
+        self._canonical = {}  # type name and fields with children by id -> plan
+        self._info = {}  # id of canonical plan -> PlanInfo
+
+    def intern(self, plan):
+        """
+        :param plan: plan
+        :return: canonical plan equal to the given one
+        """
+        if id(plan) in self._info:
+            return plan
+        fields = tuple(
+            self.intern(value) if _is_plan(value) else value for value in plan
+        )
+        key = (type(plan).__name__,) + tuple(
+            id(value) if _is_plan(value) else value for value in fields
+        )
+        canonical = self._canonical.get(key)
+        if canonical is None:
+            canonical = type(plan)(*fields)
+            self._canonical[key] = canonical
+            self._info[id(canonical)] = self._describe(canonical)
+        return canonical
+
+    def info(self, plan) -> PlanInfo:
+        """
+        :param plan: canonical plan
+        :return: its PlanInfo
+        """
+        return self._info[id(plan)]
+
+    def __len__(self) -> int:
+        return len(self._canonical)
+
+    def _describe(self, plan) -> PlanInfo:
+        digest = hashlib.sha256(type(plan).__name__.encode())
+        free_vars, loads = set(), set()
+        for value in plan:
+            if _is_plan(value):
+                child = self._info[id(value)]
+                digest.update(child.digest.encode())
+                free_vars |= child.free_vars
+                loads |= child.loads
+            else:
+                digest.update(_value_repr(value).encode())
+            digest.update(b"\0")
+        if isinstance(plan, Var):
+            free_vars.add(plan.name)
+        elif isinstance(plan, Lambda):
+            free_vars -= set(pattern_names(plan.pattern))
+        elif isinstance(plan, Load):
+            loads.add(plan.path)
+        return PlanInfo(digest.hexdigest(), frozenset(free_vars), frozenset(loads))
+
+
+class ResultCache:
+    """
+    LRU cache of values with total estimated size limited by budget
+    """
+
+    def __init__(self, budget: int = RESULT_CACHE_BUDGET):
+        """
+        :param budget: maximal total size of values in bytes, 0 disables the cache
+        """
+        self.budget = budget
+        self.size = 0
+        self._values = OrderedDict()  # key -> (value, size)
+
+    def get(self, key):
+        """
+        :return: cached value or None
+        """
+        if key not in self._values:
+            return None
+        self._values.move_to_end(key)
+        return self._values[key][0]
+
+    def put(self, key, value):
+        size = estimate_size(value)
+        if size > self.budget:
+            return
+        if key in self._values:
+            self.size -= self._values.pop(key)[1]
+        while self.size + size > self.budget:
+            _, (_, evicted) = self._values.popitem(last=False)
+            self.size -= evicted
+        self._values[key] = (value, size)
+        self.size += size
+
+    def clear(self):
+        self._values.clear()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+_result_cache = ResultCache()
+
+
+def set_result_cache_budget(budget: int):
+    """
+    Set memory budget of values kept between script runs, evicting the least
+    recently used ones
+    :param budget: budget in bytes, 0 disables the cache
+    """
+    _result_cache.budget = budget
+    while _result_cache.size > budget:
+        _, (_, evicted) = _result_cache._values.popitem(last=False)
+        _result_cache.size -= evicted
+
+
+def clear_result_cache():
+    """Drop values kept between script runs"""
+    _result_cache.clear()
+
+
+class Evaluator:
+    """
+    Evaluates plans, values are int, str, frozenset, tuple, GraphLanguage,
+    Regex and EpsilonNFA. One evaluator corresponds to one script run: values of
+    plans without lambda variables are computed once per evaluator
+    """
+
+    def __init__(
+        self,
+        backend: typing.Union[str, BoolMatrixBackend] = None,
+        cache: ResultCache = None,
+    ):
+        """
+        :param backend: boolean matrix backend or its name, default backend if None
+        :param cache: cache of values shared between runs, the module one if None
+        """
+        self.backend = get_backend(backend)
+        self.plans = PlanTable()
+        self.cache = _result_cache if cache is None else cache
+        self._memo = {}  # id of canonical plan -> value
+
+    def evaluate(self, plan, env: Dict[str, object] = None):
+        """
+        :param plan: plan of expression
+        :param env: values of lambda variables
+        :return: value of expression
+        """
+        env = env or {}
+        plan = self.plans.intern(plan)
+        info = self.plans.info(plan)
+        if info.free_vars:
+            return self._dispatch(plan, env)
+        if id(plan) in self._memo:
+            return self._memo[id(plan)]
+
+        shared = isinstance(plan, SHARED_TYPES) and self.cache.budget > 0
+        value = None
+        if shared:
+            key = (info.digest, _load_versions(info.loads))
+            value = self.cache.get(key)
+        if value is None:
+            value = self._dispatch(plan, env)
+            if shared:
+                self.cache.put(key, value)
+        self._memo[id(plan)] = value
+        return value
+
+    def _dispatch(self, plan, env):
+        handler = getattr(self, f"_eval_{type(plan).__name__}", None)
+        if handler is None:
+            raise InterpretError(f"can not evaluate {type(plan).__name__}")
+        return handler(plan, env)
+
+    def _eval_Const(self, plan, env):
+        return plan.value
+
+    def _eval_Var(self, plan, env):
+        if plan.name not in env:
+            raise InterpretError(f"undefined variable {plan.name}")
+        return env[plan.name]
+
+    def _eval_Load(self, plan, env):
+        return GraphLanguage(load_script_graph(plan.path), None, None)
+
+    def _eval_SetStart(self, plan, env):
+        return self._with_states(plan, env, start=True, add=False)
+
+    def _eval_SetFinal(self, plan, env):
+        return self._with_states(plan, env, start=False, add=False)
+
+    def _eval_AddStart(self, plan, env):
+        return self._with_states(plan, env, start=True, add=True)
+
+    def _eval_AddFinal(self, plan, env):
+        return self._with_states(plan, env, start=False, add=True)
+
+    def _with_states(self, plan, env, start: bool, add: bool):
+        if isinstance(plan.expr, Intersect):
+            pushed = self._push_states(plan, plan.expr, env)
+            if pushed is not None:
+                return self.evaluate(pushed, env)
+
+        vertices = _as_set(self.evaluate(plan.vertices, env))
+        language = self.evaluate(plan.expr, env)
+        if isinstance(language, GraphLanguage):
+            old = language.starts if start else language.finals
+            if add:
+                old = _graph_vertices(language.graph) if old is None else old
+                vertices = old | vertices
+            if start:
+                return language._replace(starts=vertices)
+            return language._replace(finals=vertices)
+
+        nfa = self.to_nfa(language).copy()
+        if not add:
+            for state in list(nfa.start_states if start else nfa.final_states):
+                if start:
+                    nfa.remove_start_state(state)
+                else:
+                    nfa.remove_final_state(state)
+        states = {}
+        for state in nfa.states:
+            states.setdefault(_vertex_of(state), []).append(state)
+        for vertex in vertices:
+            for state in states.get(vertex, [State(vertex)]):
+                if start:
+                    nfa.add_start_state(state)
+                else:
+                    nfa.add_final_state(state)
+        return nfa
+
+    def _push_states(self, plan, expr, env):
+        """
+        Start and final vertices of intersection with a graph are set on the graph,
+        so that states of the other operands stay start and final
+        :return: expr with plan applied to its graph operand, None if no operand
+        is a graph
+        """
+        if not isinstance(expr, Intersect):
+            return plan._replace(expr=expr)
+        for side in ("left", "right"):
+            operand = getattr(expr, side)
+            if self._has_graph(operand, env):
+                return expr._replace(**{side: self._push_states(plan, operand, env)})
+        return None
+
+    def _has_graph(self, plan, env) -> bool:
+        """
+        :return: whether states of language of plan are vertices of a graph: plan
+        is a graph, possibly with start and final vertices set, or its intersection
+        """
+        if isinstance(plan, (SetStart, SetFinal, AddStart, AddFinal)):
+            return self._has_graph(plan.expr, env)
+        if isinstance(plan, Intersect):
+            return self._has_graph(plan.left, env) or self._has_graph(plan.right, env)
+        return isinstance(self.evaluate(plan, env), GraphLanguage)
+
+    def _eval_Intersect(self, plan, env):
+        left = self.evaluate(plan.left, env)
+        right = self.evaluate(plan.right, env)
+        if _is_set_like(left) and _is_set_like(right):
+            return _as_set(left) & _as_set(right)
+        if self._has_graph(plan.right, env) and not self._has_graph(plan.left, env):
+            # vertices of product states are taken from the left operand
+            left, right = right, left
+        return intersect(self.to_nfa(left), self.to_nfa(right), self.backend)
+
+    def _eval_Union(self, plan, env):
+        regex = self.regex_of(plan, env)
+        if regex is not None:
+            return regex
+        left = self.evaluate(plan.left, env)
+        right = self.evaluate(plan.right, env)
+        if _is_set_like(left) and _is_set_like(right):
+            return _as_set(left) | _as_set(right)
+        return self.to_nfa(left).union(self.to_nfa(right))
+
+    def _eval_Concat(self, plan, env):
+        regex = self.regex_of(plan, env)
+        if regex is not None:
+            return regex
+        left = self.to_nfa(self.evaluate(plan.left, env))
+        return left.concatenate(self.to_nfa(self.evaluate(plan.right, env)))
+
+    def _eval_Star(self, plan, env):
+        regex = self.regex_of(plan, env)
+        if regex is not None:
+            return regex
+        return self.to_nfa(self.evaluate(plan.expr, env)).kleene_star()
+
+    def _eval_GetStart(self, plan, env):
+        language = self.evaluate(plan.expr, env)
+        if isinstance(language, GraphLanguage):
+            if language.starts is None:
+                return _graph_vertices(language.graph)
+            return language.starts
+        return frozenset(map(_vertex_of, self.to_nfa(language).start_states))
+
+    def _eval_GetFinal(self, plan, env):
+        language = self.evaluate(plan.expr, env)
+        if isinstance(language, GraphLanguage):
+            if language.finals is None:
+                return _graph_vertices(language.graph)
+            return language.finals
+        return frozenset(map(_vertex_of, self.to_nfa(language).final_states))
+
+    def _eval_GetVertices(self, plan, env):
+        language = self.evaluate(plan.expr, env)
+        if isinstance(language, GraphLanguage):
+            return _graph_vertices(language.graph)
+        return frozenset(map(_vertex_of, self.to_nfa(language).states))
+
+    def _eval_GetEdges(self, plan, env):
+        language = self.evaluate(plan.expr, env)
+        if isinstance(language, GraphLanguage):
+            return frozenset(
+                (u, label, v) for u, v, label in language.graph.edges(data="label")
+            )
+        return frozenset(
+            (u.value, label.value, v.value) for u, label, v in self.to_nfa(language)
+        )
+
+    def _eval_GetLabels(self, plan, env):
+        language = self.evaluate(plan.expr, env)
+        if isinstance(language, GraphLanguage):
+            return frozenset(
+                label for _, _, label in language.graph.edges(data="label")
+            )
+        return frozenset(label.value for _, label, _ in self.to_nfa(language))
+
+    def _eval_GetReachable(self, plan, env):
+        query = self.rpq_of(plan.expr, env)
+        if query is not None:
+            graph, regex, starts, finals = query
+            return frozenset(
+                regular_path_query(graph, regex, starts, finals, self.backend)
+            )
+
+        nfa = self.to_nfa(self.evaluate(plan.expr, env))
+        matrices, states, inds = decompose_fa(nfa, self.backend)
+        n_states = len(inds)
+        adjacency = self.backend.identity(n_states)
+        for matrix in matrices.values():
+            adjacency = self.backend.add(adjacency, matrix)
+        closure = transitive_closure(adjacency, self.backend)
+        starts = {states[state] for state in nfa.start_states}
+        finals = {states[state] for state in nfa.final_states}
+        return frozenset(
+            (_vertex_of(inds[u]), _vertex_of(inds[v]))
+            for u, v in zip(*(idx.tolist() for idx in self.backend.nonzero(closure)))
+            if u in starts and v in finals
+        )
+
+    def _eval_Lambda(self, plan, env):
+        raise InterpretError("lambda can only be an argument of map or filter")
+
+    def _eval_Map(self, plan, env):
+        columns = self.columns_of(plan.expr, env)
+        if columns is not None:
+            value = self.vectorize(plan.function, columns, env)
+            if value is not None:
+                return collect(value, len(columns))
+        items = self._items(plan.expr, env)
+        return frozenset(self.apply(plan.function, item, env) for item in items)
+
+    def _eval_Filter(self, plan, env):
+        columns = self.columns_of(plan, env)
+        if columns is not None:
+            return columns.to_set()
+        items = self._items(plan.expr, env)
+        return frozenset(item for item in items if self.apply(plan.function, item, env))
+
+    def columns_of(self, plan, env) -> Optional[ItemColumns]:
+        """
+        :return: columns of set value of plan, vertices and edges of graphs and
+        results of vectorized filters are built without python sets; None if the
+        value is not a set, is empty or has items of different shapes
+        """
+        if isinstance(plan, Filter):
+            columns = self.columns_of(plan.expr, env)
+            if columns is None:
+                return None
+            value = self.vectorize(plan.function, columns, env)
+            if value is None:
+                return None
+            return columns.select(truth(value, len(columns)))
+        if isinstance(plan, (GetVertices, GetEdges)):
+            language = self.evaluate(plan.expr, env)
+            if isinstance(language, GraphLanguage) and language.graph:
+                graph = language.graph
+                if isinstance(plan, GetVertices):
+                    return ItemColumns.from_values(graph.nodes)
+                return ItemColumns.from_tuples(
+                    ((u, label, v) for u, v, label in graph.edges(data="label")), 3
+                )
+        items = self.evaluate(plan, env)
+        if not isinstance(items, frozenset) or not items:
+            return None
+        return ItemColumns.from_items(items)
+
+    def vectorize(self, function: Lambda, columns: ItemColumns, env):
+        """
+        :param function: lambda plan
+        :param columns: items the lambda is applied to
+        :param env: values of variables of enclosing lambdas
+        :return: value of lambda body for every item as array, Constant or
+        Singletons of item_columns, None if the lambda can not be vectorized
+        """
+        pattern = function.pattern
+        if not len(columns):
+            return None
+        if isinstance(pattern, str) and columns.arity is None:
+            bound = {pattern: columns.columns[0]}
+        elif (
+            isinstance(pattern, tuple)
+            and len(pattern) == columns.arity
+            and all(isinstance(name, str) for name in pattern)
+        ):
+            bound = dict(zip(pattern, columns.columns))
+        else:
+            return None
+        return self._vectorize_body(function.body, bound, env)
+
+    def _vectorize_body(self, plan, bound, env):
+        plan = self.plans.intern(plan)
+        if not self.plans.info(plan).free_vars & set(bound):
+            return Constant(self.evaluate(plan, env))
+        if isinstance(plan, Var):
+            return bound[plan.name]
+        if isinstance(plan, Intersect):
+            left = self._vectorize_body(plan.left, bound, env)
+            right = self._vectorize_body(plan.right, bound, env)
+            if left is None or right is None:
+                return None
+            return intersect_values(left, right)
+        return None
+
+    def _items(self, plan, env) -> frozenset:
+        items = self.evaluate(plan, env)
+        if not isinstance(items, frozenset):
+            raise InterpretError("map and filter are defined for sets only")
+        return items
+
+    def apply(self, function: Lambda, item, env: Dict[str, object] = None):
+        """
+        :param function: lambda plan
+        :param item: argument matched against the lambda pattern
+        :param env: values of variables of enclosing lambdas
+        :return: value of the lambda body
+        """
+        inner = dict(env or {})
+        _bind(function.pattern, item, inner)
+        return self.evaluate(function.body, inner)
+
+    def regex_of(self, plan, env) -> Optional[Regex]:
+        """
+        :return: regex of plan built from strings by union, concatenation and star,
+        None for other plans
+        """
+        text = self._regex_text(plan, env)
+        return None if text is None else Regex(text)
+
+    def _regex_text(self, plan, env) -> Optional[str]:
+        if isinstance(plan, (Const, Var)):
+            value = self.evaluate(plan, env)
+            return f"({value})" if isinstance(value, str) else None
+        if isinstance(plan, (Union, Concat)):
+            left = self._regex_text(plan.left, env)
+            right = self._regex_text(plan.right, env)
+            if left is None or right is None:
+                return None
+            operator = "|" if isinstance(plan, Union) else " "
+            return f"({left}{operator}{right})"
+        if isinstance(plan, Star):
+            inner = self._regex_text(plan.expr, env)
+            return None if inner is None else f"({inner})*"
+        return None
+
+    def rpq_of(self, plan, env) -> Optional[Tuple]:
+        """
+        Recognizes plans which are regular path queries: graph intersected with
+        a regex, start and final vertices set on the graph or on the intersection
+        :return: graph, regex, start and final vertices (None for every vertex),
+        None for other plans
+        """
+        if isinstance(plan, (SetStart, SetFinal, AddStart, AddFinal)):
+            query = self.rpq_of(plan.expr, env)
+            if query is None:
+                return None
+            graph, regex, starts, finals = query
+            vertices = _as_set(self.evaluate(plan.vertices, env))
+            if isinstance(plan, (AddStart, AddFinal)):
+                old = starts if isinstance(plan, AddStart) else finals
+                old = _graph_vertices(graph) if old is None else old
+                vertices = old | vertices
+            if isinstance(plan, (SetStart, AddStart)):
+                return graph, regex, vertices, finals
+            return graph, regex, starts, vertices
+
+        if not isinstance(plan, Intersect):
+            return None
+        for graph_plan, regex_plan in (
+            (plan.left, plan.right),
+            (plan.right, plan.left),
+        ):
+            regex = self.regex_of(regex_plan, env)
+            if regex is None:
+                continue
+            language = self.evaluate(graph_plan, env)
+            if isinstance(language, GraphLanguage):
+                return language.graph, regex, language.starts, language.finals
+        return None
+
+    def to_nfa(self, value) -> EpsilonNFA:
+        """
+        :param value: language value or string of regex
+        :return: automaton of the language without epsilon transitions, which
+        intersect would take for a label
+        """
+        if isinstance(value, GraphLanguage):
+            return graph_to_nfa(
+                value.graph,
+                None if value.starts is None else {State(v) for v in value.starts},
+                None if value.finals is None else {State(v) for v in value.finals},
+            )
+        if isinstance(value, str):
+            value = Regex(value)
+        if isinstance(value, Regex):
+            return cached_regex_to_dfa(value)
+        if isinstance(value, EpsilonNFA):
+            return value.remove_epsilon_transitions()
+        raise InterpretError(f"{format_value(value)} is not a language")
+
+
+def load_script_graph(path: str) -> nx.MultiDiGraph:
+    """
+    Graph of load expression: .dot or .csv file, otherwise graph of cfpq_data
+    dataset. Vertices written as integers become ints
+    :param path: path to file or name of dataset graph
+    :return: graph with "label" attribute of edges
+    """
+    suffix = pathlib.Path(path).suffix
+    if suffix == ".dot":
+        graph = nx.MultiDiGraph(nx.drawing.nx_pydot.read_dot(path))
+        for _, _, data in graph.edges(data=True):
+            if isinstance(data.get("label"), str):
+                data["label"] = data["label"].strip('"')
+        graph.remove_nodes_from(["\\n"])
+        return nx.relabel_nodes(
+            graph, {v: int(v) for v in graph.nodes if str(v).isdigit()}
+        )
+    if suffix == ".csv":
+        return LabeledGraph.from_csv(path).to_networkx()
+    return load_graph(path)
+
+
+def format_value(value) -> str:
+    """
+    :param value: value of expression
+    :return: text printed by print statement
+    """
+    if isinstance(value, frozenset):
+        return "{" + ", ".join(map(format_value, _sorted(value))) + "}"
+    if isinstance(value, tuple) and not isinstance(value, GraphLanguage):
+        return "(" + ", ".join(map(format_value, value)) + ")"
+    if isinstance(value, GraphLanguage):
+        return (
+            f"graph(vertices={value.graph.number_of_nodes()}, "
+            f"edges={value.graph.number_of_edges()})"
+        )
+    if isinstance(value, EpsilonNFA):
+        return f"automaton(states={len(value.states)})"
+    if isinstance(value, str):
+        return f'"{value}"'
+    return str(value)
+
+
+def _sorted(values: frozenset) -> list:
+    try:
+        return sorted(values)
+    except TypeError:
+        return sorted(values, key=format_value)
+
+
+def estimate_size(value) -> int:
+    """
+    :param value: value of expression
+    :return: approximate memory used by value in bytes
+    """
+    if isinstance(value, GraphLanguage):
+        graph = value.graph
+        size = GRAPH_ELEMENT_SIZE * (graph.number_of_nodes() + graph.number_of_edges())
+        for vertices in (value.starts, value.finals):
+            if vertices is not None:
+                size += estimate_size(vertices)
+        return size
+    if isinstance(value, EpsilonNFA):
+        return AUTOMATON_ELEMENT_SIZE * (
+            len(value.states) + value.get_number_transitions()
+        )
+    if isinstance(value, (frozenset, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def _is_plan(value) -> bool:
+    return isinstance(value, PLAN_TYPES)
+
+
+def _value_repr(value) -> str:
+    if isinstance(value, frozenset):
+        return "{" + ",".join(sorted(map(_value_repr, value))) + "}"
+    return repr(value)
+
+
+def _load_versions(paths: FrozenSet[str]) -> Tuple:
+    """
+    :return: size and modification time of loaded files, so that cached values
+    of changed files are not used
+    """
+    versions = []
+    for path in sorted(paths):
+        path = os.path.abspath(path)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            versions.append((path, stat.st_size, stat.st_mtime_ns))
+        else:
+            versions.append((path, None, None))
+    return tuple(versions)
+
+
+def pattern_names(pattern) -> list:
+    """
+    :param pattern: pattern of lambda, name or tuple of patterns
+    :return: names bound by pattern
+    """
+    if isinstance(pattern, str):
+        return [pattern]
+    return [name for sub in pattern for name in pattern_names(sub)]
+
+
+def _graph_vertices(graph: nx.MultiDiGraph) -> frozenset:
+    return frozenset(graph.nodes)
+
+
+def _is_set_like(value) -> bool:
+    return isinstance(value, (frozenset, int)) and not isinstance(value, bool)
+
+
+def _as_set(value) -> frozenset:
+    if isinstance(value, frozenset):
+        return value
+    if isinstance(value, int):
+        return frozenset([value])
+    raise InterpretError(f"{format_value(value)} is not a set")
+
+
+def _vertex_of(state: State):
+    value = state.value
+    # states of intersection are pairs of states of the operands
+    while isinstance(value, tuple) and value:
+        value = value[0].value if isinstance(value[0], State) else value[0]
+    return value
+
+
+def _bind(pattern, item, env: Dict[str, object]):
+    if isinstance(pattern, str):
+        env[pattern] = item
+        return
+    if not isinstance(item, tuple) or len(item) != len(pattern):
+        raise InterpretError(
+            f"{format_value(item)} does not match pattern of {len(pattern)} elements"
+        )
+    for sub_pattern, sub_item in zip(pattern, item):
+        _bind(sub_pattern, sub_item, env)
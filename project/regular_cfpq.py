@@ -0,0 +1,143 @@
+from typing import List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from project.cfpq_result import iter_matrix_chunks, iter_triples, vertex_array
+from project.graph_utils import edges_by_label, graph_vertices
+from project.labeled_graph import Graph
+from project.matrix_backend import BoolMatrixBackend, get_backend, transitive_closure
+from project.wcnf import CompiledGrammar
+
+#  Grammar in weak chomsky normal form whose binary productions all have a
+#  nonterminal deriving single terminals on the same side is right- or left-linear,
+#  so it generates a regular language. Queries with such grammars are answered by
+#  one transitive closure of the product of graph and grammar automaton instead of
+#  a matrix fixpoint.
+
+RIGHT_LINEAR = "right"
+LEFT_LINEAR = "left"
+
+
+def linear_direction(grammar: CompiledGrammar) -> Optional[str]:
+    """
+    :param grammar: compiled grammar in weak chomsky normal form
+    :return: RIGHT_LINEAR if in every production A -> B C nonterminal B only derives
+    single terminals, LEFT_LINEAR if C does, None if neither holds
+    """
+    terminal_only = [
+        bool(grammar.term_labels[nt])
+        and not grammar.by_head[nt]
+        and not grammar.is_eps[nt]
+        for nt in range(len(grammar.nonterminals))
+    ]
+    if all(terminal_only[b] for _, b, _ in grammar.var_productions):
+        return RIGHT_LINEAR
+    if all(terminal_only[c] for _, _, c in grammar.var_productions):
+        return LEFT_LINEAR
+    return None
+
+
+def regular_cfpq(
+    graph: Graph,
+    grammar: CompiledGrammar,
+    direction: str,
+    backend: Union[str, BoolMatrixBackend] = None,
+) -> Set[Tuple[int, str, int]]:
+    """
+    All pairs CFPQ for right- or left-linear grammar, see regular_matrices
+    :param graph: given graph
+    :param grammar: compiled grammar in weak chomsky normal form
+    :param direction: RIGHT_LINEAR or LEFT_LINEAR
+    :param backend: boolean matrix backend or its name, default backend if None
+    :return: set of tuples of vertex, nonterminal, vertex, the same as matrix_based
+    """
+    backend = get_backend(backend)
+    matrices = regular_matrices(graph, grammar, direction, backend)
+    chunks = iter_matrix_chunks(
+        grammar.nonterminals,
+        matrices,
+        backend,
+        vertices=vertex_array(graph_vertices(graph)),
+    )
+    return set(iter_triples(chunks))
+
+
+def regular_matrices(
+    graph: Graph,
+    grammar: CompiledGrammar,
+    direction: str,
+    backend: Union[str, BoolMatrixBackend] = None,
+) -> List:
+    """
+    Matrices of nonterminals of right- or left-linear grammar. Nonterminals and an
+    extra final state form an automaton: A -> a gives A -a-> final, A -> B C of
+    right-linear grammar gives A -b-> C for every terminal b of B, A -> epsilon
+    makes A final. Left-linear grammar is read backwards over the reversed graph.
+    Pairs come from transitive closure of the tensor product of the automaton and
+    the graph, as in intersect
+    :param graph: given graph, matrices are indexed by vertex indices of
+    edges_by_label
+    :param grammar: compiled grammar in weak chomsky normal form
+    :param direction: RIGHT_LINEAR or LEFT_LINEAR
+    :param backend: boolean matrix backend or its name, default backend if None
+    :return: matrices by nonterminal ids, the same as computed by matrix_based
+    """
+    backend = get_backend(backend)
+    n_nonterminals = len(grammar.nonterminals)
+    final = n_nonterminals
+    n_states = n_nonterminals + 1
+    nodes_num = graph.number_of_nodes()
+
+    transitions = {}  # terminal id -> (from states, to states)
+    for head, label in grammar.term_productions:
+        transitions.setdefault(label, ([], []))
+        transitions[label][0].append(head)
+        transitions[label][1].append(final)
+    for head, b, c in grammar.var_productions:
+        first, rest = (b, c) if direction == RIGHT_LINEAR else (c, b)
+        for label in grammar.term_labels[first]:
+            transitions.setdefault(label, ([], []))
+            transitions[label][0].append(head)
+            transitions[label][1].append(rest)
+
+    edges = grammar.intern_edges(edges_by_label(graph))
+    product = backend.zeros((n_states * nodes_num, n_states * nodes_num))
+    for label, (froms, tos) in transitions.items():
+        if label not in edges:
+            continue
+        sources, targets = edges[label]
+        if direction == LEFT_LINEAR:
+            sources, targets = targets, sources
+        product = backend.add(
+            product,
+            backend.kron(
+                backend.from_coo(froms, tos, (n_states, n_states)),
+                backend.from_coo(sources, targets, (nodes_num, nodes_num)),
+            ),
+        )
+    closure = transitive_closure(product, backend)
+
+    is_final = np.zeros(n_states, dtype=bool)
+    is_final[final] = True
+    is_final[list(grammar.eps_heads)] = True
+
+    rows, cols = backend.nonzero(closure)
+    state_from, vertex_from = np.divmod(rows, nodes_num)
+    state_to, vertex_to = np.divmod(cols, nodes_num)
+    found = is_final[state_to] & (state_from < n_nonterminals)
+    state_from, vertex_from, vertex_to = (
+        state_from[found],
+        vertex_from[found],
+        vertex_to[found],
+    )
+    if direction == LEFT_LINEAR:
+        vertex_from, vertex_to = vertex_to, vertex_from
+
+    matrices = []
+    for nt in range(n_nonterminals):
+        rows, cols = vertex_from[state_from == nt], vertex_to[state_from == nt]
+        if grammar.is_eps[nt]:
+            rows = np.concatenate((rows, np.arange(nodes_num)))
+            cols = np.concatenate((cols, np.arange(nodes_num)))
+        matrices.append(backend.from_coo(rows, cols, (nodes_num, nodes_num)))
+    return matrices
@@ -1,38 +1,117 @@
-from typing import Dict
+from collections import deque, namedtuple
+from typing import Dict, Iterable, List, Set, Tuple, Union
 
+import numpy as np
 from pyformlang.finite_automaton import (
     NondeterministicFiniteAutomaton,
     Symbol,
     State,
     EpsilonNFA,
 )
-from scipy import sparse
-from scipy.sparse import dok_matrix, kron, coo_matrix, csr_matrix
+from pyformlang.regular_expression import Regex
 
+from project.fsm import regex_to_dfa
+from project.labeled_graph import Graph, LabeledGraph
+from project.matrix_backend import BoolMatrixBackend, get_backend
 
-def decompose_fa(fa: EpsilonNFA) -> (Dict[str, dok_matrix], Dict[State, int]):
+
+def decompose_fa(
+    fa: EpsilonNFA, backend: Union[str, BoolMatrixBackend] = None
+) -> Tuple[Dict[Symbol, object], Dict[State, int], List[State]]:
     """
     Decomposition of FA as a dictionary: key is symbol, value is transition matrix for x
     :param fa: finite automaton
-    :return:
+    :param backend: boolean matrix backend or its name, default backend if None
+    :return: matrices by symbols, indices of states and states by indices
     """
-    states = {state: idx for idx, state in enumerate(fa.states)}
-    n_states = len(fa.states)
-
-    result = {}
+    inds = list(fa.states)
+    states = {state: idx for idx, state in enumerate(inds)}
 
+    labels = {}
+    rows, cols, label_ids = [], [], []
     for fr, label, to in fa:
-        matrix = result.setdefault(
-            label,
-            sparse.dok_matrix((n_states, n_states), dtype=bool),
-        )
-        matrix[states[fr], states[to]] = True
+        rows.append(states[fr])
+        cols.append(states[to])
+        label_ids.append(labels.setdefault(label, len(labels)))
 
-    inds = list(fa.states)
+    result = _decompose_edges(rows, cols, label_ids, list(labels), len(inds), backend)
     return result, states, inds
 
 
-def intersect(fa1: EpsilonNFA, fa2: EpsilonNFA) -> EpsilonNFA:
+def decompose_graph(
+    graph: Graph, backend: Union[str, BoolMatrixBackend] = None
+) -> Tuple[Dict[Symbol, object], Dict[object, int], List]:
+    """
+    Decomposition of graph edges by labels, the same as decompose_fa of
+    graph_to_nfa(graph), but without building pyformlang automaton
+    :param graph: networkx graph with "label" attribute of edges or LabeledGraph
+    :param backend: boolean matrix backend or its name, default backend if None
+    :return: matrices by symbols, indices of vertices and vertices by indices
+    """
+    if isinstance(graph, LabeledGraph):
+        return graph.decompose(backend)
+
+    inds = list(graph.nodes)
+    vertices = {vertex: idx for idx, vertex in enumerate(inds)}
+
+    labels = {}
+    rows, cols, label_ids = [], [], []
+    for u, v, label in graph.edges(data="label"):
+        rows.append(vertices[u])
+        cols.append(vertices[v])
+        label_ids.append(labels.setdefault(label, len(labels)))
+
+    symbols = [Symbol(label) for label in labels]
+    result = _decompose_edges(rows, cols, label_ids, symbols, len(inds), backend)
+    return result, vertices, inds
+
+
+def _decompose_edges(
+    rows, cols, label_ids, labels: List, n_states: int, backend
+) -> Dict[object, object]:
+    """
+    Builds matrix for every label at once from arrays of edges
+    :param rows: indices of edge sources
+    :param cols: indices of edge targets
+    :param label_ids: indices of edge labels in labels
+    :param labels: labels of edges
+    :param n_states: size of matrices
+    :param backend: boolean matrix backend or its name, default backend if None
+    :return: matrices by labels
+    """
+    backend = get_backend(backend)
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    label_ids = np.asarray(label_ids, dtype=np.int64)
+
+    order = np.argsort(label_ids, kind="stable")
+    bounds = np.searchsorted(label_ids[order], np.arange(len(labels) + 1))
+    return {
+        label: backend.from_coo(
+            rows[order[bounds[i] : bounds[i + 1]]],
+            cols[order[bounds[i] : bounds[i + 1]]],
+            (n_states, n_states),
+        )
+        for i, label in enumerate(labels)
+    }
+
+
+ProductMatrices = namedtuple(
+    "ProductMatrices", ["matrices", "states", "start_states", "final_states"]
+)
+ProductMatrices.__doc__ = """
+Intersection of automata in matrix form: transition matrices by labels,
+pairs of states of the automata by indices, indices of start and final states
+"""
+
+
+def intersect(
+    fa1: EpsilonNFA,
+    fa2: EpsilonNFA,
+    backend: Union[str, BoolMatrixBackend] = None,
+    reachable_only: bool = False,
+    as_matrices: bool = False,
+) -> Union[EpsilonNFA, ProductMatrices]:
     """
     Computes the intersection of two finite automata using tensor product
 
@@ -40,55 +119,276 @@ def intersect(fa1: EpsilonNFA, fa2: EpsilonNFA) -> EpsilonNFA:
     ----------
     `fa1`: First finite automaton
     `fa2`: Second finite automaton
+    `backend`: Boolean matrix backend or its name, default backend if None
+    `reachable_only`: Build only product states reachable from start states,
+    exploring them from adjacency indexes of the automata instead of computing
+    kronecker products of whole matrices
+    `as_matrices`: Return ProductMatrices instead of pyformlang automaton
 
     Returns
     -------
     The intersection of two finite automatas
     """
+    backend = get_backend(backend)
+
+    if reachable_only:
+        product = _intersect_reachable(fa1, fa2, backend)
+    else:
+        product = _intersect_full(fa1, fa2, backend)
+
+    if as_matrices:
+        return product
+
+    result = EpsilonNFA()
+
+    result_states = [State(pair) for pair in product.states]
+
+    for l, mat in product.matrices.items():
+        for fr, to in zip(*backend.nonzero(mat)):
+            result.add_transition(result_states[fr], l, result_states[to])
+
+    for idx in product.start_states:
+        result.add_start_state(result_states[idx])
+
+    for idx in product.final_states:
+        result.add_final_state(result_states[idx])
+
+    return result
 
-    fa1_bool, fa1_states, inds1 = decompose_fa(fa1)
-    fa2_bool, fa2_states, inds2 = decompose_fa(fa2)
 
-    n_states1 = len(fa1_states)
+def _intersect_full(
+    fa1: EpsilonNFA, fa2: EpsilonNFA, backend: BoolMatrixBackend
+) -> ProductMatrices:
+    fa1_bool, fa1_states, inds1 = decompose_fa(fa1, backend)
+    fa2_bool, fa2_states, inds2 = decompose_fa(fa2, backend)
+
     n_states2 = len(fa2_states)
 
     same_labels = set(fa1_bool.keys()).intersection(fa2_bool.keys())
     bool_decomposition = {
-        label: dok_matrix(kron(fa1_bool[label], fa2_bool[label]))
-        for label in same_labels
+        label: backend.kron(fa1_bool[label], fa2_bool[label]) for label in same_labels
     }
 
-    result = EpsilonNFA()
+    return ProductMatrices(
+        matrices=bool_decomposition,
+        states=[(s1, s2) for s1 in inds1 for s2 in inds2],
+        start_states={
+            fa1_states[s1] * n_states2 + fa2_states[s2]
+            for s1 in fa1.start_states
+            for s2 in fa2.start_states
+        },
+        final_states={
+            fa1_states[s1] * n_states2 + fa2_states[s2]
+            for s1 in fa1.final_states
+            for s2 in fa2.final_states
+        },
+    )
 
-    result_states = [None] * (n_states1 * n_states2)
 
-    for i in range(n_states1):
-        for j in range(n_states2):
-            result_states[i * n_states2 + j] = State((inds1[i], inds2[j]))
+def _intersect_reachable(
+    fa1: EpsilonNFA, fa2: EpsilonNFA, backend: BoolMatrixBackend
+) -> ProductMatrices:
+    """
+    Breadth-first search over pairs of states starting from pairs of start states.
+    Pairs are numbered in order of discovery, unreachable pairs are never created
+    """
+    index1 = _adjacency_index(fa1)
+    index2 = _adjacency_index(fa2)
 
-    for l, mat in bool_decomposition.items():
-        for (fr, to), value in mat.items():
-            if value:
-                result.add_transition(result_states[fr], l, result_states[to])
+    states = []
+    state_ids = {}
+
+    def state_id(pair):
+        if pair not in state_ids:
+            state_ids[pair] = len(states)
+            states.append(pair)
+            queue.append(pair)
+        return state_ids[pair]
+
+    queue = deque()
+    start_states = {
+        state_id((s1, s2)) for s1 in fa1.start_states for s2 in fa2.start_states
+    }
+
+    cells = {}
+    while queue:
+        s1, s2 = queue.popleft()
+        fr = state_ids[(s1, s2)]
+        out1 = index1.get(s1, {})
+        out2 = index2.get(s2, {})
+        for label in out1.keys() & out2.keys():
+            rows, cols = cells.setdefault(label, ([], []))
+            for t1 in out1[label]:
+                for t2 in out2[label]:
+                    rows.append(fr)
+                    cols.append(state_id((t1, t2)))
+
+    n_states = len(states)
+    return ProductMatrices(
+        matrices={
+            label: backend.from_coo(rows, cols, (n_states, n_states))
+            for label, (rows, cols) in cells.items()
+        },
+        states=states,
+        start_states=start_states,
+        final_states={
+            idx
+            for idx, (s1, s2) in enumerate(states)
+            if s1 in fa1.final_states and s2 in fa2.final_states
+        },
+    )
+
+
+def _adjacency_index(fa: EpsilonNFA) -> Dict[State, Dict[Symbol, Set[State]]]:
+    """Transitions of automaton as state -> label -> set of states"""
+    index = {}
+    for fr, label, to in fa:
+        index.setdefault(fr, {}).setdefault(label, set()).add(to)
+    return index
 
-    for s1 in fa1.start_states:
-        for s2 in fa2.start_states:
-            result.add_start_state(
-                result_states[fa1_states[s1] * n_states2 + fa2_states[s2]]
-            )
 
-    for s1 in fa1.final_states:
-        for s2 in fa2.final_states:
-            result.add_final_state(
-                result_states[fa1_states[s1] * n_states2 + fa2_states[s2]]
+def bfs_rpq(
+    graph: Graph,
+    regex: Union[str, Regex],
+    start_vertices: Iterable = None,
+    final_vertices: Iterable = None,
+    per_source: bool = False,
+    backend: Union[str, BoolMatrixBackend] = None,
+) -> Union[Set, Dict[object, Set]]:
+    """
+    Regular path query by synchronised breadth-first search over the boolean
+    decompositions of the graph and minimal DFA of the regex. The front is a
+    |DFA states| x |V| matrix (one such block per start vertex in per-source mode),
+    so only the part of the graph reachable from start vertices is visited
+    :param graph: graph to query
+    :param regex: regular expression of path labels
+    :param start_vertices: vertices paths start from, every vertex if None,
+    vertices out of the graph reach nothing
+    :param final_vertices: vertices paths end in, every vertex if None
+    :param per_source: compute reachable final vertices for every start vertex
+    separately instead of for all of them together
+    :param backend: boolean matrix backend or its name, default backend if None
+    :return: set of reachable final vertices or
+    dictionary of such sets by start vertices in per-source mode
+    """
+    backend = get_backend(backend)
+    return bfs_rpq_matrices(
+        decompose_graph(graph, backend),
+        regex,
+        start_vertices,
+        final_vertices,
+        per_source,
+        backend,
+    )
+
+
+def bfs_rpq_matrices(
+    decomposition: Tuple[Dict[Symbol, object], Dict, List],
+    regex: Union[str, Regex],
+    start_vertices: Iterable = None,
+    final_vertices: Iterable = None,
+    per_source: bool = False,
+    backend: Union[str, BoolMatrixBackend] = None,
+) -> Union[Set, Dict[object, Set]]:
+    """
+    bfs_rpq over the graph given by its decomposition, so that one decomposition
+    serves many queries
+    :param decomposition: matrices by symbols, indices of vertices and vertices
+    by indices as returned by decompose_graph
+    :param regex: regular expression of path labels
+    :param start_vertices: vertices paths start from, every vertex if None
+    :param final_vertices: vertices paths end in, every vertex if None
+    :param per_source: compute reachable final vertices for every start vertex
+    separately instead of for all of them together
+    :param backend: backend of the matrices, default backend if None
+    :return: set of reachable final vertices or
+    dictionary of such sets by start vertices in per-source mode
+    """
+    backend = get_backend(backend)
+    if not isinstance(regex, Regex):
+        regex = Regex(regex)
+    dfa = regex_to_dfa(regex)
+
+    graph_bool, graph_states, graph_inds = decomposition
+    if start_vertices is None:
+        start_vertices = graph_inds
+    start_vertices = list(start_vertices)
+    final_vertices = None if final_vertices is None else set(final_vertices)
+
+    empty = {v: set() for v in start_vertices} if per_source else set()
+    # vertices out of the graph start no paths
+    start_vertices = [v for v in start_vertices if v in graph_states]
+    if dfa.start_state is None or not start_vertices:
+        return empty
+
+    dfa_bool, dfa_states, _ = decompose_fa(dfa, backend)
+    n_dfa = len(dfa_states)
+    n_graph = len(graph_states)
+    blocks = len(start_vertices) if per_source else 1
+    dfa_start = dfa_states[dfa.start_state]
+
+    front = backend.from_coo(
+        [
+            block * n_dfa + dfa_start if per_source else dfa_start
+            for block in range(len(start_vertices))
+        ],
+        [graph_states[v] for v in start_vertices],
+        (blocks * n_dfa, n_graph),
+    )
+    steps = {
+        label: (
+            backend.kron(backend.identity(blocks), backend.transpose(dfa_matrix)),
+            graph_bool[label],
+        )
+        for label, dfa_matrix in dfa_bool.items()
+        if label in graph_bool
+    }
+
+    visited = front
+    while backend.nnz(front):
+        reached = backend.zeros(front.shape)
+        for dfa_step, graph_step in steps.values():
+            reached = backend.add(
+                reached, backend.matmul(backend.matmul(dfa_step, front), graph_step)
             )
+        front = backend.difference(reached, visited)
+        visited = backend.add(visited, front)
 
+    dfa_finals = {dfa_states[state] for state in dfa.final_states}
+    result = empty
+    rows, cols = backend.nonzero(visited)
+    for row, col in zip(rows, cols):
+        block, dfa_state = divmod(row, n_dfa)
+        vertex = graph_inds[col]
+        if dfa_state not in dfa_finals or (
+            final_vertices is not None and vertex not in final_vertices
+        ):
+            continue
+        if per_source:
+            result[start_vertices[block]].add(vertex)
+        else:
+            result.add(vertex)
     return result
 
 
-#  На основе предыдущей функции реализовать функцию выполнения регулярных запросов к графам:
-#  по графу с заданными стартовыми и финальными вершинами и регулярному выражению вернуть те пары
-#  вершин из заданных стартовых и финальных, которые связанны путём, формирующем слово из языка,
-#  задаваемого регулярным выражением.
-#
-#     Для конструирования регулярного запроса и преобразований графа использовать результаты Задачи 2.
+def regular_path_query(
+    graph: Graph,
+    regex: Union[str, Regex],
+    start_vertices: Iterable = None,
+    final_vertices: Iterable = None,
+    backend: Union[str, BoolMatrixBackend] = None,
+) -> Set[Tuple]:
+    """
+    Pairs of start and final vertices connected by a path which forms a word
+    of the regex language
+    :param graph: graph to query
+    :param regex: regular expression of path labels
+    :param start_vertices: vertices paths start from, every vertex if None
+    :param final_vertices: vertices paths end in, every vertex if None
+    :param backend: boolean matrix backend or its name, default backend if None
+    :return: set of pairs of vertices
+    """
+    reachable = bfs_rpq(
+        graph, regex, start_vertices, final_vertices, per_source=True, backend=backend
+    )
+    return {(u, v) for u, vertices in reachable.items() for v in vertices}
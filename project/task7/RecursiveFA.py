@@ -1,9 +1,11 @@
-from typing import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List
 
 from pyformlang.cfg import Variable
 from pyformlang.finite_automaton import DeterministicFiniteAutomaton as DFA
+from pyformlang.regular_expression import Regex
 
-from project.fsm import regex_to_dfa
+from project.fsm import cached_dfa, regex_key, regex_to_dfa, store_dfa
 from project.task7.ecfg import ExtendedContextFreeGrammatic as ECFG
 
 #     Реализовать тип для представления рекурсивных конечных автоматов. В качестве составных частей можно использовать
@@ -41,13 +43,22 @@ class RecursiveFA:
     def set_start_symbol(self, start_symbol: Variable):
         self.start_symbol = start_symbol
 
-    def minimize(self):
+    def minimize(self, workers: int = None):
         """
         Minimize all the bozes in recursive fa
+        :param workers: if given, boxes are minimized by a pool of this number
+        of processes
         :return: minimized recursive fa
         """
-        for box in self.boxes:
-            box.minimize()
+        if not workers:
+            for box in self.boxes:
+                box.minimize()
+            return self
+        boxes = list(self.boxes)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            dfas = list(executor.map(_minimize_dfa, [box.dfa for box in boxes]))
+        for box, dfa in zip(boxes, dfas):
+            box.dfa = dfa
         return self
 
     # def get_adj_matrix(self):
@@ -55,14 +66,30 @@ class RecursiveFA:
     #     return self.adj_matrix
 
     @staticmethod
-    def from_ecfg(ecfg: ECFG) -> "RecursiveFA":
+    def from_ecfg(ecfg: ECFG, workers: int = None) -> "RecursiveFA":
         """
-        Build recursive fa from given ecfg
+        Build recursive fa from given ecfg. Minimal dfas of production bodies are
+        taken from the cache of fsm.cached_regex_to_dfa, only missing ones are built
         :param ecfg:
+        :param workers: if given, missing dfas are built by a pool of this number
+        of processes
         :return: recursive fa
         """
+        productions = list(ecfg.productions)
+        keys = [regex_key(p.body) for p in productions]
+        dfas = [cached_dfa(key) for key in keys]
+
+        missing = {}  # key -> body, equal bodies are built once
+        for p, key, dfa in zip(productions, keys, dfas):
+            if dfa is None:
+                missing.setdefault(key, p.body)
+        built = dict(zip(missing, _build_dfas(list(missing.values()), workers)))
+        for key, dfa in built.items():
+            store_dfa(key, dfa)
+
         boxes = [
-            RecursiveFA.Box(p.head, regex_to_dfa(p.body)) for p in ecfg.productions
+            RecursiveFA.Box(p.head, dfa if dfa is not None else built[key].copy())
+            for p, key, dfa in zip(productions, keys, dfas)
         ]
         return RecursiveFA(start_symbol=ecfg.start_symbol, boxes=boxes)
 
@@ -87,3 +114,14 @@ class RecursiveFA:
         """
         with open(path) as f:
             return RecursiveFA.from_text(f.read(), start_symbol=start_symbol)
+
+
+def _build_dfas(bodies: List[Regex], workers: int = None) -> List[DFA]:
+    if not workers or len(bodies) < 2:
+        return [regex_to_dfa(body) for body in bodies]
+    with ProcessPoolExecutor(max_workers=min(workers, len(bodies))) as executor:
+        return list(executor.map(regex_to_dfa, bodies))
+
+
+def _minimize_dfa(dfa: DFA) -> DFA:
+    return dfa.minimize()
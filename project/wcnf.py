@@ -2,7 +2,243 @@
 #  контекстно-свободной грамматики в ослабленную нормальную форму Хомского (ОНФХ), но не классическую нормальную форму
 #  Хомского (НФХ). НФХ является частным случаем ОНФХ, а значит можно утверждать, что грамматика, находящаяся в НФХ
 #  находится и в ОНФХ. Но в данной задаче нас интересует максимально слабая форма, то есть ОНФХ, но не НФХ.
-from pyformlang.cfg import CFG
+import hashlib
+import pathlib
+import pickle
+from collections import OrderedDict, namedtuple
+from typing import Dict, Iterable, Set, Tuple, Union
+
+from pyformlang.cfg import CFG, Variable
+
+
+#  Normalization is expensive and queries usually go to a few grammars, so its result
+#  is cached by hash of productions and start symbol: in memory (LRU) and on disk
+#  if a cache directory is set.
+
+ProductionTables = namedtuple(
+    "ProductionTables",
+    [
+        "variables",  # names of nonterminals
+        "eps_heads",  # heads of productions A -> epsilon
+        "term_productions",  # (A, a) of productions A -> a
+        "var_productions",  # (A, B, C) of productions A -> B C
+        "term_heads",  # a -> heads of productions A -> a
+        "term_labels",  # A -> terminals of productions A -> a
+        "by_head",  # A -> (B, C) of productions A -> B C
+        "by_left",  # B -> (A, C) of productions A -> B C
+        "by_right",  # C -> (A, B) of productions A -> B C
+    ],
+)
+
+NormalizedGrammar = namedtuple("NormalizedGrammar", ["wcnf", "tables", "compiled"])
+
+
+class CompiledGrammar:
+    """
+    Production tables over dense integer ids: nonterminals are numbered by their
+    position in `nonterminals`, terminals by position in `terminals`. Tables indexed
+    by nonterminal or terminal id are lists, so engines look productions up without
+    hashing names. Graph edge labels are interned into terminal ids by intern_edges
+    """
+
+    def __init__(self, tables: ProductionTables):
+        self.nonterminals = tables.variables
+        self.nonterminal_ids = {nt: idx for idx, nt in enumerate(self.nonterminals)}
+        self.terminals = tuple(sorted(tables.term_heads, key=repr))
+        self.terminal_ids = {t: idx for idx, t in enumerate(self.terminals)}
+        nt_id, t_id = self.nonterminal_ids, self.terminal_ids
+        n_nt = len(self.nonterminals)
+
+        self.eps_heads = tuple(sorted(nt_id[head] for head in tables.eps_heads))
+        self.is_eps = [False] * n_nt
+        for head in self.eps_heads:
+            self.is_eps[head] = True
+        self.term_productions = tuple(
+            (nt_id[head], t_id[label]) for head, label in tables.term_productions
+        )
+        self.var_productions = tuple(
+            (nt_id[head], nt_id[b], nt_id[c]) for head, b, c in tables.var_productions
+        )
+
+        self.term_heads = [[] for _ in self.terminals]
+        self.term_labels = [[] for _ in range(n_nt)]
+        for head, label in self.term_productions:
+            self.term_heads[label].append(head)
+            self.term_labels[head].append(label)
+        self.by_head = [[] for _ in range(n_nt)]
+        self.by_left = [[] for _ in range(n_nt)]
+        self.by_right = [[] for _ in range(n_nt)]
+        for head, b, c in self.var_productions:
+            self.by_head[head].append((b, c))
+            self.by_left[b].append((head, c))
+            self.by_right[c].append((head, b))
+
+    def intern_edges(self, edges: Dict) -> Dict[int, Tuple]:
+        """
+        :param edges: sources and targets of edges by labels
+        :return: sources and targets of edges by terminal ids, labels which are not
+        terminals of grammar are dropped
+        """
+        return {
+            self.terminal_ids[label]: arrays
+            for label, arrays in edges.items()
+            if label in self.terminal_ids
+        }
+
+    def named_triples(self, triples: Iterable[Tuple]) -> Set[Tuple]:
+        """
+        :param triples: tuples of vertex, nonterminal id, vertex
+        :return: tuples of vertex, nonterminal name, vertex
+        """
+        names = self.nonterminals
+        return {(u, names[nt], v) for u, nt, v in triples}
+
+
+WCNF_CACHE_SIZE = 64
+
+_wcnf_cache = OrderedDict()
+_wcnf_cache_dir = None
+
+
+def set_wcnf_cache_dir(cache_dir: Union[str, pathlib.Path, None]):
+    """
+    Set directory where normalized grammars are stored between runs
+    :param cache_dir: directory of the cache, None disables the disk cache
+    """
+    global _wcnf_cache_dir
+    _wcnf_cache_dir = pathlib.Path(cache_dir) if cache_dir else None
+
+
+def clear_wcnf_cache():
+    """Drop normalized grammars cached in memory"""
+    _wcnf_cache.clear()
+
+
+def grammar_key(cfg: CFG) -> str:
+    """
+    Canonical hash of grammar which does not depend on order of productions
+    :param cfg: context free grammar
+    :return: hex digest
+    """
+    productions = sorted(
+        " ".join(
+            [f"V:{p.head.value}", "->"]
+            + [
+                f"{'V' if isinstance(symbol, Variable) else 'T'}:{symbol.value}"
+                for symbol in p.body
+            ]
+        )
+        for p in cfg.productions
+    )
+    start = cfg.start_symbol.value if cfg.start_symbol is not None else ""
+    digest = hashlib.sha256(f"S:{start}\n".encode())
+    for production in productions:
+        digest.update(production.encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def normalize(cfg: CFG) -> NormalizedGrammar:
+    """
+    Weak chomsky normal form of grammar with index tables of its productions,
+    cached by grammar_key
+    :param cfg: context free grammar
+    :return: grammar in weak chomsky normal form, its production tables by names
+    and compiled to integer ids, shared by every call with the same grammar,
+    so they must not be modified
+    """
+    key = grammar_key(cfg)
+    if key in _wcnf_cache:
+        _wcnf_cache.move_to_end(key)
+        return _wcnf_cache[key]
+
+    normalized = _load_normalized(key)
+    if normalized is None:
+        wcnf = _cfg_to_wcnf(cfg)
+        tables = production_tables(wcnf)
+        normalized = NormalizedGrammar(wcnf, tables, CompiledGrammar(tables))
+        _store_normalized(key, normalized)
+
+    _wcnf_cache[key] = normalized
+    if len(_wcnf_cache) > WCNF_CACHE_SIZE:
+        _wcnf_cache.popitem(last=False)
+    return normalized
+
+
+def cfg_to_wcnf(cfg: CFG) -> CFG:
+    """
+    :param cfg: context free grammar
+    :return: grammar in weak chomsky normal form, a copy of the cached one which
+    the caller may modify
+    """
+    wcnf = normalize(cfg).wcnf
+    return CFG(start_symbol=wcnf.start_symbol, productions=set(wcnf.productions))
+
+
+def production_tables(wcnf: CFG) -> ProductionTables:
+    """
+    :param wcnf: grammar in weak chomsky normal form
+    :return: productions grouped for lookups of CFPQ algorithms
+    """
+    eps_heads = set()
+    term_productions = set()
+    var_productions = set()
+    for p in wcnf.productions:
+        if not p.body:
+            eps_heads.add(p.head.value)
+        elif len(p.body) == 1:
+            term_productions.add((p.head.value, p.body[0].value))
+        else:
+            var_productions.add((p.head.value, p.body[0].value, p.body[1].value))
+    term_productions = sorted(term_productions, key=repr)
+    var_productions = sorted(var_productions, key=repr)
+
+    term_heads, term_labels = {}, {}
+    for head, label in term_productions:
+        term_heads.setdefault(label, []).append(head)
+        term_labels.setdefault(head, []).append(label)
+    by_head, by_left, by_right = {}, {}, {}
+    for head, b, c in var_productions:
+        by_head.setdefault(head, []).append((b, c))
+        by_left.setdefault(b, []).append((head, c))
+        by_right.setdefault(c, []).append((head, b))
+
+    return ProductionTables(
+        variables=tuple(sorted(v.value for v in wcnf.variables)),
+        eps_heads=frozenset(eps_heads),
+        term_productions=tuple(term_productions),
+        var_productions=tuple(var_productions),
+        term_heads=_freeze(term_heads),
+        term_labels=_freeze(term_labels),
+        by_head=_freeze(by_head),
+        by_left=_freeze(by_left),
+        by_right=_freeze(by_right),
+    )
+
+
+def _freeze(table):
+    return {key: tuple(values) for key, values in table.items()}
+
+
+def _load_normalized(key: str):
+    if _wcnf_cache_dir is None:
+        return None
+    path = _wcnf_cache_dir / f"{key}.pickle"
+    if not path.exists():
+        return None
+    with open(path, "rb") as file:
+        return pickle.load(file)
+
+
+def _store_normalized(key: str, normalized: NormalizedGrammar):
+    if _wcnf_cache_dir is None:
+        return
+    _wcnf_cache_dir.mkdir(parents=True, exist_ok=True)
+    path = _wcnf_cache_dir / f"{key}.pickle"
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as file:
+        pickle.dump(normalized, file)
+    tmp_path.replace(path)
 
 
 # Алгоритм:
@@ -13,7 +249,7 @@ from pyformlang.cfg import CFG
 #     \item Удаление бесполезных нетерминалов
 
 
-def cfg_to_wcnf(cfg: CFG) -> CFG:
+def _cfg_to_wcnf(cfg: CFG) -> CFG:
     cleaned_cfg = cfg.eliminate_unit_productions().remove_useless_symbols()
     nonsolitary_cfg = cleaned_cfg._get_productions_with_only_single_terminals()
     new_rules = cleaned_cfg._decompose_productions(nonsolitary_cfg)
@@ -0,0 +1,34 @@
+import pytest
+from pyformlang.cfg import CFG
+
+from project.boolMatrix import BoolMatrix
+from project.task7.RecursiveFA import RecursiveFA
+from project.task7.ecfg import ExtendedContextFreeGrammatic as ECFG
+
+
+@pytest.mark.parametrize("backend", ["csr", "bitpacked"])
+def test_from_rfa(backend):
+    rfa = RecursiveFA.from_ecfg(
+        ECFG.from_cfg(CFG.from_text("S -> a S b | A\nA -> c A | epsilon"))
+    )
+    bm = BoolMatrix.from_rfa(rfa, backend)
+    assert bm.num_states == sum(len(box.dfa.states) for box in rfa.boxes)
+
+    cells = {
+        (label, bm.get_box_state(u), bm.get_box_state(v))
+        for label, matrix in bm.bool_matrices.items()
+        for u, v in zip(*bm.backend.nonzero(matrix))
+    }
+    assert cells == {
+        (str(label), (box.variable, s_from), (box.variable, s_to))
+        for box in rfa.boxes
+        for s_from, label, s_to in box.dfa
+    }
+
+    for box in rfa.boxes:
+        start = bm.state_indices[(box.variable, box.dfa.start_state)]
+        assert start in bm.start_states
+        for state in box.dfa.final_states:
+            final = bm.state_indices[(box.variable, state)]
+            assert final in bm.final_states
+            assert bm.get_nonterminals(start, final) == box.variable.value
@@ -1,8 +1,10 @@
+import networkx as nx
 import pytest
 from pyformlang.cfg import CFG
 
 from project.cfpq import *
 from project.graph_utils import build_two_cycle_graph
+from project.task7.RecursiveFA import RecursiveFA
 from cfpq_data import labeled_cycle_graph
 
 
@@ -61,9 +63,79 @@ class TestReachability:
     def test_hellings(self, cfg, graph, expected):
         assert hellings(graph, CFG.from_text(cfg)) == expected
 
+    def test_hellings_scan(self, cfg, graph, expected):
+        assert hellings(graph, CFG.from_text(cfg), indexed=False) == expected
+
     def test_matrix_based(self, cfg, graph, expected):
         assert matrix_based(graph, CFG.from_text(cfg)) == expected
 
+    def test_matrix_based_semi_naive(self, cfg, graph, expected):
+        assert matrix_based(graph, CFG.from_text(cfg), semi_naive=True) == expected
+
+    @pytest.mark.parametrize("backend", ["csr", "bitpacked"])
+    def test_tensor_based(self, cfg, graph, expected, backend):
+        assert tensor_based(graph, CFG.from_text(cfg), backend=backend) == expected
+
+    @pytest.mark.parametrize("semi_naive", [False, True])
+    def test_matrix_based_bitpacked(self, cfg, graph, expected, semi_naive):
+        assert (
+            matrix_based(
+                graph, CFG.from_text(cfg), semi_naive=semi_naive, backend="bitpacked"
+            )
+            == expected
+        )
+
+
+def test_hellings_indexed_matches_scan():
+    cfg = CFG.from_text(
+        """
+        S -> A S B | A B
+        A -> a
+        B -> b
+        """
+    )
+    graph = build_two_cycle_graph(5, 4, ("a", "b"))
+    assert hellings(graph, cfg) == hellings(graph, cfg, indexed=False)
+
+
+def test_semi_naive_matches_naive():
+    cfg = CFG.from_text(
+        """
+        S -> A S B | A B | S S
+        A -> a
+        B -> b
+        """
+    )
+    graph = build_two_cycle_graph(5, 4, ("a", "b"))
+    naive_stats, semi_naive_stats = {}, {}
+    assert matrix_based(graph, cfg, stats=naive_stats) == matrix_based(
+        graph, cfg, semi_naive=True, stats=semi_naive_stats
+    )
+    assert naive_stats["iterations"] > 0 and semi_naive_stats["iterations"] > 0
+
+
+def test_tensor_based_matches_matrix_based():
+    cfg = CFG.from_text(
+        """
+        S -> A S B | A B | S S
+        A -> a
+        B -> b
+        """
+    )
+    graph = build_two_cycle_graph(5, 4, ("a", "b"))
+    assert tensor_based(graph, cfg) == {
+        triple for triple in matrix_based(graph, cfg) if triple[1] in {"S", "A", "B"}
+    }
+
+
+def test_tensor_based_from_rfa():
+    rfa = RecursiveFA.from_text("S -> a S b | a b", "S")
+    graph = build_two_cycle_graph(3, 2, ("a", "b"))
+    cfg = CFG.from_text("S -> a S b | a b")
+    assert tensor_based(graph, rfa) == {
+        triple for triple in matrix_based(graph, cfg) if triple[1] == "S"
+    }
+
 
 @pytest.mark.parametrize(
     "cfg, graph, start_vertices, end_vertices, nonterminal, expected",
@@ -105,3 +177,139 @@ class TestQueries:
             )
             == expected
         )
+
+    def test_tensor_query_to_cfg(
+        self, cfg, graph, start_vertices, end_vertices, nonterminal, expected
+    ):
+        assert (
+            query_tensor(
+                graph, CFG.from_text(cfg), start_vertices, end_vertices, nonterminal
+            )
+            == expected
+        )
+
+    def test_semi_naive_matrix_query_to_cfg(
+        self, cfg, graph, start_vertices, end_vertices, nonterminal, expected
+    ):
+        assert (
+            query_matrix(
+                graph,
+                CFG.from_text(cfg),
+                start_vertices,
+                end_vertices,
+                nonterminal,
+                semi_naive=True,
+            )
+            == expected
+        )
+
+
+@pytest.mark.parametrize("start_vertices", [[0], [1, 3], list(range(6))])
+@pytest.mark.parametrize(
+    "cfg",
+    [
+        "S -> a S b S | epsilon",
+        "S -> a S b | a b",
+        "S -> A B\nS -> epsilon\nS1 -> S B\nA -> a\nS -> S1\nB -> b",
+    ],
+)
+def test_multi_source_matches_all_pairs(cfg, start_vertices):
+    cfg = CFG.from_text(cfg)
+    graph = build_two_cycle_graph(3, 2, ("a", "b"))
+    vertices = list(graph.nodes)
+    expected = query_matrix(
+        graph, cfg, start_vertices, vertices, "S", multi_source=False
+    )
+    assert query_matrix(graph, cfg, start_vertices, vertices, "S") == expected
+    assert (
+        query_matrix(graph, cfg, start_vertices, vertices, "S", backend="bitpacked")
+        == expected
+    )
+    assert query_hellings(graph, cfg, start_vertices, vertices, "S") == expected
+    assert (
+        query_hellings(
+            graph, cfg, start_vertices, vertices, Variable("S"), multi_source=False
+        )
+        == expected
+    )
+
+
+def test_multi_source_matrix_nonterminal():
+    cfg = CFG.from_text("S -> A B\nA -> a\nB -> b")
+    graph = build_two_cycle_graph(3, 2, ("a", "b"))
+    assert multi_source_matrix(graph, cfg, [3, 4], nonterminal="A") == {
+        3: {0},
+        4: set(),
+    }
+
+
+@pytest.mark.parametrize("semi_naive", [False, True])
+@pytest.mark.parametrize("backend", ["csr", "bitpacked"])
+def test_matrix_based_threads(semi_naive, backend):
+    cfg = CFG.from_text("S -> a S b S | epsilon")
+    graph = build_two_cycle_graph(4, 3, ("a", "b"))
+    stats, threads_stats = {}, {}
+    expected = matrix_based(graph, cfg, semi_naive=semi_naive, stats=stats)
+    assert (
+        matrix_based(
+            graph,
+            cfg,
+            semi_naive=semi_naive,
+            backend=backend,
+            workers=3,
+            stats=threads_stats,
+        )
+        == expected
+    )
+    assert threads_stats["iterations"] == stats["iterations"]
+
+
+@pytest.mark.parametrize(
+    "cfg, path",
+    [
+        (CFG.from_text("S -> a S | epsilon"), "regular"),
+        (CFG.from_text("S -> S a | b"), "regular"),
+        (CFG.from_text("S -> a A\nA -> b A | b S | a"), "regular"),
+        (CFG.from_text("S -> A b\nA -> A a | a | epsilon"), "regular"),
+        (CFG.from_text("S -> a S b | epsilon"), "matrix"),
+    ],
+)
+@pytest.mark.parametrize("backend", ["csr", "bitpacked"])
+def test_matrix_based_regular_grammar(cfg, path, backend):
+    graph = build_two_cycle_graph(4, 3, ("a", "b"))
+    stats = {}
+    assert matrix_based(graph, cfg, backend=backend, stats=stats) == matrix_based(
+        graph, cfg, detect_regular=False
+    )
+    assert stats["path"] == path
+
+
+def test_hellings_regular_grammar():
+    cfg = CFG.from_text("S -> a S | b")
+    graph = build_two_cycle_graph(4, 3, ("a", "b"))
+    stats = {}
+    assert hellings(graph, cfg, stats=stats) == hellings(
+        graph, cfg, detect_regular=False
+    )
+    assert stats["path"] == "regular"
+
+
+@pytest.mark.parametrize(
+    "edges, expected",
+    [
+        ([(0, 5, "a"), (5, 7, "b")], {(0, "S", 7)}),
+        ([("x", "y", "a"), ("y", "z", "b")], {("x", "S", "z")}),
+    ],
+)
+@pytest.mark.parametrize("backend", ["csr", "bitpacked"])
+def test_regular_path_sparse_vertices(edges, expected, backend):
+    graph = nx.MultiDiGraph()
+    graph.add_edges_from((u, v, {"label": label}) for u, v, label in edges)
+    cfg = CFG.from_text("S -> a b")
+    stats = {}
+    triples = hellings(graph, cfg, stats=stats)
+    assert stats["path"] == "regular"
+    assert {triple for triple in triples if triple[1] == "S"} == expected
+    assert triples == hellings(graph, cfg, detect_regular=False)
+    assert matrix_based(graph, cfg, backend=backend) == triples
+    assert hellings_result(graph, cfg) == triples
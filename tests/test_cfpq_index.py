@@ -0,0 +1,95 @@
+import random
+
+import networkx as nx
+import pytest
+from pyformlang.cfg import CFG
+
+from project.cfpq import matrix_based, query_matrix
+from project.cfpq_index import CFPQIndex
+from project.graph_utils import build_two_cycle_graph
+
+GRAMMAR = """
+    S -> a S b S
+    S -> epsilon
+    """
+
+
+def test_add_edges():
+    cfg = CFG.from_text(GRAMMAR)
+    graph = build_two_cycle_graph(3, 2, ("a", "b"))
+    index = CFPQIndex(graph, cfg)
+    new_edges = [(5, 1, "a"), (2, 6, "b"), (6, 6, "a")]
+    index.add_edges(new_edges)
+    graph.add_edges_from((u, v, {"label": label}) for u, v, label in new_edges)
+    assert index.triples() == matrix_based(graph, cfg)
+
+
+def test_remove_parallel_edge():
+    cfg = CFG.from_text(GRAMMAR)
+    graph = build_two_cycle_graph(3, 2, ("a", "b"))
+    graph.add_edge(0, 4, label="b")
+    index = CFPQIndex(graph, cfg)
+    before = index.triples()
+    index.remove_edges([(0, 4, "b")])
+    assert index.triples() == before
+    index.remove_edges([(0, 4, "b")])
+    graph.remove_edges_from([(0, 4), (0, 4)])
+    assert index.triples() == matrix_based(graph, cfg)
+
+
+@pytest.mark.parametrize("relabel", [lambda v: 10 * v + 3, lambda v: f"v{v}"])
+def test_sparse_vertices(relabel):
+    cfg = CFG.from_text(GRAMMAR)
+    graph = nx.relabel_nodes(build_two_cycle_graph(3, 2, ("a", "b")), relabel)
+    index = CFPQIndex(graph, cfg)
+    assert index.triples() == matrix_based(graph, cfg)
+
+    new_edges = [(relabel(5), relabel(7), "a"), (relabel(7), relabel(0), "b")]
+    index.add_edges(new_edges)
+    graph.add_edges_from((u, v, {"label": label}) for u, v, label in new_edges)
+    assert index.triples() == matrix_based(graph, cfg)
+
+    index.remove_edges([(relabel(0), relabel(1), "a"), (relabel(9), relabel(0), "a")])
+    graph.remove_edge(relabel(0), relabel(1))
+    assert index.triples() == matrix_based(graph, cfg)
+    vertices = list(graph.nodes)
+    starts = [relabel(0), relabel(7), relabel(8)]
+    assert index.query(starts, vertices, "S") == query_matrix(
+        graph, cfg, starts, vertices, "S"
+    )
+
+
+def test_query():
+    cfg = CFG.from_text(GRAMMAR)
+    graph = build_two_cycle_graph(3, 2, ("a", "b"))
+    index = CFPQIndex(graph, cfg)
+    index.remove_edges([(2, 3, "a")])
+    graph.remove_edge(2, 3)
+    vertices = list(graph.nodes)
+    assert index.query([0, 1, 2], vertices, "S") == query_matrix(
+        graph, cfg, [0, 1, 2], vertices, "S"
+    )
+
+
+@pytest.mark.parametrize("backend", ["csr", "bitpacked"])
+def test_random_updates_match_matrix_based(backend):
+    rnd = random.Random(42)
+    cfg = CFG.from_text("S -> a S b | a b | S S")
+    graph = build_two_cycle_graph(4, 3, ("a", "b"))
+    index = CFPQIndex(graph, cfg, backend=backend)
+    for _ in range(20):
+        if rnd.random() < 0.5:
+            edges = [
+                (rnd.randrange(10), rnd.randrange(10), rnd.choice("ab"))
+                for _ in range(3)
+            ]
+            index.add_edges(edges)
+            graph.add_edges_from((u, v, {"label": label}) for u, v, label in edges)
+        else:
+            edges = rnd.sample(list(graph.edges(keys=True, data="label")), 2)
+            index.remove_edges((u, v, label) for u, v, _, label in edges)
+            graph.remove_edges_from((u, v, key) for u, v, key, _ in edges)
+        expected_graph = nx.MultiDiGraph()
+        expected_graph.add_nodes_from(index.vertices)
+        expected_graph.add_edges_from(graph.edges(data=True))
+        assert index.triples() == matrix_based(expected_graph, cfg)
@@ -0,0 +1,83 @@
+import networkx as nx
+import pytest
+from pyformlang.cfg import CFG
+
+from project.cfpq import hellings, hellings_result, iter_matrix_based
+from project.cfpq import matrix_based, matrix_based_result
+from project.cfpq_result import CFPQResult
+from project.graph_utils import build_two_cycle_graph
+
+GRAMMARS = [
+    CFG.from_text("S -> a S b S | epsilon"),
+    CFG.from_text("S -> A B | A S1\nS1 -> S B\nA -> a\nB -> b"),
+    CFG.from_text("S -> a S | b"),
+]
+
+
+@pytest.mark.parametrize("cfg", GRAMMARS)
+@pytest.mark.parametrize("backend", ["csr", "bitpacked"])
+def test_matrix_based_result(cfg, backend):
+    graph = build_two_cycle_graph(4, 3, ("a", "b"))
+    expected = matrix_based(graph, cfg)
+    result = matrix_based_result(graph, cfg, backend=backend)
+    assert result == expected
+    assert len(result) == len(expected)
+    assert result.to_set() == expected
+    assert all(triple in result for triple in expected)
+    assert (0, "S", 100) not in result and (0, "X", 0) not in result
+    assert set(iter_matrix_based(graph, cfg, chunk_size=3, backend=backend)) == expected
+
+
+@pytest.mark.parametrize("cfg", GRAMMARS)
+def test_hellings_result(cfg):
+    graph = build_two_cycle_graph(4, 3, ("a", "b"))
+    assert hellings_result(graph, cfg).to_set() == hellings(graph, cfg)
+    assert hellings_result(graph, cfg) == matrix_based_result(graph, cfg)
+
+
+def test_result_filter():
+    cfg = GRAMMARS[0]
+    graph = build_two_cycle_graph(4, 3, ("a", "b"))
+    result = matrix_based_result(graph, cfg)
+    filtered = result.filter(["S"], start_vertices=[0, 1], final_vertices=[0, 2, 4])
+    assert filtered.to_set() == {
+        (u, nt, v)
+        for u, nt, v in matrix_based(graph, cfg)
+        if nt == "S" and u in {0, 1} and v in {0, 2, 4}
+    }
+    assert filtered.nonterminals == ["S"]
+
+
+def test_result_filter_string_vertices():
+    cfg = GRAMMARS[0]
+    graph = nx.relabel_nodes(build_two_cycle_graph(4, 3, ("a", "b")), lambda v: f"v{v}")
+    result = matrix_based_result(graph, cfg)
+    filtered = result.filter(
+        start_vertices=["v0", "v10", 1], final_vertices=["v5", "v7"]
+    )
+    assert filtered.to_set() == {
+        (u, nt, v)
+        for u, nt, v in matrix_based(graph, cfg)
+        if u == "v0" and v in {"v5", "v7"}
+    }
+    assert filtered.to_set()
+
+
+def test_result_chunks():
+    result = CFPQResult({"S": ([2, 0, 1, 0, 0], [1, 3, 1, 1, 3])})
+    assert result.pairs("S")[0].tolist() == [0, 0, 1, 2]
+    assert result.pairs("S")[1].tolist() == [1, 3, 1, 1]
+    chunks = [(nt, rows.tolist(), cols.tolist()) for nt, rows, cols in result.chunks(3)]
+    assert chunks == [("S", [0, 0, 1], [1, 3, 1]), ("S", [2], [1])]
+    assert list(result) == [(0, "S", 1), (0, "S", 3), (1, "S", 1), (2, "S", 1)]
+
+
+def test_result_save_load(tmp_path):
+    cfg = GRAMMARS[1]
+    graph = build_two_cycle_graph(4, 3, ("a", "b"))
+    result = matrix_based_result(graph, cfg)
+    path = tmp_path / "result.npz"
+    result.save(path)
+    loaded = CFPQResult.load(path)
+    assert loaded == result
+    assert loaded.nonterminals == result.nonterminals
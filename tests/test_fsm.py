@@ -20,6 +20,30 @@ def test_regex_to_dfa():
     assert not dfa.accepts([fa.Symbol("12")])
 
 
+def test_cached_regex_to_dfa():
+    clear_dfa_cache()
+    regex = re.Regex("a (b | c)*")
+    dfa = cached_regex_to_dfa(regex)
+    assert dfa.is_equivalent_to(regex_to_dfa(regex))
+    dfa.add_transition(fa.State("x"), fa.Symbol("d"), fa.State("y"))
+    cached = cached_dfa(regex_key(regex))
+    assert cached is not None and cached.is_equivalent_to(regex_to_dfa(regex))
+
+
+def test_dfa_disk_cache(tmp_path):
+    regex = re.Regex("a b* | c")
+    set_dfa_cache_dir(tmp_path)
+    try:
+        clear_dfa_cache()
+        stored = cached_regex_to_dfa(regex)
+        clear_dfa_cache()
+        loaded = cached_dfa(regex_key(regex))
+    finally:
+        set_dfa_cache_dir(None)
+        clear_dfa_cache()
+    assert loaded is not None and loaded.is_equivalent_to(stored)
+
+
 def test_empty_graph_to_nfa():
     nfa = graph_to_nfa(nx.MultiDiGraph())
     assert nfa.is_empty()
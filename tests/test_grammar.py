@@ -1,9 +1,18 @@
 import filecmp
+import io
+import re
 import sys
 
+import pydot
 import pytest
 
-from project.grammar.grammar import check, generate_dot_description
+from project.grammar.grammar import (
+    DotStreamListener,
+    check,
+    clear_parse_cache,
+    generate_dot_description,
+    parse_text,
+)
 
 
 @pytest.mark.parametrize(
@@ -77,8 +86,53 @@ def test_load(txt, accepted):
     assert check(text=txt) == accepted
 
 
+def test_parse_text_is_cached():
+    clear_parse_cache()
+    result = parse_text("print a;")
+    assert result.errors == []
+    assert parse_text("print a;") is result
+    assert parse_text("print a;", use_cache=False) is not result
+
+
+def test_parse_text_errors():
+    tree, errors = parse_text("var 1 = a;")
+    assert tree is not None
+    assert errors and errors[0].line == 1
+
+
 def test_generate_dot_description():
-    generate_dot_description("""set_start get_vertices g of g1;
-    map x -> x | 5 g1;""", "tmp.dot")
+    generate_dot_description(
+        """set_start get_vertices g of g1;
+    map x -> x | 5 g1;""",
+        "tmp.dot",
+    )
     filecmp.cmp("tmp.dot", "right.dot")
 
+
+def test_generate_dot_description_streaming(tmp_path):
+    text = """set_start get_vertices g of g1;
+    map x -> x | 5 g1;
+    load "bip.dot";"""
+    generate_dot_description(text, str(tmp_path / "pydot.dot"))
+    generate_dot_description(text, str(tmp_path / "stream.dot"), streaming=True)
+
+    def graph_of(path):
+        (graph,) = pydot.graph_from_dot_file(str(path))
+        nodes = {
+            node.get_name(): node.get("label").strip('"') for node in graph.get_nodes()
+        }
+        edges = {
+            (edge.get_source(), edge.get_destination()) for edge in graph.get_edges()
+        }
+        return nodes, edges
+
+    assert graph_of(tmp_path / "stream.dot") == graph_of(tmp_path / "pydot.dot")
+
+
+@pytest.mark.parametrize("label", ["a\\", 'say "hi"', '\\"'])
+def test_dot_label_escaping(label):
+    dot = io.StringIO()
+    DotStreamListener(dot, [], [])._add_node(label)
+    (graph,) = pydot.graph_from_dot_data("digraph tree {\n" + dot.getvalue() + "}\n")
+    (node,) = graph.get_nodes()
+    assert re.sub(r"\\(.)", r"\1", node.get("label")[1:-1]) == label
@@ -0,0 +1,78 @@
+import cfpq_data as cd
+import pytest
+
+from project import graph_utils
+from project.graph_utils import load_graph, load_graph_matrices, get_edges_labels
+from project.regular_path_queries import decompose_graph
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    csv_path = tmp_path / "two_cycles.csv"
+    cd.graph_to_csv(cd.labeled_two_cycles_graph(4, 3, labels=("a", "b")), csv_path)
+    monkeypatch.setattr(cd, "download", lambda name: csv_path)
+    return csv_path, tmp_path / "cache"
+
+
+def test_load_graph_from_cache(dataset, monkeypatch):
+    csv_path, cache_dir = dataset
+    expected = cd.graph_from_csv(csv_path)
+
+    assert not cache_dir.exists()
+    first = load_graph("two_cycles", cache_dir=cache_dir)
+    assert len(list(cache_dir.iterdir())) == 1
+
+    def fail(path):
+        raise AssertionError("csv is parsed on cache hit")
+
+    monkeypatch.setattr(cd, "graph_from_csv", fail)
+    second = load_graph("two_cycles", cache_dir=cache_dir)
+
+    for graph in (first, second):
+        assert graph.nodes == expected.nodes
+        assert graph.edges == expected.edges
+        assert get_edges_labels(graph) == {"a", "b"}
+
+
+def test_cache_hit_does_not_download(dataset, monkeypatch):
+    _, cache_dir = dataset
+    expected = load_graph("two_cycles", cache_dir=cache_dir)
+
+    def offline(name):
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(cd, "download", offline)
+    assert load_graph("two_cycles", cache_dir=cache_dir).edges == expected.edges
+    matrices, _, _ = load_graph_matrices("two_cycles", cache_dir=cache_dir)
+    assert set(matrices) == set(decompose_graph(expected)[0])
+    with pytest.raises(ConnectionError):
+        load_graph("two_cycles_other", cache_dir=cache_dir)
+
+
+def test_cache_invalidated_by_refresh(dataset):
+    csv_path, cache_dir = dataset
+    load_graph("two_cycles", cache_dir=cache_dir)
+    with open(csv_path, "a") as csv:
+        csv.write("7 8 c\n")
+    graph = load_graph("two_cycles", cache_dir=cache_dir)
+    assert get_edges_labels(graph) == {"a", "b"}
+
+    graph = load_graph("two_cycles", cache_dir=cache_dir, refresh=True)
+    assert len(list(cache_dir.iterdir())) == 1
+    assert get_edges_labels(graph) == {"a", "b", "c"}
+    graph = load_graph("two_cycles", cache_dir=cache_dir)
+    assert get_edges_labels(graph) == {"a", "b", "c"}
+
+
+def test_load_graph_matrices(dataset):
+    csv_path, cache_dir = dataset
+    matrices, vertices, inds = load_graph_matrices("two_cycles", cache_dir=cache_dir)
+    expected, _, expected_inds = decompose_graph(cd.graph_from_csv(csv_path))
+
+    assert matrices.keys() == expected.keys()
+    assert all(inds[idx] == vertex for vertex, idx in vertices.items())
+    for label, matrix in matrices.items():
+        assert {(inds[i], inds[j]) for i, j in zip(*matrix.nonzero())} == {
+            (expected_inds[i], expected_inds[j])
+            for i, j in zip(*expected[label].nonzero())
+        }
@@ -0,0 +1,60 @@
+import io
+
+import networkx as nx
+import pytest
+
+from project.graph_utils import build_two_cycle_graph
+from project.interpreter import compile_script, parse_set, run_script
+from project.query_plan import GetReachable, InterpretError, Intersect, Load
+
+
+@pytest.fixture
+def graph_path(tmp_path):
+    path = tmp_path / "graph.dot"
+    nx.drawing.nx_pydot.write_dot(build_two_cycle_graph(3, 2, ("a", "b")), path)
+    return path
+
+
+def run(text: str) -> str:
+    out = io.StringIO()
+    run_script(text, out)
+    return out.getvalue()
+
+
+def test_parse_set():
+    assert parse_set("{}") == frozenset()
+    assert parse_set("{1..3, 7}") == {1, 2, 3, 7}
+
+
+def test_variables_are_inlined(graph_path):
+    plans = compile_script(
+        f'var g = load "{graph_path.name}"; var q = g & "a"; print get_reachable q;'
+    )
+    assert plans == [
+        GetReachable(Intersect(Load(graph_path.name), plans[0].expr.right))
+    ]
+
+
+def test_run_script(graph_path, monkeypatch):
+    monkeypatch.chdir(graph_path.parent)
+    output = run(
+        f"""
+        var g = load "{graph_path.name}";
+        var q = set_start {{0}} of (g & "a"*);
+        print get_reachable q;
+        print map ((u, v) -> v) get_reachable q;
+        print get_labels g;
+        """
+    )
+    assert output.splitlines() == [
+        "{(0, 0), (0, 1), (0, 2), (0, 3)}",
+        "{0, 1, 2, 3}",
+        '{"a", "b"}',
+    ]
+
+
+def test_errors():
+    with pytest.raises(InterpretError):
+        compile_script("print x;")
+    with pytest.raises(InterpretError):
+        compile_script("var 1 = a;")
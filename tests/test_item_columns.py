@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from project.item_columns import (
+    Constant,
+    ItemColumns,
+    Singletons,
+    collect,
+    intersect_values,
+    truth,
+)
+
+
+def test_from_items():
+    pairs = ItemColumns.from_items(frozenset({(1, "a"), (2, "b")}))
+    assert pairs.arity == 2 and len(pairs) == 2
+    assert pairs.columns[0].dtype == np.int64 and pairs.columns[1].dtype == object
+    assert pairs.to_set() == {(1, "a"), (2, "b")}
+    assert ItemColumns.from_items(frozenset({1, 2})).to_set() == {1, 2}
+    assert ItemColumns.from_items(frozenset({1, (2, 3)})) is None
+    assert ItemColumns.from_items(frozenset()) is None
+
+
+@pytest.mark.parametrize(
+    "left, right, expected",
+    [
+        (np.array([1, 2, 3]), Constant(frozenset({2, 3, "a"})), [False, True, True]),
+        (Constant(3), np.array([1, 2, 3]), [False, False, True]),
+        (np.array([1, 2, 3]), np.array([1, 0, 3]), [True, False, True]),
+        (
+            Singletons(np.array([1, 2, 3]), np.array([True, True, False])),
+            Constant(frozenset({1, 3})),
+            [True, False, False],
+        ),
+    ],
+)
+def test_intersect_values(left, right, expected):
+    value = intersect_values(left, right)
+    assert value.mask.tolist() == expected
+    assert truth(value, 3).tolist() == expected
+
+
+def test_intersect_values_not_ints():
+    labels = ItemColumns.from_values(["a", "b"]).columns[0]
+    assert intersect_values(labels, Constant(frozenset({1}))) is None
+    assert intersect_values(np.array([1]), Constant("a")) is None
+
+
+def test_collect():
+    values = np.array([1, 2, 2])
+    assert collect(values, 3) == {1, 2}
+    assert collect(Constant("x"), 3) == {"x"} and collect(Constant("x"), 0) == set()
+    singletons = Singletons(values, np.array([True, False, True]))
+    assert collect(singletons, 3) == {frozenset({1}), frozenset({2}), frozenset()}
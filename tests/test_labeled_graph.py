@@ -0,0 +1,93 @@
+import cfpq_data as cd
+import numpy as np
+import pytest
+from pyformlang.cfg import CFG
+
+from project.cfpq import (
+    hellings,
+    hellings_result,
+    matrix_based,
+    query_hellings,
+    query_matrix,
+    tensor_based,
+)
+from project.graph_utils import build_two_cycle_graph, get_edges_labels
+from project.labeled_graph import LabeledGraph
+from project.regular_path_queries import bfs_rpq, decompose_graph
+
+
+def edge_set(graph):
+    return sorted(graph.edges(data="label"))
+
+
+@pytest.fixture
+def graph():
+    return build_two_cycle_graph(3, 2, ("a", "b"))
+
+
+def test_networkx_round_trip(graph):
+    labeled = LabeledGraph.from_networkx(graph)
+    assert labeled.number_of_nodes() == graph.number_of_nodes()
+    assert labeled.number_of_edges() == graph.number_of_edges()
+    assert sorted(labeled.edges()) == edge_set(graph)
+    assert edge_set(labeled.to_networkx()) == edge_set(graph)
+
+
+def test_csv_round_trip(graph, tmp_path):
+    cd.graph_to_csv(graph, tmp_path / "graph.csv")
+    labeled = LabeledGraph.from_csv(tmp_path / "graph.csv")
+    assert sorted(labeled.edges()) == edge_set(graph)
+
+    labeled.to_csv(tmp_path / "copy.csv")
+    assert edge_set(cd.graph_from_csv(tmp_path / "copy.csv")) == edge_set(graph)
+
+
+def test_save_load_memmap(graph, tmp_path):
+    LabeledGraph.from_networkx(graph).save(tmp_path / "graph")
+    loaded = LabeledGraph.load(tmp_path / "graph")
+    assert isinstance(loaded.indices[0], np.memmap)
+    assert sorted(loaded.edges()) == edge_set(graph)
+    assert get_edges_labels(loaded.to_networkx()) == {"a", "b"}
+
+
+def test_decompose(graph):
+    matrices, vertices, inds = LabeledGraph.from_networkx(graph).decompose()
+    expected, expected_vertices, expected_inds = decompose_graph(graph)
+    assert matrices.keys() == expected.keys()
+    for label, matrix in matrices.items():
+        assert {(inds[i], inds[j]) for i, j in zip(*matrix.nonzero())} == {
+            (expected_inds[i], expected_inds[j])
+            for i, j in zip(*expected[label].nonzero())
+        }
+
+
+def test_engines_accept_labeled_graph(graph):
+    cfg = CFG.from_text("S -> a S b | a b")
+    labeled = LabeledGraph.from_networkx(graph)
+    assert hellings(labeled, cfg) == hellings(graph, cfg)
+    assert matrix_based(labeled, cfg) == matrix_based(graph, cfg)
+    assert tensor_based(labeled, cfg) == tensor_based(graph, cfg)
+    assert bfs_rpq(labeled, "a* b", [0, 1], per_source=True) == bfs_rpq(
+        graph, "a* b", [0, 1], per_source=True
+    )
+
+
+def named(triples, nonterminals=("S", "B")):
+    return {triple for triple in triples if triple[1] in nonterminals}
+
+
+@pytest.mark.parametrize("detect_regular", [False, True])
+def test_engines_accept_sparse_vertices(tmp_path, detect_regular):
+    csv_path = tmp_path / "graph.csv"
+    csv_path.write_text("0 5 a\n5 7 b\n7 9 b\n")
+    labeled = LabeledGraph.from_csv(csv_path)
+    cfg = CFG.from_text("S -> a B\nB -> b | b B")
+    expected = {(0, "S", 7), (0, "S", 9), (5, "B", 7), (5, "B", 9), (7, "B", 9)}
+
+    triples = hellings(labeled, cfg, detect_regular=detect_regular)
+    assert named(triples) == expected
+    assert matrix_based(labeled, cfg, detect_regular=detect_regular) == triples
+    assert hellings_result(labeled, cfg, detect_regular=detect_regular) == triples
+    assert named(tensor_based(labeled, cfg)) == expected
+    assert query_matrix(labeled, cfg, [0, 3], [9], "S") == {0: {9}, 3: set()}
+    assert query_hellings(labeled, cfg, [0], [7, 9], "S") == {0: {7, 9}}
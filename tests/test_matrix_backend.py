@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from project.matrix_backend import (
+    BACKENDS,
+    get_backend,
+    set_default_backend,
+    CsrBackend,
+)
+
+a = np.array([[1, 0, 0], [1, 1, 0], [0, 0, 1]], dtype=bool)
+b = np.array([[0, 1, 0], [0, 0, 0], [1, 0, 1]], dtype=bool)
+
+
+def from_dense(backend, dense):
+    return backend.from_coo(*np.nonzero(dense), dense.shape)
+
+
+def to_dense(backend, matrix):
+    return backend.to_sparse(matrix).toarray().astype(bool)
+
+
+@pytest.mark.parametrize("name", BACKENDS.keys())
+class TestBackend:
+    def test_from_coo_with_duplicates(self, name):
+        backend = get_backend(name)
+        matrix = backend.from_coo([0, 0, 1], [2, 2, 0], (2, 70))
+        assert backend.nnz(matrix) == 2
+        assert {tuple(map(int, c)) for c in zip(*backend.nonzero(matrix))} == {
+            (0, 2),
+            (1, 0),
+        }
+
+    def test_operations(self, name):
+        backend = get_backend(name)
+        ma, mb = from_dense(backend, a), from_dense(backend, b)
+        assert np.array_equal(
+            to_dense(backend, backend.matmul(ma, mb)), (a.astype(int) @ b) > 0
+        )
+        assert np.array_equal(to_dense(backend, backend.add(ma, mb)), a | b)
+        assert np.array_equal(to_dense(backend, backend.difference(ma, mb)), a & ~b)
+        assert np.array_equal(to_dense(backend, backend.kron(ma, mb)), np.kron(a, b))
+        assert np.array_equal(to_dense(backend, backend.transpose(ma)), a.T)
+        assert np.array_equal(
+            to_dense(backend, backend.identity(3)), np.eye(3, dtype=bool)
+        )
+        assert backend.nnz(backend.zeros((3, 3))) == 0
+
+    def test_from_sparse(self, name):
+        backend = get_backend(name)
+        matrix = backend.from_sparse(CsrBackend().from_coo(*np.nonzero(a), a.shape))
+        assert np.array_equal(to_dense(backend, matrix), a)
+
+
+def test_default_backend():
+    assert get_backend().name == "csr"
+    set_default_backend("bitpacked")
+    try:
+        assert get_backend().name == "bitpacked"
+    finally:
+        set_default_backend("csr")
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_backend("dok")
@@ -0,0 +1,51 @@
+from multiprocessing import get_context
+
+import pytest
+
+from project.graph_utils import build_two_cycle_graph
+from project.parallel_rpq import batch_rpq
+from project.regular_path_queries import bfs_rpq
+
+QUERIES = [
+    ([0, 1], "a* b"),
+    ([2, 3, 4, 5], "(a | b)*"),
+    (None, "b b"),
+    ([], "a"),
+]
+
+
+@pytest.mark.parametrize("per_source", [False, True])
+@pytest.mark.parametrize("chunk_size", [None, 1])
+def test_batch_rpq_matches_bfs_rpq(per_source, chunk_size):
+    graph = build_two_cycle_graph(3, 2, ("a", "b"))
+    results = dict(
+        batch_rpq(
+            graph, QUERIES, per_source=per_source, workers=2, chunk_size=chunk_size
+        )
+    )
+    assert results == {
+        idx: bfs_rpq(graph, regex, starts, per_source=per_source)
+        for idx, (starts, regex) in enumerate(QUERIES)
+    }
+
+
+def test_batch_rpq_bitpacked_final_vertices():
+    graph = build_two_cycle_graph(3, 2, ("a", "b"))
+    results = dict(
+        batch_rpq(graph, QUERIES, final_vertices=[0, 4], workers=2, backend="bitpacked")
+    )
+    assert results == {
+        idx: bfs_rpq(graph, regex, starts, final_vertices=[0, 4])
+        for idx, (starts, regex) in enumerate(QUERIES)
+    }
+
+
+def test_batch_rpq_spawned_workers():
+    graph = build_two_cycle_graph(3, 2, ("a", "b"))
+    results = dict(
+        batch_rpq(graph, QUERIES, workers=2, mp_context=get_context("spawn"))
+    )
+    assert results == {
+        idx: bfs_rpq(graph, regex, starts)
+        for idx, (starts, regex) in enumerate(QUERIES)
+    }
@@ -0,0 +1,279 @@
+import networkx as nx
+import pytest
+
+import project.query_plan
+from project.graph_utils import build_two_cycle_graph
+from project.query_plan import (
+    AddStart,
+    Concat,
+    Const,
+    Evaluator,
+    Filter,
+    GetEdges,
+    GetFinal,
+    GetLabels,
+    GetReachable,
+    GetStart,
+    GetVertices,
+    GraphLanguage,
+    InterpretError,
+    Intersect,
+    Lambda,
+    Load,
+    Map,
+    PlanTable,
+    ResultCache,
+    SetFinal,
+    SetStart,
+    Star,
+    Union,
+    Var,
+    clear_result_cache,
+    estimate_size,
+    format_value,
+)
+from project.regular_path_queries import regular_path_query
+
+
+@pytest.fixture
+def graph_path(tmp_path):
+    path = tmp_path / "graph.dot"
+    nx.drawing.nx_pydot.write_dot(build_two_cycle_graph(3, 2, ("a", "b")), path)
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def empty_result_cache():
+    clear_result_cache()
+    yield
+    clear_result_cache()
+
+
+@pytest.fixture
+def load_calls(monkeypatch):
+    calls = []
+    load = project.query_plan.load_script_graph
+
+    def counting_load(path):
+        calls.append(path)
+        return load(path)
+
+    monkeypatch.setattr(project.query_plan, "load_script_graph", counting_load)
+    return calls
+
+
+def reachable_plan(graph_path, regex_plan, starts):
+    return GetReachable(
+        Intersect(SetStart(Const(frozenset(starts)), Load(graph_path)), regex_plan)
+    )
+
+
+def test_load(graph_path):
+    graph = Evaluator().evaluate(Load(graph_path))
+    assert isinstance(graph, GraphLanguage)
+    assert set(graph.graph.nodes) == set(range(6))
+    assert format_value(Evaluator().evaluate(GetLabels(Load(graph_path)))) == (
+        '{"a", "b"}'
+    )
+
+
+@pytest.mark.parametrize(
+    "regex_plan, regex",
+    [
+        (Star(Const("a")), "a*"),
+        (Concat(Const("a"), Star(Union(Const("a"), Const("b")))), "a (a | b)*"),
+        (Union(Const("b"), Const("a a")), "b | a a"),
+    ],
+)
+def test_reachable_is_one_rpq(graph_path, regex_plan, regex, monkeypatch):
+    evaluator = Evaluator()
+    expected = regular_path_query(
+        evaluator.evaluate(Load(graph_path)).graph, regex, start_vertices={0, 4}
+    )
+
+    def no_automata(self, value):
+        raise AssertionError("automaton is built")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Evaluator, "to_nfa", no_automata)
+        fused = evaluator.evaluate(reachable_plan(graph_path, regex_plan, {0, 4}))
+        assert fused == expected
+
+    plan = GetReachable(
+        SetStart(Const(frozenset({0, 4})), Intersect(regex_plan, Load(graph_path)))
+    )
+    assert evaluator.evaluate(plan) == expected
+
+
+def test_reachable_without_regex(graph_path):
+    evaluator = Evaluator()
+    regex_plan = Intersect(Star(Const("a")), Star(Union(Const("a"), Const("b"))))
+    plan = reachable_plan(graph_path, regex_plan, {0})
+    assert evaluator.rpq_of(plan.expr, {}) is None
+    assert evaluator.evaluate(plan) == evaluator.evaluate(
+        reachable_plan(graph_path, Star(Const("a")), {0})
+    )
+
+
+def test_start_and_final(graph_path):
+    evaluator = Evaluator()
+    graph = Load(graph_path)
+    assert evaluator.evaluate(GetStart(graph)) == frozenset(range(6))
+    plan = AddStart(Const(3), SetStart(Const(frozenset({1, 2})), graph))
+    assert evaluator.evaluate(GetStart(plan)) == {1, 2, 3}
+    assert evaluator.evaluate(GetFinal(SetFinal(Const(frozenset({5})), graph))) == {5}
+
+
+@pytest.mark.parametrize(
+    "make_plan",
+    [
+        lambda graph, regex: SetStart(Const(frozenset({0})), Intersect(graph, regex)),
+        lambda graph, regex: Intersect(SetStart(Const(frozenset({0})), graph), regex),
+        lambda graph, regex: SetStart(Const(frozenset({0})), Intersect(regex, graph)),
+        lambda graph, regex: SetFinal(
+            Const(frozenset({1, 2})), AddStart(Const(3), Intersect(graph, regex))
+        ),
+    ],
+)
+def test_reachable_fallback_agrees(graph_path, make_plan, monkeypatch):
+    regex_plan = Star(Union(Const("a"), Const("b")))
+    plan = GetReachable(make_plan(Load(graph_path), regex_plan))
+    fused = Evaluator().evaluate(plan)
+
+    clear_result_cache()
+    monkeypatch.setattr(Evaluator, "rpq_of", lambda self, plan, env: None)
+    assert Evaluator().evaluate(plan) == fused
+    product = GetReachable(
+        make_plan(Load(graph_path), Intersect(regex_plan, Star(Const("a"))))
+    )
+    assert Evaluator().evaluate(product) == Evaluator().evaluate(
+        GetReachable(make_plan(Load(graph_path), Star(Const("a"))))
+    )
+
+
+def test_start_and_final_of_product(graph_path):
+    evaluator = Evaluator()
+    product = Intersect(Load(graph_path), Intersect(Star(Const("a")), Const("a*")))
+    assert evaluator.evaluate(GetStart(product)) == frozenset(range(6))
+    starts = SetStart(Const(frozenset({0})), product)
+    assert evaluator.evaluate(GetStart(starts)) == {0}
+    assert evaluator.evaluate(GetReachable(starts)) == {(0, 0), (0, 1), (0, 2), (0, 3)}
+
+
+def test_map_filter(graph_path):
+    evaluator = Evaluator()
+    pairs = reachable_plan(graph_path, Star(Const("a")), {0})
+    targets = Map(Lambda(("u", "v"), Var("v")), pairs)
+    assert evaluator.evaluate(targets) == {0, 1, 2, 3}
+    small = Filter(Lambda("x", Intersect(Var("x"), Const(frozenset({1, 2})))), targets)
+    assert evaluator.evaluate(small) == {1, 2}
+    with pytest.raises(InterpretError):
+        evaluator.evaluate(Map(Lambda(("u", "v"), Var("u")), targets))
+
+
+def test_format_value():
+    assert format_value(frozenset({10, 2, 1})) == "{1, 2, 10}"
+    assert format_value(frozenset({(1, 2), (0, 3)})) == "{(0, 3), (1, 2)}"
+
+
+def test_plans_are_hash_consed(graph_path):
+    table = PlanTable()
+    first = table.intern(reachable_plan(graph_path, Star(Const("a")), {0, 4}))
+    second = table.intern(reachable_plan(graph_path, Star(Const("a")), {4, 0}))
+    assert first is second
+    assert first.expr.left.expr is table.intern(Load(graph_path))
+    assert table.info(first).loads == {graph_path}
+
+    body = Intersect(Var("x"), Var("y"))
+    assert table.info(table.intern(body)).free_vars == {"x", "y"}
+    assert table.info(table.intern(Lambda("x", body))).free_vars == {"y"}
+    assert table.info(table.intern(Lambda(("x", "y"), body))).free_vars == set()
+
+
+def test_subexpressions_evaluated_once(graph_path, load_calls):
+    evaluator = Evaluator(cache=ResultCache(0))
+    pairs = reachable_plan(graph_path, Star(Const("a")), {0})
+    evaluator.evaluate(Union(GetVertices(Load(graph_path)), GetStart(Load(graph_path))))
+    assert evaluator.evaluate(pairs) == evaluator.evaluate(
+        reachable_plan(graph_path, Star(Const("a")), {0})
+    )
+    assert load_calls == [graph_path]
+
+    targets = Map(Lambda(("u", "v"), GetVertices(Load(graph_path))), pairs)
+    assert evaluator.evaluate(targets) == {frozenset(range(6))}
+    assert load_calls == [graph_path]
+
+
+def test_results_shared_between_runs(graph_path, load_calls):
+    plan = reachable_plan(graph_path, Star(Const("b")), {0, 4})
+    expected = Evaluator().evaluate(plan)
+    assert Evaluator().evaluate(plan) == expected
+    assert load_calls == [graph_path]
+
+    changed = nx.MultiDiGraph([(0, 1, {"label": "b"}), (4, 5, {"label": "a"})])
+    nx.drawing.nx_pydot.write_dot(changed, graph_path)
+    assert Evaluator().evaluate(plan) == {(0, 0), (0, 1), (4, 4)}
+    assert len(load_calls) == 2
+
+
+def test_result_cache_budget(graph_path):
+    graph = Evaluator(cache=ResultCache(0)).evaluate(Load(graph_path))
+    size = estimate_size(graph)
+    cache = ResultCache(2 * size)
+    for key in range(3):
+        cache.put(key, graph)
+    assert len(cache) == 2 and cache.get(0) is None
+    assert cache.get(1) is graph
+    cache.put(3, graph)
+    assert cache.get(1) is graph and cache.get(2) is None
+    assert cache.size <= cache.budget
+
+    cache.put("big", frozenset(range(10 * size)))
+    assert cache.get("big") is None and len(cache) == 2
+
+
+@pytest.mark.parametrize(
+    "function",
+    [
+        Lambda(("u", "l", "v"), Var("v")),
+        Lambda(("u", "l", "v"), Var("l")),
+        Lambda(("u", "l", "v"), Intersect(Var("u"), Const(frozenset(range(3))))),
+        Lambda(("u", "l", "v"), Intersect(Var("u"), Var("v"))),
+        Lambda(("u", "l", "v"), Intersect(Const(0), Var("u"))),
+        Lambda(("u", "l", "v"), Const("x")),
+        Lambda(("u", "l", "v"), Union(Var("u"), Var("v"))),
+        Lambda("e", Var("e")),
+    ],
+)
+def test_vectorized_map_filter(graph_path, function, monkeypatch):
+    edges = GetEdges(Load(graph_path))
+    plans = [Map(function, edges), Filter(function, edges)]
+    expected = [Evaluator().evaluate(plan) for plan in plans]
+
+    calls = []
+    apply = Evaluator.apply
+
+    def counting_apply(self, *args):
+        calls.append(args)
+        return apply(self, *args)
+
+    monkeypatch.setattr(Evaluator, "apply", counting_apply)
+    assert [Evaluator().evaluate(plan) for plan in plans] == expected
+    vectorized = not isinstance(function.body, Union) and function.pattern != "e"
+    assert not calls if vectorized else calls
+
+
+def test_vectorized_chain(graph_path, monkeypatch):
+    monkeypatch.setattr(Evaluator, "apply", None)
+    vertices = GetVertices(Load(graph_path))
+    small = Filter(
+        Lambda("x", Intersect(Var("x"), Const(frozenset({1, 2, 7})))), vertices
+    )
+    assert Evaluator().evaluate(small) == {1, 2}
+    pairs = reachable_plan(graph_path, Star(Const("a")), {0, 4})
+    from_zero = Filter(Lambda(("u", "v"), Intersect(Var("u"), Const(0))), pairs)
+    targets = Map(Lambda(("u", "v"), Var("v")), from_zero)
+    assert Evaluator().evaluate(targets) == {0, 1, 2, 3}
+    assert Evaluator().evaluate(Map(Lambda("x", Const(1)), small)) == {1}
+    members = Map(Lambda("x", Intersect(Var("x"), Const(1))), small)
+    assert Evaluator().evaluate(members) == {frozenset({1}), frozenset()}
@@ -4,7 +4,7 @@ import tempfile
 import pytest
 
 from project.boolMatrix import BoolMatrix
-from project.fsm import regex_to_dfa
+from project.fsm import clear_dfa_cache, regex_to_dfa
 from project.task7.ecfg import ExtendedContextFreeGrammatic as ECFG
 from project.task7.RecursiveFA import RecursiveFA as RFA
 
@@ -73,3 +73,36 @@ def test_bool_matrix():
     assert "b" in mat.bool_matrices
     assert "a" in mat.bool_matrices
     print(mat)
+
+
+def test_bool_matrix_bitpacked():
+    rfa = RFA.from_text("""S -> a S b | $""", "S")
+    csr = BoolMatrix.from_rfa(rfa)
+    bitpacked = BoolMatrix.from_rfa(rfa, backend="bitpacked")
+    assert csr.bool_matrices.keys() == bitpacked.bool_matrices.keys()
+    for label, matrix in csr.bool_matrices.items():
+        assert (
+            matrix != bitpacked.backend.to_sparse(bitpacked.bool_matrices[label])
+        ).nnz == 0
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_from_ecfg_workers(workers):
+    ecfg = ECFG.from_text("S -> a S b | c\nA -> (a | b)* S\nB -> c (a | b)* S")
+    clear_dfa_cache()
+    rfa = RFA.from_ecfg(ecfg, workers=workers)
+    cached = RFA.from_ecfg(ecfg)
+    for box, cached_box in zip(rfa.boxes, cached.boxes):
+        body = next(p.body for p in ecfg.productions if p.head == box.variable)
+        assert box.dfa.is_equivalent_to(regex_to_dfa(body))
+        assert cached_box.dfa is not box.dfa
+        assert cached_box.dfa.is_equivalent_to(box.dfa)
+
+
+def test_minimize_workers():
+    rfa = RFA.from_text("S -> a S b | c\nA -> (a | b)* S", "S")
+    expected = {box.variable: box.dfa for box in rfa.boxes}
+    rfa.minimize(workers=2)
+    for box in rfa.boxes:
+        assert box.dfa.is_equivalent_to(expected[box.variable])
+        assert len(box.dfa.states) == len(expected[box.variable].states)
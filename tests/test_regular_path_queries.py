@@ -1,3 +1,4 @@
+import pytest
 from pyformlang.finite_automaton import State
 
 from pyformlang.finite_automaton import NondeterministicFiniteAutomaton, Symbol
@@ -61,3 +62,84 @@ def test_intersection():
     expected = fa.get_intersection(fa1)
     result = rpq.intersect(fa, fa1)
     assert expected.is_equivalent_to(result)
+
+
+def test_intersection_bitpacked():
+    fa = get_sampel_fa2()
+    fa1 = get_sample_fa()
+    expected = fa.get_intersection(fa1)
+    result = rpq.intersect(fa, fa1, backend="bitpacked")
+    assert expected.is_equivalent_to(result)
+
+
+@pytest.mark.parametrize("backend", ["csr", "bitpacked"])
+class TestBfsRpq:
+    graph = graph_utils.build_two_cycle_graph(3, 2, ("a", "b"))
+
+    def test_all_sources(self, backend):
+        assert rpq.bfs_rpq(self.graph, "a*", [0, 1], backend=backend) == {0, 1, 2, 3}
+        assert rpq.bfs_rpq(self.graph, "a b", [0, 1, 2, 3], backend=backend) == {4}
+
+    def test_per_source(self, backend):
+        assert rpq.bfs_rpq(
+            self.graph, "a b*", [3, 1], per_source=True, backend=backend
+        ) == {3: {0, 4, 5}, 1: {2}}
+
+    def test_final_vertices(self, backend):
+        assert rpq.bfs_rpq(
+            self.graph, "a b*", [3], [4, 5], per_source=True, backend=backend
+        ) == {3: {4, 5}}
+
+    def test_unknown_start_vertices(self, backend):
+        assert rpq.bfs_rpq(self.graph, "a*", [0, 42], backend=backend) == {0, 1, 2, 3}
+        assert rpq.bfs_rpq(
+            self.graph, "a b*", [3, "x"], per_source=True, backend=backend
+        ) == {3: {0, 4, 5}, "x": set()}
+        assert rpq.bfs_rpq(self.graph, "a", [42], backend=backend) == set()
+
+    def test_regular_path_query(self, backend):
+        assert rpq.regular_path_query(
+            self.graph, Regex("a* b"), [1, 2], [5, 4, 0], backend=backend
+        ) == {(1, 4), (2, 4)}
+
+
+def test_reachable_only_intersection():
+    fa = get_sampel_fa2()
+    fa1 = get_sample_fa()
+    expected = fa.get_intersection(fa1)
+    result = rpq.intersect(fa, fa1, reachable_only=True)
+    assert expected.is_equivalent_to(result)
+
+
+def test_reachable_only_self_intersection():
+    fa = get_sampel_fa2()
+    expected = fa.get_intersection(fa)
+    result = rpq.intersect(fa, fa, reachable_only=True)
+    assert expected.is_equivalent_to(result)
+
+
+def test_reachable_only_as_matrices():
+    graph = graph_utils.build_two_cycle_graph(3, 2, ("a", "b"))
+    graph_nfa = fsm.graph_to_nfa(graph, {State(1)}, {State(0)})
+    dfa = fsm.regex_to_dfa(Regex("a*"))
+
+    full = rpq.intersect(graph_nfa, dfa, as_matrices=True)
+    product = rpq.intersect(graph_nfa, dfa, reachable_only=True, as_matrices=True)
+
+    assert len(product.states) < len(full.states)
+    assert {product.states[idx][0] for idx in product.start_states} == {State(1)}
+    assert {product.states[idx][0] for idx in product.final_states} == {State(0)}
+    assert {s1.value for s1, _ in product.states} == {0, 1, 2, 3}
+
+
+def test_decompose_graph():
+    graph = graph_utils.build_two_cycle_graph(3, 2, ("a", "b"))
+    fa_bool, _, _ = rpq.decompose_fa(fsm.graph_to_nfa(graph))
+    graph_bool, vertices, inds = rpq.decompose_graph(graph)
+
+    assert fa_bool.keys() == graph_bool.keys() == {Symbol("a"), Symbol("b")}
+    assert all(inds[idx] == vertex for vertex, idx in vertices.items())
+    for label, matrix in graph_bool.items():
+        assert {(inds[i], inds[j]) for i, j in zip(*matrix.nonzero())} == {
+            (u, v) for u, v, l in graph.edges(data="label") if l == label.value
+        }
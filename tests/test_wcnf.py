@@ -2,7 +2,14 @@ import tempfile
 
 from pyformlang.cfg import CFG
 
-from project.wcnf import cfg_to_wcnf, read_from_file
+from project.wcnf import (
+    cfg_to_wcnf,
+    clear_wcnf_cache,
+    grammar_key,
+    normalize,
+    read_from_file,
+    set_wcnf_cache_dir,
+)
 
 
 def test_cfg_to_wcnf():
@@ -37,3 +44,67 @@ A -> a b c"""
     expected_lines = set([l for l in expected.split("\n") if l != ""])
 
     assert actual_lines == expected_lines
+
+
+def test_grammar_key_ignores_production_order():
+    first = CFG.from_text("S -> A B\nA -> a\nB -> b")
+    second = CFG.from_text("S -> A B\nB -> b\nA -> a")
+    other = CFG.from_text("S -> A B\nA -> a\nB -> a")
+    assert grammar_key(first) == grammar_key(second)
+    assert grammar_key(first) != grammar_key(other)
+
+
+def test_normalize_is_cached():
+    clear_wcnf_cache()
+    gr = CFG.from_text("S -> a S b S | epsilon")
+    normalized = normalize(gr)
+    assert normalize(CFG.from_text("S -> a S b S | epsilon")) is normalized
+    assert normalized.tables.eps_heads == {"S"}
+    assert set(normalized.tables.var_productions) == {
+        (p.head.value, p.body[0].value, p.body[1].value)
+        for p in normalized.wcnf.productions
+        if len(p.body) == 2
+    }
+
+
+def test_cfg_to_wcnf_returns_copy():
+    clear_wcnf_cache()
+    gr = CFG.from_text("S -> a S b S | epsilon")
+    wcnf = cfg_to_wcnf(gr)
+    productions = set(wcnf.productions)
+    wcnf.productions.clear()
+    assert set(cfg_to_wcnf(gr).productions) == productions
+    assert set(normalize(gr).wcnf.productions) == productions
+
+
+def test_normalize_disk_cache():
+    gr = CFG.from_text("S -> A B C\nA -> a\nB -> b\nC -> c")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        set_wcnf_cache_dir(cache_dir)
+        try:
+            clear_wcnf_cache()
+            stored = normalize(gr)
+            clear_wcnf_cache()
+            loaded = normalize(gr)
+        finally:
+            set_wcnf_cache_dir(None)
+    assert loaded is not stored
+    assert set(loaded.wcnf.productions) == set(stored.wcnf.productions)
+    assert loaded.tables == stored.tables
+
+
+def test_compiled_grammar():
+    compiled = normalize(
+        CFG.from_text("S -> A B | epsilon\nA -> a\nB -> b | S")
+    ).compiled
+    ids = compiled.nonterminal_ids
+    a, b = compiled.terminal_ids["a"], compiled.terminal_ids["b"]
+    assert compiled.nonterminals[ids["S"]] == "S"
+    assert compiled.term_heads[a] == [ids["A"]]
+    assert compiled.is_eps[ids["S"]] and not compiled.is_eps[ids["A"]]
+    assert set(compiled.by_left[ids["A"]]) == {
+        (ids["S"], ids["B"]),
+        (ids["B"], ids["B"]),
+    }
+    assert set(compiled.intern_edges({"a": 1, "b": 2, "x": 3})) == {a, b}
+    assert compiled.named_triples({(0, ids["S"], 1)}) == {(0, "S", 1)}